@@ -8,26 +8,96 @@ BattleQueue has been completed for you, and the class header for
 RestrictedBattleQueue has been provided. You must implement
 RestrictedBattleQueue and document it accordingly.
 """
-from typing import Union
+from typing import List, Tuple, Union
+import struct
+from a2_hashing import RollingHash, mix, string_key, zobrist_key, \
+    QUEUE_ENTRY, ABLE_TO_ADD, FIRST_PLAYER, SECOND_PLAYER, \
+    ADDITION_COUNTER, CHARACTER_TYPE, FIRST_PLAYER_SLOT
+from a2_queue_stores import ListStore
+
+# The header of a packed BattleQueue: which character is the first player,
+# both characters' HP and SP, and how many characters are in the queue.
+PACKED_HEADER = struct.Struct('<B4iH')
+PACKED_LENGTH = struct.Struct('<H')
 
 
 class BattleQueue:
     """
     A class representing a BattleQueue.
+
+    Who is in the BattleQueue is kept in a queue store from a2_queue_stores,
+    as the index of each character in the pair of characters playing. Copies
+    made with copy() use the same kind of store, unless told otherwise.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, store: type = ListStore) -> None:
         """
-        Initialize this BattleQueue.
+        Initialize this BattleQueue, keeping who is in it in a store of the
+        class store.
 
         >>> bq = BattleQueue()
         >>> bq.is_empty()
         True
         """
-        self._content = []
+        self._queue = store()
+        self._content_hash = RollingHash()
+        self._counts = [0, 0]
+        self._members = ()
         self._p1 = None
         self._p2 = None
 
+    def _set_players(self, character: 'Character') -> None:
+        """
+        Make character the first player of this BattleQueue and its enemy
+        the second player.
+        """
+        self._p1 = character
+        self._p2 = character.enemy
+        self._members = (character, character.enemy)
+
+    def _front(self) -> 'Character':
+        """
+        Return the character at the front of this BattleQueue's contents,
+        without cleaning the queue first.
+        """
+        return self._members[self._queue.peek()]
+
+    def _push(self, character: 'Character') -> None:
+        """
+        Append character to the back of this BattleQueue's contents and
+        update its hash.
+        """
+        self._push_index(0 if character is self._members[0] else 1)
+
+    def _push_index(self, index: int) -> None:
+        """
+        Append the character with index in the pair playing to the back of
+        this BattleQueue's contents and update its hash.
+        """
+        self._queue = self._queue.push(index)
+        self._content_hash.push(zobrist_key(QUEUE_ENTRY, index))
+        self._counts[index] += 1
+
+    def _pop_front(self) -> 'Character':
+        """
+        Remove and return the character at the front of this BattleQueue's
+        contents and update its hash.
+        """
+        index = self._queue.peek()
+        self._queue = self._queue.pop()
+        self._content_hash.pop(zobrist_key(QUEUE_ENTRY, index))
+        self._counts[index] -= 1
+        return self._members[index]
+
+    def _clear(self) -> None:
+        """
+        Remove every character from this BattleQueue's contents and update
+        its hash.
+        """
+        self._queue = type(self._queue)()
+        self._content_hash.clear()
+        self._counts = [0, 0]
+
     def _clean_queue(self) -> None:
         """
         Remove all characters from the front of the Queue that don't have
@@ -45,8 +115,8 @@ class BattleQueue:
         >>> bq.is_empty()
         False
         """
-        while self._content and self._content[0].get_available_actions() == []:
-            self._content.pop(0)
+        while self._queue and self._front().get_available_actions() == []:
+            self._pop_front()
 
     def add(self, character: 'Character') -> None:
         """
@@ -63,11 +133,33 @@ class BattleQueue:
         >>> bq.is_empty()
         False
         """
-        self._content.append(character)
-
         if not self._p1:
-            self._p1 = character
-            self._p2 = character.enemy
+            self._set_players(character)
+
+        self._push(character)
+
+    def reset_to(self, sequence: List['Character']) -> None:
+        """
+        Replace the contents of this BattleQueue with the characters in
+        sequence, in order, as if this BattleQueue had been emptied and each
+        character added in turn.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c)
+        >>> bq.reset_to([c2, c])
+        >>> bq
+        r2 (Rogue): 100/100 -> r (Rogue): 100/100
+        """
+        self._clear()
+        for character in sequence:
+            self.add(character)
 
     def remove(self) -> 'Character':
         """
@@ -88,7 +180,7 @@ class BattleQueue:
         """
         self._clean_queue()
 
-        return self._content.pop(0)
+        return self._pop_front()
 
     def is_empty(self) -> bool:
         """
@@ -101,7 +193,7 @@ class BattleQueue:
         """
         self._clean_queue()
 
-        return self._content == []
+        return len(self._queue) == 0
 
     def peek(self) -> 'Character':
         """
@@ -126,8 +218,8 @@ class BattleQueue:
         """
         self._clean_queue()
 
-        if self._content:
-            return self._content[0]
+        if self._queue:
+            return self._front()
 
         return self._p1
 
@@ -189,12 +281,47 @@ class BattleQueue:
 
         return None
 
-    def copy(self) -> 'BattleQueue':
+    def _copy_contents(self, new_battle_queue: 'BattleQueue',
+                       store: Union[type, None]) -> None:
+        """
+        Make the empty new_battle_queue hold copies of the characters in this
+        BattleQueue, in the same order, kept in a store of the class store, or
+        of the same class as this BattleQueue's if store is None.
+
+        The first player of new_battle_queue is the copy of the character at
+        the front of this BattleQueue, as if each character had been added to
+        new_battle_queue in turn.
+        """
+        if store is None:
+            new_battle_queue._queue = self._queue.share()
+        else:
+            new_battle_queue._queue = store(self._queue)
+        new_battle_queue._content_hash = self._content_hash.copy()
+        new_battle_queue._counts = self._counts[:]
+        if not self._queue:
+            return
+
+        p1_copy = self._p1.copy(new_battle_queue)
+        p2_copy = self._p2.copy(new_battle_queue)
+        p1_copy.enemy = p2_copy
+        p2_copy.enemy = p1_copy
+        new_battle_queue._members = tuple(
+            p1_copy if character is self._p1 else p2_copy
+            for character in self._members)
+        new_battle_queue._p1 = new_battle_queue._front()
+        new_battle_queue._p2 = new_battle_queue._p1.enemy
+
+    def copy(self, store: type = None) -> 'BattleQueue':
         """
         Return a copy of this BattleQueue. The copy contains copies of the
         characters inside this BattleQueue, so any changes that rely on
         the copy do not affect this BattleQueue.
 
+        The copy keeps who is in it in a store of the class store, or of the
+        same class as this BattleQueue's if store is None. With a
+        PersistentStore, the copy shares its contents with this BattleQueue
+        instead of copying them.
+
         >>> bq = BattleQueue()
         >>> from a2_characters import Rogue
         >>> from a2_playstyle import ManualPlaystyle
@@ -210,21 +337,207 @@ class BattleQueue:
         r (Rogue): 100/97 -> r2 (Rogue): 95/100 -> r (Rogue): 100/97
         >>> bq
         r (Rogue): 100/100 -> r2 (Rogue): 100/100
+        >>> from a2_queue_stores import PersistentStore
+        >>> shared_bq = bq.copy(PersistentStore)
+        >>> shared_bq.copy()._queue is shared_bq._queue
+        True
         """
         new_battle_queue = BattleQueue()
+        self._copy_contents(new_battle_queue, store)
+        return new_battle_queue
 
-        p1_copy = self._p1.copy(new_battle_queue)
-        p2_copy = self._p2.copy(new_battle_queue)
-        p1_copy.enemy = p2_copy
-        p2_copy.enemy = p1_copy
+    def normalize(self) -> None:
+        """
+        Remove the entries of each character that can never reach the front
+        of this BattleQueue while the character still has SP to act.
 
-        for character in self._content:
-            if character == self._p1:
-                new_battle_queue.add(p1_copy)
-            else:
-                new_battle_queue.add(p2_copy)
+        A character's entries are used up by its turns (see
+        Character.get_turns_left) and, once per character, by remove(): when
+        a character runs out of SP on its turn, its own entry is cleaned away
+        and remove() takes the next entry instead. Any entries of a character
+        beyond its turns plus one per character that can still act are only
+        ever cleaned off the front, so the game carries on exactly as before.
+        BattleQueues that only differ in such entries get the same
+        state_hash() afterwards, so transposition tables can share their
+        scores.
+
+        This takes O(1) time unless there are entries to remove.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> for _ in range(4):
+        ...     bq.add(c)
+        >>> c.set_sp(5)
+        >>> repr(bq).count("r (Rogue): 100/5")
+        5
+        >>> bq.normalize()
+        >>> repr(bq).count("r (Rogue): 100/5")
+        3
+        """
+        if not self._members:
+            return
+        turns = [member.get_turns_left() for member in self._members]
+        acting = sum(1 for turns_left in turns if turns_left > 0)
+        limits = [turns_left + acting if turns_left > 0 else 0
+                  for turns_left in turns]
+        if self._counts[0] <= limits[0] and self._counts[1] <= limits[1]:
+            return
+        kept = []
+        for index in self._queue:
+            if limits[index] > 0:
+                limits[index] -= 1
+                kept.append(index)
+        self._clear()
+        for index in kept:
+            self._push_index(index)
+
+    def pack(self) -> bytes:
+        """
+        Return the game state in this BattleQueue packed into a few bytes:
+        which character is the first player, both characters' HP and SP, and
+        who is in the queue, in order. Use unpack() to get it back.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> len(bq.pack())
+        21
+        """
+        stats = []
+        for member in self._members or (None, None):
+            stats.extend([member.get_hp(), member.get_sp()] if member else
+                         [0, 0])
+        p1_index = self._members.index(self._p1) if self._p1 else 255
+        return PACKED_HEADER.pack(p1_index, *stats, len(self._queue)) + \
+            bytes(self._queue)
+
+    def members(self) -> Tuple['Character', ...]:
+        """
+        Return the characters playing in this BattleQueue, in the order
+        pack() numbers them.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue, Mage
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Mage("m", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c2)
+        >>> bq.add(c)
+        >>> bq.members()
+        (m (Mage): 100/100, r (Rogue): 100/100)
+        """
+        return self._members
+
+    def _unpack_contents(self, new_battle_queue: 'BattleQueue',
+                         data: bytes) -> int:
+        """
+        Make the empty new_battle_queue hold copies of this BattleQueue's
+        characters in the game state packed in data by pack(). Return where
+        the rest of data starts.
+        """
+        p1_index, hp0, sp0, hp1, sp1, length = \
+            PACKED_HEADER.unpack_from(data)
+        offset = PACKED_HEADER.size
+        if p1_index == 255:
+            return offset
+        copies = [member.copy(new_battle_queue) for member in self._members]
+        copies[0].enemy = copies[1]
+        copies[1].enemy = copies[0]
+        for copy, hp, sp in zip(copies, [hp0, hp1], [sp0, sp1]):
+            copy.set_hp(hp)
+            copy.set_sp(sp)
+        new_battle_queue._members = tuple(copies)
+        new_battle_queue._p1 = copies[p1_index]
+        new_battle_queue._p2 = copies[p1_index].enemy
+        for index in data[offset:offset + length]:
+            new_battle_queue._push_index(index)
+        return offset + length
+
+    def unpack(self, data: bytes) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the game state packed in data by pack(),
+        played by copies of the characters in this BattleQueue. data must
+        have been packed from this BattleQueue or a copy of it.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> data = bq.pack()
+        >>> bq.peek().attack()
+        >>> bq.unpack(data)
+        r (Rogue): 100/100 -> r2 (Rogue): 100/100
+        >>> bq.unpack(data).state_hash() == bq.unpack(data).state_hash()
+        True
+        """
+        new_battle_queue = BattleQueue(type(self._queue))
+        self._unpack_contents(new_battle_queue, data)
         return new_battle_queue
 
+    def state_hash(self) -> int:
+        """
+        Return a 64-bit hash of the game state in this BattleQueue: the
+        characters in it, in order, and both players' types, HP and SP.
+
+        This takes O(1) time, so it can be used to key transposition tables.
+
+        >>> bq = BattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> new_bq = bq.copy()
+        >>> new_bq.state_hash() == bq.state_hash()
+        True
+        >>> new_bq.peek().attack()
+        >>> new_bq.state_hash() == bq.state_hash()
+        False
+        >>> new_bq.remove()
+        r (Rogue): 100/97
+        >>> c.set_sp(97)
+        >>> c2.set_hp(95)
+        >>> bq.remove()
+        r (Rogue): 100/97
+        >>> bq.add(c)
+        >>> new_bq.state_hash() == bq.state_hash()
+        True
+        """
+        value = self._content_hash.value
+        if self._p1 is not None:
+            value ^= zobrist_key(FIRST_PLAYER_SLOT,
+                                 self._members.index(self._p1))
+            value ^= zobrist_key(FIRST_PLAYER, self._p1.get_hash() ^
+                                 string_key(CHARACTER_TYPE,
+                                            self._p1.get_character_type()))
+            value ^= zobrist_key(SECOND_PLAYER, self._p2.get_hash() ^
+                                 string_key(CHARACTER_TYPE,
+                                            self._p2.get_character_type()))
+        return mix(value)
+
     def __repr__(self) -> str:
         """
         Return a representation of this BattleQueue.
@@ -241,7 +554,8 @@ class BattleQueue:
         >>> bq
         r (Rogue): 100/100 -> r2 (Rogue): 100/100
         """
-        return " -> ".join([repr(character) for character in self._content])
+        return " -> ".join([repr(self._members[index])
+                            for index in self._queue])
 
 
 class RestrictedBattleQueue(BattleQueue):
@@ -280,7 +594,9 @@ class RestrictedBattleQueue(BattleQueue):
       Able to add:     Y    Y    N    Y
 
     able_to_add_list - A list that stores the information of character's ability
-     to add
+     to add. It is kept in the same kind of queue store as the characters, so
+     this read-only property returns a new list each time it is read, and
+     changing that list does not change the RestrictedBattleQueue.
     first_time_addition_counter - A list that stores the information of first 
      rule(first time add: able to add)
     """
@@ -288,7 +604,7 @@ class RestrictedBattleQueue(BattleQueue):
     first_time_addition_counter: list
 
     # TODO: Implement the RestrictedBattleQueue class
-    def __init__(self) -> None:
+    def __init__(self, store: type = ListStore) -> None:
         """
         Initialization of RestrictedBattleQueue class.
         >>> bq = RestrictedBattleQueue()
@@ -297,10 +613,33 @@ class RestrictedBattleQueue(BattleQueue):
         >>> bq.is_empty()
         True
         """
-        super().__init__()
-        self.able_to_add_list = []
+        super().__init__(store)
+        self._able = store()
+        self._able_hash = RollingHash()
         self.first_time_addition_counter = []
 
+    @property
+    def able_to_add_list(self) -> list:
+        """
+        Return a list of whether each character can add, from front to back.
+        """
+        return list(self._able)
+
+    def _push_able(self, entry: str) -> None:
+        """
+        Append entry to the back of able_to_add_list and update its hash.
+        """
+        self._able = self._able.push(entry)
+        self._able_hash.push(string_key(ABLE_TO_ADD, entry))
+
+    def _pop_able(self) -> None:
+        """
+        Remove the entry at the front of able_to_add_list and update its hash.
+        """
+        entry = self._able.peek()
+        self._able = self._able.pop()
+        self._able_hash.pop(string_key(ABLE_TO_ADD, entry))
+
     def add(self, character: 'Character') -> None:
         """
         Add a character into the RestrictedBattleQueue based on the first 
@@ -318,41 +657,38 @@ class RestrictedBattleQueue(BattleQueue):
         >>> print(bq)
         Sophia (Rogue): 100/100
         """
-        if self._content == [] and self.first_time_addition_counter == []:
-            self.able_to_add_list.append(character.get_name() + 'Y')
+        if not self._queue and self.first_time_addition_counter == []:
+            self._push_able(character.get_name() + 'Y')
             self.first_time_addition_counter.append([character.get_name(), 1])
             self.first_time_addition_counter.append(
                 [character.enemy.get_name(), 0])
-            self._content.append(character)
             if not self._p1:
-                self._p1 = character
-                self._p2 = character.enemy
+                self._set_players(character)
+            self._push(character)
         else:
-            if self._content[0] == character:
-                if self.able_to_add_list[0][-1] == 'Y' and \
-                        self.able_to_add_list.count(character.get_name() + 'Y')\
-                        == 2:
-                    self.able_to_add_list.append(character.get_name() + 'N')
-                    self._content.append(character)
-                if self.able_to_add_list[0][-1] == 'Y' and \
-                        self.able_to_add_list.count(character.get_name() + 'Y')\
-                        == 1:
-                    self.able_to_add_list.append(character.get_name() + 'Y')
-                    self._content.append(character)
-            if self._content[0] != character:
-                if self.able_to_add_list[0][-1] == 'Y' and \
+            if self._front() == character:
+                if self._able.peek()[-1] == 'Y' and \
+                        self._able.count(character.get_name() + 'Y') == 2:
+                    self._push_able(character.get_name() + 'N')
+                    self._push(character)
+                if self._able.peek()[-1] == 'Y' and \
+                        self._able.count(character.get_name() + 'Y') == 1:
+                    self._push_able(character.get_name() + 'Y')
+                    self._push(character)
+            if self._front() != character:
+                if self._able.peek()[-1] == 'Y' and \
                     self.first_time_addition_counter[0][1] == 1 and \
                     self.first_time_addition_counter[1][1] == 0 and \
                         self.peek().get_hp() == 100 and \
                         self.peek().get_sp() == 100 and \
-                        len(self.able_to_add_list) == 1 and \
-                        len(self._content) == 1:
-                    self.able_to_add_list.append(character.get_name() + 'Y')
-                    self._content.append(character)
+                        len(self._able) == 1 and \
+                        len(self._queue) == 1:
+                    self._push_able(character.get_name() + 'Y')
+                    self._push(character)
                     self.first_time_addition_counter[1][1] = 1
-                elif self.able_to_add_list[0][-1] == 'Y':
-                    self.able_to_add_list.append(character.get_name() + 'N')
-                    self._content.append(character)
+                elif self._able.peek()[-1] == 'Y':
+                    self._push_able(character.get_name() + 'N')
+                    self._push(character)
 
     def remove(self) -> 'Character':
         """
@@ -375,16 +711,16 @@ class RestrictedBattleQueue(BattleQueue):
         >>> bq.able_to_add_list
         []
         """
-        while self._content and self._content[0].get_available_actions() == []:
-            self._content.pop(0)
-            self.able_to_add_list.pop(0)
-        self.able_to_add_list.pop(0)
-        return self._content.pop(0)
+        while self._queue and self._front().get_available_actions() == []:
+            self._pop_front()
+            self._pop_able()
+        self._pop_able()
+        return self._pop_front()
 
     def empty_queue(self) -> None:
         """
         Make the RestrictedBattleQueue attributes empty.
-        Used in Sorcerer's SpecialAttack only.
+        Used by reset_to when a Sorcerer's SpecialAttack resets the queue.
         >>> bq = RestrictedBattleQueue()
         >>> from a2_characters import Rogue
         >>> from a2_playstyle import ManualPlaystyle
@@ -401,16 +737,55 @@ class RestrictedBattleQueue(BattleQueue):
         >>> bq.able_to_add_list
         []
         """
-        self._content = []
+        self._clear()
         self.first_time_addition_counter = []
-        self.able_to_add_list = []
+        self._able = type(self._able)()
+        self._able_hash.clear()
+
+    def reset_to(self, sequence: List['Character']) -> None:
+        """
+        Replace the contents of this RestrictedBattleQueue with the characters
+        in sequence, in order. The ability to add of each character is decided
+        by the usual rules, as if the queue had been emptied with empty_queue
+        and each character added in turn.
 
-    def copy(self) -> 'RestrictedBattleQueue':
+        >>> bq = RestrictedBattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> c.set_sp(80)
+        >>> bq.reset_to([c, c2, c])
+        >>> bq
+        r (Rogue): 100/80 -> r2 (Rogue): 100/100 -> r (Rogue): 100/80
+        >>> bq.able_to_add_list
+        ['rY', 'r2N', 'rY']
+        """
+        self.empty_queue()
+        for character in sequence:
+            self.add(character)
+
+    def normalize(self) -> None:
+        """
+        Do nothing. Unlike in a BattleQueue, entries that can never be played
+        still count towards how many copies of a character can add, so
+        removing them could change the rest of the game.
+        """
+
+    def copy(self, store: type = None) -> 'RestrictedBattleQueue':
         """
         Return a copy of this RestrictedBattleQueue. The copy contains copies of
         the characters inside this RestrictedBattleQueue, so any changes that 
         rely on the copy do not affect this RestrictedBattleQueue.
 
+        The copy keeps who is in it, and whether they can add, in stores of the
+        class store, or of the same class as this RestrictedBattleQueue's if
+        store is None.
+
         >>> bq = RestrictedBattleQueue()
         >>> from a2_characters import Rogue
         >>> from a2_playstyle import ManualPlaystyle
@@ -432,21 +807,125 @@ class RestrictedBattleQueue(BattleQueue):
         r (Rogue): 100/100 -> r2 (Rogue): 100/100
         """
         new_battle_queue = RestrictedBattleQueue()
-        new_battle_queue.able_to_add_list = ['Y']
+        self._copy_contents(new_battle_queue, store)
+        if store is None:
+            new_battle_queue._able = self._able.share()
+        else:
+            new_battle_queue._able = store(self._able)
+        new_battle_queue._able_hash = self._able_hash.copy()
+        new_battle_queue.first_time_addition_counter = [
+            entry[:] for entry in self.first_time_addition_counter]
+        return new_battle_queue
 
-        p1_copy = self._p1.copy(new_battle_queue)
-        p2_copy = self._p2.copy(new_battle_queue)
-        p1_copy.enemy = p2_copy
-        p2_copy.enemy = p1_copy
+    def _name_index(self, name: str) -> int:
+        """
+        Return the index of the first character playing whose name is name.
+        """
+        return 0 if self._members[0].get_name() == name else 1
+
+    def pack(self) -> bytes:
+        """
+        Return the game state in this RestrictedBattleQueue packed into a few
+        bytes, including whether each character can add. Use unpack() to get
+        it back.
 
-        for character in self._content:
-            if character == self._p1:
-                new_battle_queue.add(p1_copy)
-            else:
-                new_battle_queue.add(p2_copy)
-        new_battle_queue.able_to_add_list = self.able_to_add_list[:]
+        >>> bq = RestrictedBattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> len(bq.pack())
+        29
+        """
+        able = bytes(2 * self._name_index(entry[:-1]) + (entry[-1] == 'Y')
+                     for entry in self._able)
+        counter = bytes(2 * self._name_index(name) + added
+                        for name, added in self.first_time_addition_counter)
+        return super().pack() + PACKED_LENGTH.pack(len(able)) + able + \
+            PACKED_LENGTH.pack(len(counter)) + counter
+
+    def unpack(self, data: bytes) -> 'RestrictedBattleQueue':
+        """
+        Return a new RestrictedBattleQueue in the game state packed in data by
+        pack(), played by copies of the characters in this
+        RestrictedBattleQueue.
+
+        >>> bq = RestrictedBattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> new_bq = bq.unpack(bq.pack())
+        >>> new_bq.able_to_add_list
+        ['rY', 'r2Y']
+        >>> new_bq.state_hash() == bq.state_hash()
+        True
+        """
+        new_battle_queue = RestrictedBattleQueue(type(self._queue))
+        offset = self._unpack_contents(new_battle_queue, data)
+        names = [member.get_name() for member in self._members]
+        able, offset = _read_entries(data, offset)
+        for entry in able:
+            new_battle_queue._push_able(names[entry // 2] +
+                                        ('Y' if entry % 2 else 'N'))
+        counter, offset = _read_entries(data, offset)
+        new_battle_queue.first_time_addition_counter = [
+            [names[entry // 2], entry % 2] for entry in counter]
         return new_battle_queue
 
+    def state_hash(self) -> int:
+        """
+        Return a 64-bit hash of the game state in this RestrictedBattleQueue:
+        the characters in it, in order, whether each of them can add, and both
+        players' types, HP and SP.
+
+        This takes O(1) time, so it can be used to key transposition tables.
+
+        >>> bq = RestrictedBattleQueue()
+        >>> from a2_characters import Rogue
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> c = Rogue("r", bq, ManualPlaystyle(bq))
+        >>> c2 = Rogue("r2", bq, ManualPlaystyle(bq))
+        >>> c.enemy = c2
+        >>> c2.enemy = c
+        >>> bq.add(c)
+        >>> bq.add(c2)
+        >>> new_bq = bq.copy()
+        >>> new_bq.state_hash() == bq.state_hash()
+        True
+        >>> new_bq.able_to_add_list
+        ['rY', 'r2Y']
+        >>> new_bq.peek().attack()
+        >>> new_bq.able_to_add_list
+        ['rY', 'r2Y', 'rY']
+        >>> new_bq.state_hash() == bq.state_hash()
+        False
+        """
+        counter = 0
+        for i, (_, added) in enumerate(self.first_time_addition_counter):
+            counter |= (added + 2) << (2 * i)
+        return mix(super().state_hash() ^
+                   zobrist_key(ABLE_TO_ADD, self._able_hash.value) ^
+                   zobrist_key(ADDITION_COUNTER, counter))
+
+
+def _read_entries(data: bytes, offset: int) -> Tuple[bytes, int]:
+    """
+    Return the length-prefixed entries at offset in data, and where the rest
+    of data starts.
+    """
+    length, = PACKED_LENGTH.unpack_from(data, offset)
+    offset += PACKED_LENGTH.size
+    return data[offset:offset + length], offset + length
+
 
 if __name__ == '__main__':
     import python_ta
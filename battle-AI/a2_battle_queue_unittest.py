@@ -0,0 +1,95 @@
+"""
+Unittests for BattleQueue.normalize for A2.
+
+These tests check that removing the entries a character can never play
+does not change how a game goes, and that it makes more states share a
+state_hash().
+"""
+import random
+import unittest
+
+from a2_game import CHARACTER_CLASSES
+from a2_battle_queue import BattleQueue
+from a2_playstyle import get_state_score
+from a2_test_support import make_queue
+
+
+def play(bq, rng, moves, normalize):
+    """
+    Return the (name, action) of every turn taken in up to moves random turns
+    chosen by rng in bq, normalizing bq after every turn if normalize is True.
+    """
+    turns = []
+    for _ in range(moves):
+        if bq.is_over():
+            break
+        character = bq.peek()
+        action = rng.choice(character.get_available_actions())
+        turns.append((character.get_name(), action))
+        if action == 'A':
+            character.attack()
+        else:
+            character.special_attack()
+        if not bq.is_empty():
+            bq.remove()
+        if normalize:
+            bq.normalize()
+    return turns
+
+
+class NormalizeUnitTests(unittest.TestCase):
+    def test_normalize_keeps_the_game(self):
+        """
+        Test to make sure the same random choices play out the same way with
+        and without normalizing the BattleQueue after every turn.
+        """
+        for p1_class in CHARACTER_CLASSES.values():
+            for p2_class in CHARACTER_CLASSES.values():
+                for seed in range(10):
+                    games = []
+                    for normalize in [False, True]:
+                        bq = make_queue(BattleQueue, p1_class, p2_class,
+                                        (100, 100, 100, 100))
+                        turns = play(bq, random.Random(seed), 100, normalize)
+                        games.append((turns, repr(bq.get_winner())))
+                    self.assertEqual(games[0], games[1],
+                                     ("Normalizing changed the game from:\n" +
+                                      "{}\nto:\n{}").format(*games))
+
+    def test_normalize_keeps_the_score(self):
+        """
+        Test to make sure normalizing a BattleQueue does not change its score.
+        """
+        bq = make_queue(BattleQueue, CHARACTER_CLASSES['r'],
+                        CHARACTER_CLASSES['v'], (30, 7, 20, 40))
+        for _ in range(3):
+            bq.add(bq.peek())
+        expected = get_state_score(bq)
+        bq.normalize()
+        actual = get_state_score(bq)
+        self.assertEqual(expected, actual,
+                         ("Normalizing changed the score from {} to {}."
+                          ).format(expected, actual))
+
+    def test_normalize_shares_state_hash(self):
+        """
+        Test to make sure two BattleQueues that only differ in entries that
+        can never be played get the same state_hash() once normalized.
+        """
+        short = make_queue(BattleQueue, CHARACTER_CLASSES['m'],
+                           CHARACTER_CLASSES['r'], (50, 8, 50, 8))
+        long = make_queue(BattleQueue, CHARACTER_CLASSES['m'],
+                          CHARACTER_CLASSES['r'], (50, 8, 50, 8))
+        for _ in range(2):
+            short.add(short.peek())
+        for _ in range(4):
+            long.add(long.peek())
+        self.assertNotEqual(short.state_hash(), long.state_hash())
+        short.normalize()
+        long.normalize()
+        self.assertEqual(short.state_hash(), long.state_hash(),
+                         "Normalized BattleQueues should hash the same.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,369 @@
+"""
+Benchmarks for A2.
+
+Run this file to time get_state_score and every Playstyle's select_attack on
+a fixed catalog of positions: every class pairing, both kinds of
+BattleQueue, and the HP/SP mixes used by the minimax unittests. Results can be
+saved as JSON and compared against a saved baseline to flag regressions.
+
+    python a2_benchmark.py --output results.json
+    python a2_benchmark.py --baseline results.json
+
+These are not unittests; they only report timings.
+"""
+from typing import Callable, Dict, List, Tuple
+import argparse
+import json
+import sys
+import time
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES
+from a2_battle_queue import BattleQueue
+from a2_characters import Rogue, Sorcerer
+from a2_opening_book import build_queue
+from a2_playstyle import ManualPlaystyle, get_state_score
+from a2_queue_stores import ListStore, PersistentStore, RunLengthStore
+from a2_skill_decision_tree import create_default_tree
+from a2_tree_of_states import FRONTIER_MEMORY_LIMIT, StateDAG, \
+    iter_frontiers
+
+QUEUE_LENGTHS = [100, 1000, 10000]
+QUEUE_STORES = [ListStore, RunLengthStore, PersistentStore]
+
+# Each position is (P1 HP, P1 SP, P2 HP, P2 SP) and whether P1 is added to
+# the BattleQueue a second time, as in the minimax unittests.
+POSITIONS = {'opening': ((100, 100, 100, 100), False),
+             'one_attack': ((100, 5, 100, 100), False),
+             'to_win': ((40, 10, 100, 30), True),
+             'opponent_can_kill': ((40, 6, 14, 35), True),
+             'special_to_win': ((30, 100, 5, 30), True),
+             'rogue_attack': ((100, 12, 28, 100), False),
+             'rogue_special': ((20, 100, 27, 100), False)}
+
+# Positions that take minutes or more to search exhaustively.
+SLOW_POSITIONS = ['opening']
+
+# 'score' is get_state_score; the rest are keys of PLAYSTYLE_CLASSES.
+SUBJECTS = ['score', 'r', 'mr', 'mi']
+
+# Stop repeating a measurement once a single run takes this many seconds.
+REPEAT_CUTOFF = 1.0
+
+
+def build_rogue_special_queue(length: int) -> Tuple[BattleQueue, 'Character']:
+    """
+    Return a BattleQueue with a Sorcerer at the front followed by about length
+    copies of a Rogue, built by having the Rogue use its special attack over
+    and over. Also return the Sorcerer.
+
+    >>> bq, s = build_rogue_special_queue(10)
+    >>> bq.peek() is s
+    True
+    >>> len(repr(bq).split(" -> "))
+    12
+    """
+    bq = BattleQueue()
+    s = Sorcerer("s", bq, ManualPlaystyle(bq))
+    s.set_skill_decision_tree(create_default_tree())
+    r = Rogue("r", bq, ManualPlaystyle(bq))
+    s.enemy = r
+    r.enemy = s
+    r.set_sp(10 * length + 100)
+    bq.add(s)
+    bq.add(r)
+    for _ in range(length // 2):
+        r.special_attack()
+    s.set_hp(100)
+    return bq, s
+
+
+def drain_and_refill(bq: BattleQueue, sequence: List['Character']) -> None:
+    """
+    Replace the contents of bq with sequence the way SorcererSpecial used to,
+    by removing one character at a time until bq is empty.
+    """
+    while not bq.is_empty():
+        bq.remove()
+    for character in sequence:
+        bq.add(character)
+
+
+def time_reset(length: int,
+               reset: Callable[[BattleQueue, List['Character']], None]) \
+        -> float:
+    """
+    Return the number of seconds reset takes to replace the contents of a
+    queue of about length characters built by build_rogue_special_queue.
+    """
+    bq, s = build_rogue_special_queue(length)
+    start = time.perf_counter()
+    reset(bq, [s, s.enemy, s])
+    return time.perf_counter() - start
+
+
+def benchmark_sorcerer_special_reset() -> None:
+    """
+    Print how long it takes to reset long queues with reset_to compared to
+    draining them one character at a time.
+    """
+    print("SorcererSpecial queue reset (normal BattleQueue)")
+    for length in QUEUE_LENGTHS:
+        bulk = time_reset(length, BattleQueue.reset_to)
+        drain = time_reset(length, drain_and_refill)
+        print("  {:>6} characters: reset_to {:.6f}s, drain {:.6f}s".format(
+            length, bulk, drain))
+
+
+def time_copy(length: int, store: type) -> float:
+    """
+    Return the number of seconds it takes to copy a queue of about length
+    characters built by build_rogue_special_queue, once it is kept in a store
+    of the class store.
+    """
+    bq, _ = build_rogue_special_queue(length)
+    bq = bq.copy(store)
+    start = time.perf_counter()
+    bq.copy()
+    return time.perf_counter() - start
+
+
+def benchmark_queue_copy() -> None:
+    """
+    Print how long it takes to copy long queues kept in each kind of queue
+    store.
+    """
+    print("BattleQueue copy (normal BattleQueue)")
+    for length in QUEUE_LENGTHS:
+        print("  {:>6} characters: {}".format(length, ", ".join(
+            "{} {:.6f}s".format(store.__name__, time_copy(length, store))
+            for store in QUEUE_STORES)))
+
+
+def position_key(queue_type: str, p1_type: str, p2_type: str,
+                 position: str) -> str:
+    """
+    Return the key used for a position in benchmark results.
+
+    >>> position_key('n', 'm', 'r', 'to_win')
+    'n/m-r/to_win'
+    """
+    return "{}/{}-{}/{}".format(queue_type, p1_type, p2_type, position)
+
+
+def build_position(queue_type: str, p1_type: str, p2_type: str,
+                   position: str) -> 'BattleQueue':
+    """
+    Return a new BattleQueue set up for the given position, where queue_type,
+    p1_type and p2_type are keys of BATTLE_QUEUE_CLASSES and CHARACTER_CLASSES.
+
+    >>> build_position('n', 'r', 'm', 'opponent_can_kill')
+    P1 (Rogue): 40/6 -> P2 (Mage): 14/35 -> P1 (Rogue): 40/6
+    """
+    stats, add_p1_again = POSITIONS[position]
+    bq = build_queue(BATTLE_QUEUE_CLASSES[queue_type],
+                     CHARACTER_CLASSES[p1_type], CHARACTER_CLASSES[p2_type],
+                     stats)
+    if add_p1_again:
+        bq.add(bq.members()[0])
+    return bq
+
+
+def catalog(include_slow: bool = False) -> List[Tuple[str, str, str, str]]:
+    """
+    Return every position in the benchmark catalog as
+    (queue type, P1 type, P2 type, position name).
+
+    >>> len(catalog())
+    192
+    >>> len(catalog(True))
+    224
+    """
+    positions = [name for name in POSITIONS
+                 if include_slow or name not in SLOW_POSITIONS]
+    return [(queue_type, p1_type, p2_type, position)
+            for queue_type in sorted(BATTLE_QUEUE_CLASSES)
+            for p1_type in sorted(CHARACTER_CLASSES)
+            for p2_type in sorted(CHARACTER_CLASSES)
+            for position in positions]
+
+
+def time_subject(entry: Tuple[str, str, str, str], subject: str,
+                 repeat: int) -> float:
+    """
+    Return the fastest of up to repeat timings, in seconds, of subject on a
+    freshly built copy of the position entry.
+    """
+    best = None
+    for _ in range(repeat):
+        bq = build_position(*entry)
+        if subject == 'score':
+            start = time.perf_counter()
+            get_state_score(bq)
+        else:
+            playstyle = PLAYSTYLE_CLASSES[subject](bq)
+            start = time.perf_counter()
+            playstyle.select_attack()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > REPEAT_CUTOFF:
+            break
+    return best
+
+
+def run_suite(entries: List[Tuple[str, str, str, str]], subjects: List[str],
+              repeat: int = 3, verbose: bool = False) \
+        -> Dict[str, Dict[str, float]]:
+    """
+    Return the timings of every subject on every position in entries, keyed
+    by position_key and then by subject.
+    """
+    results = {}
+    for entry in entries:
+        key = position_key(*entry)
+        results[key] = {}
+        for subject in subjects:
+            results[key][subject] = time_subject(entry, subject, repeat)
+            if verbose:
+                print("{:<28} {:<6} {:.6f}s".format(key, subject,
+                                                     results[key][subject]))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            tolerance: float = 0.25, min_seconds: float = 0.001) -> List[str]:
+    """
+    Return a description of every timing in results that is more than
+    tolerance (as a fraction) slower than the same timing in baseline.
+    Timings that differ by less than min_seconds are ignored as noise.
+
+    >>> compare({'n/m-r/to_win': {'mr': 0.5, 'r': 0.2}},
+    ...         {'n/m-r/to_win': {'mr': 0.2, 'r': 0.2}})
+    ['n/m-r/to_win mr: 0.200000s -> 0.500000s (+150%)']
+    """
+    regressions = []
+    for key in sorted(results):
+        for subject in sorted(results[key]):
+            old = baseline.get(key, {}).get(subject)
+            new = results[key][subject]
+            if old is None or new - old < min_seconds:
+                continue
+            if new > old * (1 + tolerance):
+                regressions.append("{} {}: {:.6f}s -> {:.6f}s ({:+.0%})"
+                                   .format(key, subject, old, new,
+                                           new / old - 1))
+    return regressions
+
+
+def report_dag(entries: List[Tuple[str, str, str, str]]) -> None:
+    """
+    Print, for every entry, how many nodes its tree of states has, how many
+    distinct states its StateDAG has, and how long the StateDAG took to
+    build and score.
+    """
+    for entry in entries:
+        start = time.perf_counter()
+        dag = StateDAG(build_position(*entry))
+        elapsed = time.perf_counter() - start
+        print("{:<28} tree {:>10} dag {:>6} ratio {:>8.2f} {:.4f}s".format(
+            position_key(*entry), dag.tree_size, len(dag),
+            dag.compression_ratio(), elapsed))
+
+
+def report_frontier(entries: List[Tuple[str, str, str, str]],
+                    memory_limit: int) -> None:
+    """
+    Print, for every entry, how many levels and nodes its tree of states has,
+    how many nodes its widest level has, and how many levels had to be
+    spilled to disk with the given memory_limit for each level.
+    """
+    for entry in entries:
+        start = time.perf_counter()
+        levels = nodes = widest = spilled = 0
+        for frontier in iter_frontiers(build_position(*entry),
+                                       memory_limit=memory_limit):
+            levels += 1
+            nodes += len(frontier)
+            widest = max(widest, len(frontier))
+            spilled += frontier.spilled
+        elapsed = time.perf_counter() - start
+        print(("{:<28} levels {:>3} nodes {:>10} widest {:>9} spilled {:>3} " +
+               "{:.4f}s").format(position_key(*entry), levels, nodes, widest,
+                                 spilled, elapsed))
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the benchmarks selected by the command line arguments in argv.
+    Return 1 if a regression against the baseline was found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--baseline',
+                        help="compare the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--subjects', nargs='+', default=SUBJECTS,
+                        choices=SUBJECTS)
+    parser.add_argument('--queues', nargs='+',
+                        default=sorted(BATTLE_QUEUE_CLASSES))
+    parser.add_argument('--pairings', nargs='+',
+                        help="class pairings to run, e.g. mr vs")
+    parser.add_argument('--positions', nargs='+', choices=sorted(POSITIONS))
+    parser.add_argument('--include-slow', action='store_true',
+                        help="also run " + ", ".join(SLOW_POSITIONS))
+    parser.add_argument('--queue-reset', action='store_true',
+                        help="only run the SorcererSpecial reset benchmark")
+    parser.add_argument('--queue-copy', action='store_true',
+                        help="only run the queue store copy benchmark")
+    parser.add_argument('--frontier', action='store_true',
+                        help="only walk each position's tree level by level, "
+                             "spilling large levels to disk")
+    parser.add_argument('--frontier-limit', type=int,
+                        default=FRONTIER_MEMORY_LIMIT // (1024 * 1024),
+                        help="megabytes of states to keep in memory per "
+                             "level with --frontier")
+    parser.add_argument('--dag', action='store_true',
+                        help="report how much merging equal states shrinks "
+                             "the tree of states of each position")
+    args = parser.parse_args(argv)
+
+    if args.queue_reset:
+        benchmark_sorcerer_special_reset()
+        return 0
+    if args.queue_copy:
+        benchmark_queue_copy()
+        return 0
+
+    entries = [entry for entry in catalog(args.include_slow or
+                                          bool(args.positions))
+               if entry[0] in args.queues and
+               (not args.pairings or entry[1] + entry[2] in args.pairings) and
+               (not args.positions or entry[3] in args.positions)]
+    if args.frontier:
+        report_frontier(entries, args.frontier_limit * 1024 * 1024)
+        return 0
+    if args.dag:
+        report_dag(entries)
+        return 0
+    results = run_suite(entries, args.subjects, args.repeat, verbose=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results},
+                      f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,8 +11,42 @@ in a2.pdf, as well as writing all documentation for them.
 Sorcerers must have a method called set_skill_decision_tree which takes in
 a SkillDecisionTree to be used whenever the Sorcerer attacks.
 """
-from typing import List
+from typing import Dict, List, Tuple
 from a2_skill_decision_tree import SkillDecisionTree
+from a2_hashing import HP, SP, stats_hash, zobrist_key
+
+# The hash of a new Character, with 100 HP and 100 SP.
+NEW_CHARACTER_HASH = stats_hash(100, 100)
+
+# The names of the classes in a2_skills of each type of character's attack
+# and special attack.
+SKILL_NAMES = {'mage': ('MageAttack', 'MageSpecial'),
+               'rogue': ('RogueAttack', 'RogueSpecial'),
+               'vampire': ('VampireAttack', 'VampireSpecial'),
+               'sorcerer': ('SorcererAttack', 'SorcererSpecial')}
+
+# The skills of each type of character, by action, made the first time a
+# character of that type is. Skills hold no state, so every character of a
+# type shares them; see get_skills.
+_SKILLS = {}
+
+
+def get_skills(character_type: str) -> Dict[str, 'Skill']:
+    """
+    Return the skills of a character of type character_type, by action.
+    Every call for a type returns the same dict, which must not be changed.
+
+    >>> type(get_skills('mage')['S']).__name__
+    'MageSpecial'
+    >>> get_skills('rogue') is get_skills('rogue')
+    True
+    """
+    if character_type not in _SKILLS:
+        import a2_skills
+        attack, special = SKILL_NAMES[character_type]
+        _SKILLS[character_type] = {'A': getattr(a2_skills, attack)(),
+                                   'S': getattr(a2_skills, special)()}
+    return _SKILLS[character_type]
 
 
 class Character:
@@ -36,6 +70,7 @@ class Character:
         self.playstyle = ps
         self._hp = 100
         self._sp = 100
+        self._hash = NEW_CHARACTER_HASH
         self._defense = 0
         self.enemy = None
 
@@ -65,6 +100,46 @@ class Character:
         """
         return self._sp
 
+    def get_hash(self) -> int:
+        """
+        Return a 64-bit hash of this Character's HP and SP.
+
+        The hash is updated whenever HP or SP change through reduce_sp,
+        apply_damage, set_sp or set_hp, so this takes O(1) time.
+        """
+        return self._hash
+
+    def get_character_type(self) -> str:
+        """
+        Return the type of this Character, e.g. 'mage' or 'rogue'.
+        """
+        return self._character_type
+
+    def get_skill(self, action: str) -> 'Skill':
+        """
+        Return the Skill this Character uses for action.
+        'A' corresponds to attack().
+        'S' corresponds to special_attack().
+        """
+        return self._skills[action]
+
+    def get_turns_left(self) -> int:
+        """
+        Return the most turns this Character can still take. No skill gives
+        back SP, so every turn costs at least as much SP as the cheapest skill.
+
+        >>> from a2_battle_queue import BattleQueue
+        >>> r = Rogue("r", BattleQueue(), None)
+        >>> r.set_sp(10)
+        >>> r.get_turns_left()
+        3
+        """
+        costs = [skill.get_sp_cost() for skill in self._skills.values()
+                 if skill is not None]
+        if not costs:
+            return 0
+        return self._sp // min(costs)
+
     def get_next_sprite(self) -> str:
         """
         Return the next sprite that needs to be drawn for this Character.
@@ -81,6 +156,31 @@ class Character:
 
         return sprite_to_return
 
+    def get_sprite_state(self) -> Tuple[str, int]:
+        """
+        Return the animation this Character is in, such as 'idle' or
+        'attack', and the frame of it get_next_sprite() draws next.
+
+        >>> from a2_battle_queue import BattleQueue
+        >>> r = Rogue("r", BattleQueue(), None)
+        >>> r.get_sprite_state()
+        ('idle', 0)
+        """
+        return self._current_state, self._current_frame
+
+    def set_sprite_state(self, state: str, frame: int) -> None:
+        """
+        Put this Character in frame frame of the animation state.
+
+        >>> from a2_battle_queue import BattleQueue
+        >>> r = Rogue("r", BattleQueue(), None)
+        >>> r.set_sprite_state('special', 9)
+        >>> r.get_next_sprite(), r.get_sprite_state()
+        ('rogue_special_9', ('idle', 0))
+        """
+        self._current_state = state
+        self._current_frame = frame
+
     def get_available_actions(self) -> List[str]:
         """
         Return a list of all actions that this Character can perform.
@@ -127,7 +227,9 @@ class Character:
         """
         Reduce this Character's SP by cost.
         """
+        self._hash ^= zobrist_key(SP, self._sp)
         self._sp -= cost
+        self._hash ^= zobrist_key(SP, self._sp)
 
     def apply_damage(self, damage: int) -> None:
         """
@@ -135,19 +237,23 @@ class Character:
         defense.
         """
         damage -= self._defense
+        self._hash ^= zobrist_key(HP, self._hp)
         self._hp -= damage
         self._hp = max(self._hp, 0)
+        self._hash ^= zobrist_key(HP, self._hp)
 
     def set_sp(self, new_sp: int) -> None:
         """
         Sets this Character's SP to new_sp.
         """
+        self._hash ^= zobrist_key(SP, self._sp) ^ zobrist_key(SP, new_sp)
         self._sp = new_sp
 
     def set_hp(self, new_hp: int) -> None:
         """
         Sets this Character's HP to new_hp.
         """
+        self._hash ^= zobrist_key(HP, self._hp) ^ zobrist_key(HP, new_hp)
         self._hp = new_hp
 
     def __repr__(self):
@@ -200,11 +306,9 @@ class Mage(Character):
         >>> c
         m (Mage): 100/100
         """
-        from a2_skills import MageAttack, MageSpecial
         super().__init__(name, bq, ps)
         self._character_type = 'mage'
-        self._skills['A'] = MageAttack()
-        self._skills['S'] = MageSpecial()
+        self._skills = get_skills('mage')
         self._defense = 8
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'Mage':
@@ -267,11 +371,9 @@ class Rogue(Character):
         >>> c
         r (Rogue): 100/100
         """
-        from a2_skills import RogueAttack, RogueSpecial
         super().__init__(name, bq, ps)
         self._character_type = 'rogue'
-        self._skills['A'] = RogueAttack()
-        self._skills['S'] = RogueSpecial()
+        self._skills = get_skills('rogue')
         self._defense = 10
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'Rogue':
@@ -336,11 +438,9 @@ class Vampire(Character):
         >>> c
         v (Vampire): 100/100
         """
-        from a2_skills import VampireAttack, VampireSpecial
         super().__init__(name, bq, ps)
         self._character_type = 'vampire'
-        self._skills['A'] = VampireAttack()
-        self._skills['S'] = VampireSpecial()
+        self._skills = get_skills('vampire')
         self._defense = 3
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'Vampire':
@@ -404,11 +504,9 @@ class Sorcerer(Character):
         >>> c
         s (Sorcerer): 100/100
         """
-        from a2_skills import SorcererAttack, SorcererSpecial
         super().__init__(name, bq, ps)
         self._character_type = 'sorcerer'
-        self._skills['A'] = SorcererAttack()
-        self._skills['S'] = SorcererSpecial()
+        self._skills = get_skills('sorcerer')
         self._defense = 10
         self.skill_decision_tree = None
 
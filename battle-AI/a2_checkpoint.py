@@ -0,0 +1,216 @@
+"""
+Checkpointed exhaustive searches for A2.
+
+A full search from the start of a match can run for minutes, and a search
+that is killed loses everything it found. A CheckpointedSearch is the
+StateScoreSearch that get_state_score() runs, which keeps its work on an
+explicit stack, and every so often it saves its transposition table and its
+work stack to a checkpoint file. Run again with the same checkpoint file, it
+goes on from the last checkpoint instead of starting over.
+
+    python a2_checkpoint.py --queue n --p1 r --p2 m --checkpoint rm.a2c
+
+A transposition table can be shared by every search of the same kinds of
+BattleQueue and characters, so a CheckpointedSearch of another position of
+the same kinds goes on with the transposition table of a checkpoint, but not
+its work stack. a2_heatmap searches each grid of a pairing this way, with
+one checkpoint for the whole grid.
+
+A checkpoint file is a header followed by the transposition table, as an
+array of state hashes and an array of their scores, and then the work stack
+from the bottom up. Each frame of the stack is the packed BattleQueue being
+searched, how many of its children were searched and the best score found
+among them; the children themselves are found again when a checkpoint is
+loaded. A checkpoint is written to a temporary file that then replaces the
+old one, so a search killed while checkpointing still has the last one.
+"""
+from typing import Dict, List, Union
+import argparse
+import array
+import os
+import struct
+import sys
+import time
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES, \
+    CHARACTER_KEYS, BATTLE_QUEUE_KEYS
+from a2_opening_book import START_HP, START_SP, build_start
+from a2_playstyle import SearchStats, StateScoreSearch, _expand
+
+MAGIC = b'A2CK'
+VERSION = 2
+
+# The header of a checkpoint: the magic bytes, the version, the keys of the
+# kinds of BattleQueue and characters searched, the state hash of the
+# BattleQueue being searched, and how many scores and stack frames follow.
+HEADER = struct.Struct('<4sH3sQQI')
+
+# A frame of the work stack: the length of its packed BattleQueue, which
+# follows, how many of its children were searched, whether a best score was
+# found among them, and that score.
+FRAME = struct.Struct('<HB?i')
+
+
+class CheckpointedSearch(StateScoreSearch):
+    """
+    A StateScoreSearch that saves checkpoints, and goes on from the last one
+    when it is made again.
+
+    path - The checkpoint file.
+    interval - How many seconds go by between checkpoints.
+    checkpoints - How many checkpoints this CheckpointedSearch saved.
+    resumed - Whether this CheckpointedSearch went on from a checkpoint.
+    """
+    path: str
+    interval: float
+    checkpoints: int
+    resumed: bool
+
+    def __init__(self, battle_queue: 'BattleQueue', path: str,
+                 interval: float = 60.0,
+                 cache: Dict[int, int] = None) -> None:
+        """
+        Initialize this CheckpointedSearch of battle_queue. If cache is given,
+        it is the transposition table, and checkpoints are only written to
+        path. Otherwise the search goes on from the checkpoint at path if
+        there is one, taking only its transposition table if it is of
+        another position, and raising ValueError if it is of other kinds of
+        BattleQueue or characters.
+        """
+        super().__init__(battle_queue, {} if cache is None else cache)
+        self.path = path
+        self.interval = interval
+        self.checkpoints = 0
+        self.resumed = cache is None and os.path.exists(path)
+        self._last_checkpoint = time.monotonic()
+        if self.resumed:
+            self._load()
+
+    def run(self, stats: SearchStats = None,
+            max_nodes: int = None) -> Union[int, None]:
+        """
+        Run this search as StateScoreSearch.run does, and save a checkpoint
+        when it stops, whether or not it is done.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'rm.a2c')
+        >>> bq = build_start('n', 'r', 'm', 100, 100)
+        >>> CheckpointedSearch(bq, path).run(max_nodes=1000) is None
+        True
+        >>> search = CheckpointedSearch(bq, path)
+        >>> search.resumed, search.run()
+        (True, 30)
+        >>> os.remove(path)
+        """
+        self._last_checkpoint = time.monotonic()
+        score = super().run(stats, max_nodes)
+        self.save()
+        return score
+
+    def _expanded(self) -> None:
+        """
+        Save a checkpoint if interval seconds went by since the last one.
+        """
+        if time.monotonic() - self._last_checkpoint >= self.interval:
+            self.save()
+            self._last_checkpoint = time.monotonic()
+
+    def save(self) -> None:
+        """
+        Save the transposition table and work stack of this
+        CheckpointedSearch to its checkpoint file.
+        """
+        keys = array.array('Q', self.cache.keys())
+        scores = array.array('i', self.cache.values())
+        data = [HEADER.pack(MAGIC, VERSION, _kinds(self.battle_queue),
+                            self.battle_queue.state_hash(), len(keys),
+                            self.frames),
+                keys.tobytes(), scores.tobytes()]
+        for bq, _, index, best in self._stack:
+            packed = bq.pack()
+            data.append(FRAME.pack(len(packed), index, best is not None,
+                                   best or 0))
+            data.append(packed)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(b''.join(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.checkpoints += 1
+
+    def _load(self) -> None:
+        """
+        Load the transposition table and work stack saved in this
+        CheckpointedSearch's checkpoint file.
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        magic, version, kinds, root, count, frames = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} checkpoint".format(
+                self.path, VERSION))
+        if kinds != _kinds(self.battle_queue):
+            raise ValueError("{} is a checkpoint of another match".format(
+                self.path))
+        if root != self.battle_queue.state_hash():
+            frames = 0
+        offset = HEADER.size
+        keys, scores = array.array('Q'), array.array('i')
+        for table in [keys, scores]:
+            table.frombytes(data[offset:offset + table.itemsize * count])
+            offset += table.itemsize * count
+        self.cache = dict(zip(keys, scores))
+        for _ in range(frames):
+            length, index, has_best, best = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            bq = self.battle_queue.unpack(data[offset:offset + length])
+            offset += length
+            self._stack.append([bq, _expand(bq, None), index,
+                                best if has_best else None])
+
+
+def _kinds(battle_queue: 'BattleQueue') -> bytes:
+    """
+    Return the keys of the kinds of battle_queue and of its characters.
+
+    >>> _kinds(build_start('r', 's', 'v', 100, 100))
+    b'rsv'
+    """
+    return (BATTLE_QUEUE_KEYS[type(battle_queue)] +
+            ''.join(CHARACTER_KEYS[type(member)]
+                    for member in battle_queue.members())).encode()
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run a CheckpointedSearch from the start of a match with the options in
+    argv, and print its score.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--queue', default='n',
+                        choices=sorted(BATTLE_QUEUE_CLASSES))
+    parser.add_argument('--p1', default='r', choices=sorted(CHARACTER_CLASSES))
+    parser.add_argument('--p2', default='m', choices=sorted(CHARACTER_CLASSES))
+    parser.add_argument('--hp', type=int, default=START_HP)
+    parser.add_argument('--sp', type=int, default=START_SP)
+    parser.add_argument('--checkpoint', required=True, metavar='PATH')
+    parser.add_argument('--interval', type=float, default=60.0,
+                        help="seconds between checkpoints")
+    args = parser.parse_args(argv)
+
+    bq = build_start(args.queue, args.p1, args.p2, args.hp, args.sp)
+    search = CheckpointedSearch(bq, args.checkpoint, args.interval)
+    if search.resumed:
+        print("Resuming with {} scores and {} stack frames".format(
+            len(search.cache), search.frames))
+    stats = SearchStats()
+    score = search.run(stats)
+    print("{!r}: {}".format(bq, score))
+    print(stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Unittests for A2's checkpointed searches.
+
+These tests check that a CheckpointedSearch finds the same scores as
+get_state_score, whether it runs in one go or is stopped and resumed from
+its checkpoints many times, that it only takes the transposition table of a
+checkpoint of another position of the same match and will not resume from a
+checkpoint of another match, and that a2_heatmap's grids are checkpointed.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES
+from a2_checkpoint import CheckpointedSearch
+from a2_heatmap import score_grid
+from a2_playstyle import get_state_score
+from a2_test_support import make_start
+
+
+class CheckpointedSearchUnitTests(unittest.TestCase):
+    def setUp(self):
+        """
+        Make a directory for the checkpoints.
+        """
+        sys.setrecursionlimit(100000)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'search.a2c')
+
+    def tearDown(self):
+        """
+        Remove the checkpoints.
+        """
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def resume_until_done(self, battle_queue, max_nodes):
+        """
+        Return the score a CheckpointedSearch of battle_queue finds when it
+        is resumed from its checkpoint after every max_nodes game states,
+        and how many times it was run.
+        """
+        runs = 0
+        score = None
+        while score is None:
+            score = CheckpointedSearch(battle_queue, self.path).run(
+                max_nodes=max_nodes)
+            runs += 1
+        os.remove(self.path)
+        return score, runs
+
+    def test_scores_match_get_state_score(self):
+        """
+        Test to make sure a CheckpointedSearch finds get_state_score of the
+        start of every match, in one go and resumed many times.
+        """
+        for queue_type in BATTLE_QUEUE_CLASSES:
+            for p1_type in CHARACTER_CLASSES:
+                for p2_type in CHARACTER_CLASSES:
+                    bq = make_start(queue_type, p1_type, p2_type, 40, 30)
+                    expected = get_state_score(bq, None, {})
+                    whole = self.resume_until_done(bq, None)
+                    pieces = self.resume_until_done(bq, 10)
+                    self.assertEqual((expected, 1), whole,
+                                     ("A CheckpointedSearch should find " +
+                                      "the score of\n{}").format(bq))
+                    self.assertEqual(expected, pieces[0],
+                                     ("A resumed CheckpointedSearch should " +
+                                      "find the score of\n{}").format(bq))
+
+    def test_long_search_resumes(self):
+        """
+        Test to make sure a search with a deep work stack is resumed from its
+        checkpoints, and a finished one answers from its checkpoint.
+        """
+        bq = make_start('n', 'r', 'm', 100, 100)
+        score, runs = self.resume_until_done(bq, 200)
+        self.assertEqual((30, 13), (score, runs),
+                         "The search should take 13 runs to find 30.")
+        CheckpointedSearch(bq, self.path).run()
+        search = CheckpointedSearch(bq, self.path)
+        self.assertTrue(search.resumed,
+                        "The search should resume from its checkpoint.")
+        self.assertEqual(30, search.run(max_nodes=0),
+                         "A finished search should not search again.")
+
+    def test_frames_are_saved_and_loaded(self):
+        """
+        Test to make sure a resumed search has the frames of the work stack
+        its checkpoint was saved with, and none once it is done.
+        """
+        bq = make_start('n', 'r', 'm', 100, 100)
+        search = CheckpointedSearch(bq, self.path)
+        search.run(max_nodes=300)
+        resumed = CheckpointedSearch(bq, self.path)
+        self.assertEqual(search.frames, resumed.frames,
+                         "The resumed search should have {} frames.".format(
+                             search.frames))
+        resumed.run()
+        self.assertEqual(0, resumed.frames,
+                         "A finished search should have no frames.")
+
+    def test_other_positions_share_the_table(self):
+        """
+        Test to make sure a search of another position of the same match
+        goes on with the transposition table of a checkpoint, but not its
+        work stack.
+        """
+        CheckpointedSearch(make_start('n', 'r', 'm', 60, 40),
+                           self.path).run(max_nodes=300)
+        bq = make_start('n', 'r', 'm', 70, 40)
+        search = CheckpointedSearch(bq, self.path)
+        self.assertEqual((True, 0), (search.resumed, search.frames),
+                         "The search should only take the table.")
+        self.assertTrue(len(search.cache) > 0,
+                        "The search should have the checkpoint's table.")
+        self.assertEqual(get_state_score(bq, None, {}), search.run(),
+                         "The search should find the score of\n{}".format(
+                             bq))
+
+    def test_grids_are_checkpointed(self):
+        """
+        Test to make sure a grid of a2_heatmap searched with a checkpoint,
+        after a search of it was stopped and when it is searched again, has
+        the same scores as one searched without.
+        """
+        hps, sps = [20, 30, 40], [0, 20]
+        expected = score_grid('nvs', hps, sps)
+        CheckpointedSearch(make_start('n', 'v', 's', 30, 20),
+                           self.path).run(max_nodes=100)
+        for _ in range(2):
+            self.assertEqual(expected,
+                             score_grid('nvs', hps, sps, self.path),
+                             "A checkpointed grid should have the same " +
+                             "scores.")
+        search = CheckpointedSearch(make_start('n', 'v', 's', 40, 20),
+                                    self.path)
+        self.assertEqual(expected[-1][-1], search.run(max_nodes=0),
+                         "The checkpoint should have the whole grid.")
+
+    def test_other_checkpoints_are_rejected(self):
+        """
+        Test to make sure a checkpoint of another match raises ValueError.
+        """
+        CheckpointedSearch(make_start('n', 'r', 'm', 100, 100),
+                           self.path).run(max_nodes=5)
+        self.assertRaises(ValueError, CheckpointedSearch,
+                          make_start('n', 'r', 'v', 100, 100), self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'not a checkpoint' * 2)
+        self.assertRaises(ValueError, CheckpointedSearch,
+                          make_start('n', 'r', 'm', 100, 100), self.path)
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,144 @@
+"""
+Unittests for A2's ExpectimaxPlaystyle.
+
+These tests check the expected margins it finds against a search that does
+not cache them, that it wins by as much as it expects against an opponent
+that plays the way it models, that it does at least as well as minimax
+against random opponents, and that later moves are looked up in its cache.
+"""
+import sys
+import unittest
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES
+from a2_match import Match
+from a2_opening_book import play
+from a2_playstyle import ExpectimaxPlaystyle
+from a2_test_support import make_start
+
+MODELS = [None, {'A': 1, 'S': 0}, {'A': 1, 'S': 3}]
+
+
+def naive_margin(bq, name, model):
+    """
+    Return the expected HP margin at the end of the game in bq for the
+    character named name, against an opponent modelled by model, without
+    caching anything.
+    """
+    actions = [] if bq.is_over() else bq.peek().get_available_actions()
+    if not actions:
+        return sum(member.get_hp() if member.get_name() == name
+                   else -member.get_hp() for member in bq.members())
+    margins = [naive_margin(play(bq, action), name, model)
+               for action in actions]
+    if bq.peek().get_name() == name:
+        return max(margins)
+    weights = [1] * len(actions) if model is None else \
+        [model[action] for action in actions]
+    if not any(weights):
+        weights = [1] * len(actions)
+    return sum(weight * margin for weight, margin in
+               zip(weights, margins)) / sum(weights)
+
+
+def modelled_move(bq, model):
+    """
+    Return the move an opponent that always plays the most likely action in
+    model makes in bq.
+    """
+    actions = bq.peek().get_available_actions()
+    return max(actions, key=lambda action: model[action])
+
+
+class ExpectimaxUnitTests(unittest.TestCase):
+    def setUp(self):
+        """
+        Allow deep searches.
+        """
+        sys.setrecursionlimit(100000)
+
+    def test_margins_match_naive_search(self):
+        """
+        Test to make sure the expected margins are those of a search that
+        does not cache them, with every opponent model.
+        """
+        for queue_type in BATTLE_QUEUE_CLASSES:
+            for p1_type in CHARACTER_CLASSES:
+                for p2_type in CHARACTER_CLASSES:
+                    bq = make_start(queue_type, p1_type, p2_type, 20, 20)
+                    for model in MODELS:
+                        expected = naive_margin(bq, 'P1', model)
+                        margin = ExpectimaxPlaystyle(
+                            bq, model).expected_margin()
+                        self.assertAlmostEqual(
+                            expected, margin,
+                            msg=("The expected margin of\n{}\nagainst {} " +
+                                 "should be {}, not {}.").format(
+                                     bq, model, expected, margin))
+
+    def test_modelled_opponent_is_beaten_as_expected(self):
+        """
+        Test to make sure the game against an opponent that always plays the
+        way it is modelled ends with the expected margin.
+        """
+        model = {'A': 1, 'S': 0}
+        for p1_type in CHARACTER_CLASSES:
+            for p2_type in CHARACTER_CLASSES:
+                bq = make_start('n', p1_type, p2_type, 40, 40)
+                playstyle = ExpectimaxPlaystyle(bq, model)
+                expected = playstyle.expected_margin()
+                while not bq.is_over():
+                    if bq.peek().get_name() == 'P1':
+                        playstyle.battle_queue = bq
+                        bq = play(bq, playstyle.select_attack())
+                    else:
+                        bq = play(bq, modelled_move(bq, model))
+                margin = bq.members()[0].get_hp() - bq.members()[1].get_hp()
+                self.assertEqual(expected, margin,
+                                 ("A {} should beat a {} that always " +
+                                  "attacks by {}, not {}.").format(
+                                      p1_type, p2_type, expected, margin))
+
+    def test_does_better_than_minimax_against_random(self):
+        """
+        Test to make sure ExpectimaxPlaystyle ends games against a
+        RandomPlaystyle with at least the margin minimax does, on average.
+        """
+        for pairing in ['sr', 'mv']:
+            totals = {}
+            for key in ['mr', 'e']:
+                totals[key] = 0
+                for seed in range(10):
+                    match = Match('n', pairing[0], 'A', key, pairing[1], 'B',
+                                  'r', seed)
+                    for character in [match.p1, match.p2]:
+                        character.set_hp(40)
+                        character.set_sp(40)
+                    while not match.is_over:
+                        match.perform_attack()
+                    totals[key] += match.p1.get_hp() - match.p2.get_hp()
+            self.assertGreaterEqual(totals['e'], totals['mr'],
+                                    ("Expectimax should beat random " +
+                                     "players by at least as much as " +
+                                     "minimax does as {}.").format(pairing))
+
+    def test_later_moves_are_cached(self):
+        """
+        Test to make sure the moves after the first are chosen without
+        searching any game state again.
+        """
+        match = Match('n', 'r', 'A', 'e', 'm', 'B', 'r', 3)
+        match.p1.playstyle.enable_stats()
+        misses = []
+        while not match.is_over:
+            if match.battle_queue.peek() is match.p1:
+                match.perform_attack()
+                misses.append(match.p1.playstyle.stats.cache_misses)
+            else:
+                match.perform_attack()
+        self.assertGreater(misses[0], 0, "The first move should search.")
+        self.assertEqual([0] * (len(misses) - 1), misses[1:],
+                         "Later moves should only look up the cache.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -10,9 +10,9 @@ We will not grade the documentation of this file.
 """
 # Import classes as needed
 from a2_battle_queue import BattleQueue, RestrictedBattleQueue
-from a2_playstyle import ManualPlaystyle, RandomPlaystyle, RecursiveMinimax, IterativeMinimax
+from a2_playstyle import ManualPlaystyle, RandomPlaystyle, RecursiveMinimax, \
+    IterativeMinimax, ExpectimaxPlaystyle
 from a2_characters import Mage, Rogue, Vampire, Sorcerer
-from a2_skill_decision_tree import create_default_tree
 
 # Replace None with the name of your Character classes
 # v should map to your class for your Vampire
@@ -29,18 +29,28 @@ CHARACTER_CLASSES = {'m': Mage,
 PLAYSTYLE_CLASSES = {'m': ManualPlaystyle,
                      'r': RandomPlaystyle,
                      'mr': RecursiveMinimax,
-                     'mi': IterativeMinimax
+                     'mi': IterativeMinimax,
+                     'e': ExpectimaxPlaystyle
                     }
 
 BATTLE_QUEUE_CLASSES = {'n': BattleQueue,
                         'r': RestrictedBattleQueue
                         }
 
+# The keys of the character, Playstyle and BattleQueue classes, by class, for
+# the modules that save a match and have to name its classes.
+CHARACTER_KEYS = {cls: key for key, cls in CHARACTER_CLASSES.items()}
+PLAYSTYLE_KEYS = {cls: key for key, cls in PLAYSTYLE_CLASSES.items()}
+BATTLE_QUEUE_KEYS = {cls: key for key, cls in BATTLE_QUEUE_CLASSES.items()}
+
 # Do not change any of the code below
 # You may NOT use or modify any of the variables defined below within your code
 # they're only to be used by a1_game.py and a1_ui.py.
 # (i.e. don't reference BATTLE_QUEUE, LAST_KEY_PRESSED, P1, P2, GAME_IS_OVER,
 #  or GAME_WINNER anywhere in your code.)
+# The a2_match.Match being played. BATTLE_QUEUE, P1, P2, GAME_IS_OVER and
+# GAME_WINNER are kept in step with its attributes for the UIs.
+MATCH = None
 BATTLE_QUEUE = None
 LAST_KEY_PRESSED = None
 P1 = None
@@ -48,58 +58,51 @@ P2 = None
 GAME_IS_OVER = False
 GAME_WINNER = None
 
+# Set to an a2_profile.MatchProfiler to profile every call to perform_attack.
+PROFILER = None
+
+# Set to an a2_replay.ReplayWriter to record every attack performed.
+REPLAY = None
+
+# Set to True to let computer playstyles search ahead in the background while
+# a manual player decides on their move.
+PONDER = False
+
 def perform_attack():
     """
     Uses the next character's playstyle to decide on and perform an attack.
     """
-    global BATTLE_QUEUE, GAME_IS_OVER, GAME_WINNER, LAST_KEY_PRESSED
-    
-    # Get the next character in the battle queue, but don't remove them.
-    next_character = BATTLE_QUEUE.peek()
-    playstyle = next_character.playstyle
-    
-    # Uses the next character's playstyle to select an attack
-    if playstyle.is_manual:
-        move_to_make = playstyle.select_attack(LAST_KEY_PRESSED)
+    if PROFILER is None:
+        _perform_attack()
     else:
-        move_to_make = playstyle.select_attack()
-    
-    # Check if the next_character can make that action ('A' represents
-    # a normal attack, 'S' represents a special attack.)
-    # If a move that is not 'A' or 'S' is passed in, this should return False.
-    if next_character.is_valid_action(move_to_make):
-        if move_to_make == 'A':
-            next_character.attack()
-        else:
-            next_character.special_attack()
-
-        # Call remove() to remove the next_character from the battle_queue
-        # (if they still have SP; otherwise the next call to remove()
-        # should skip them)
-        if next_character.get_available_actions() != []:
-            BATTLE_QUEUE.remove()
-    
-    # Check if the game is over.
-    GAME_IS_OVER = BATTLE_QUEUE.is_over()
-    
-    # Get the winner of the game. If the game is not over yet, get_winner()
-    # should return None. Otherwise, it should return the character that won.
-    GAME_WINNER = BATTLE_QUEUE.get_winner()
+        PROFILER.run(_perform_attack)
+
+def _perform_attack():
+    """
+    Uses the next character's playstyle to decide on and perform an attack.
+    """
+    global GAME_IS_OVER, GAME_WINNER
+
+    # The Match records and ponders the way the UIs asked for.
+    MATCH.replay = REPLAY
+    MATCH.ponder = PONDER
+    MATCH.perform_attack(LAST_KEY_PRESSED)
+
+    # Check if the game is over, and get the winner of the game. If the game
+    # is not over yet, or ended in a tie, the winner is None.
+    GAME_IS_OVER = MATCH.is_over
+    GAME_WINNER = MATCH.winner
 
 def set_up_game():
     """
     Sets up the battle queue and characters for the game.
     """
-    global P1, P2, BATTLE_QUEUE
-    
     # Create a new battle queue
     bq = ''
     while bq not in list(BATTLE_QUEUE_CLASSES.keys()):
         bq = input("Select a Battle Queue type (n for a Normal Battle Queue, " +
                    "r for a Restricted Battle Queue): ").strip()
     
-    BATTLE_QUEUE = BATTLE_QUEUE_CLASSES[bq]()
-    
     # Get the parameters for the first character
     player_1 = ''
     player_1_playstyle = ''
@@ -115,7 +118,8 @@ def set_up_game():
         player_1_playstyle = input("Select a playstyle for the first " +
                                    "character (m for Manual, r for Random, " +
                                    "mr for Minimax (Recursive), " +
-                                   "mi for Minimax (Iterative)): ")
+                                   "mi for Minimax (Iterative), " +
+                                   "e for Expectimax): ")
         player_1_playstyle = player_1_playstyle.strip()
         
     # Get the parameters for the second character
@@ -133,37 +137,31 @@ def set_up_game():
         player_2_playstyle = input("Select a playstyle for the second " +
                                    "character (m for Manual, r for Random, " +
                                    "mr for Minimax (Recursive), " +
-                                   "mi for Minimax (Iterative)): ")
+                                   "mi for Minimax (Iterative), " +
+                                   "e for Expectimax): ")
         player_2_playstyle = player_2_playstyle.strip()
-    
-    # Store the classes in other variable names for convenience
-    P1_Character = CHARACTER_CLASSES[player_1]
-    P2_Character = CHARACTER_CLASSES[player_2]
-    p1_playstyle = PLAYSTYLE_CLASSES[player_1_playstyle](BATTLE_QUEUE)
-    p2_playstyle = PLAYSTYLE_CLASSES[player_2_playstyle](BATTLE_QUEUE)
-    
-    # Call the corresponding __init__ for each player's character class
-    # The parameters passed in are: their name, the battle queue and an 
-    # instance of their playstyle
-    P1 = P1_Character(player_1_name, BATTLE_QUEUE, p1_playstyle)
-    P2 = P2_Character(player_2_name, BATTLE_QUEUE, p2_playstyle)
-    
-    if player_1 == 's':
-        default_tree = create_default_tree()
-        P1.set_skill_decision_tree(default_tree)
-    
-    if player_2 == 's':
-        default_tree = create_default_tree()
-        P2.set_skill_decision_tree(default_tree)        
-    
-    # Set the enemy attribute of the characters
-    # You can assume this will be called before any attacks are performed
-    P1.enemy = P2
-    P2.enemy = P1
-    
-    # Add the characters to the Battle Queue
-    BATTLE_QUEUE.add(P1)
-    BATTLE_QUEUE.add(P2)
+
+    set_up_match(bq, player_1, player_1_name, player_1_playstyle,
+                 player_2, player_2_name, player_2_playstyle)
+
+def set_up_match(bq, player_1, player_1_name, player_1_playstyle,
+                 player_2, player_2_name, player_2_playstyle):
+    """
+    Sets up the battle queue and characters for the game without prompting.
+    bq, player_1, player_1_playstyle, player_2 and player_2_playstyle are
+    keys of BATTLE_QUEUE_CLASSES, CHARACTER_CLASSES and PLAYSTYLE_CLASSES.
+    """
+    global MATCH, P1, P2, BATTLE_QUEUE, GAME_IS_OVER, GAME_WINNER
+    # a2_match imports the classes above, so it is imported once they exist.
+    from a2_match import Match
+
+    MATCH = Match(bq, player_1, player_1_name, player_1_playstyle,
+                  player_2, player_2_name, player_2_playstyle)
+    BATTLE_QUEUE = MATCH.battle_queue
+    P1 = MATCH.p1
+    P2 = MATCH.p2
+    GAME_IS_OVER = MATCH.is_over
+    GAME_WINNER = MATCH.winner
 
 def update_ui():
     """
@@ -0,0 +1,146 @@
+"""
+Incremental 64-bit hashing for A2 game states.
+
+Characters keep a Zobrist-style hash of their HP and SP, updated whenever
+either changes. BattleQueues keep a RollingHash of who is in them, updated
+in O(1) whenever a character is added to the back or removed from the front.
+Together they let BattleQueue.state_hash() be computed in O(1), so search
+engines can key transposition tables by it.
+"""
+from functools import lru_cache
+
+MASK = (1 << 64) - 1
+
+# The kinds of values that are hashed, so equal values of different kinds
+# get unrelated keys.
+HP = 1
+SP = 2
+QUEUE_ENTRY = 3
+ABLE_TO_ADD = 4
+FIRST_PLAYER = 5
+SECOND_PLAYER = 6
+ADDITION_COUNTER = 7
+CHARACTER_TYPE = 8
+FIRST_PLAYER_SLOT = 9
+
+# An odd base has an inverse modulo 2 ** 64, which lets RollingHash remove
+# entries from the front.
+BASE = 0x9E3779B97F4A7C15
+BASE_INVERSE = pow(BASE, -1, 1 << 64)
+
+
+def mix(x: int) -> int:
+    """
+    Return x scrambled by the SplitMix64 finalizer.
+
+    >>> mix(0)
+    0
+    >>> mix(1) == mix(1) != mix(2)
+    True
+    """
+    x &= MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+def zobrist_key(kind: int, value: int) -> int:
+    """
+    Return the 64-bit key for value of the given kind.
+
+    >>> zobrist_key(HP, 100) == zobrist_key(HP, 100)
+    True
+    >>> zobrist_key(HP, 100) == zobrist_key(SP, 100)
+    False
+    """
+    return mix((kind << 56) ^ mix(value + 1))
+
+
+@lru_cache(maxsize=None)
+def string_key(kind: int, text: str) -> int:
+    """
+    Return the 64-bit key for the string text of the given kind. Unlike
+    Python's hash(), this is the same in every process.
+
+    >>> string_key(CHARACTER_TYPE, 'mage') == string_key(HP, 'mage')
+    False
+    """
+    key = zobrist_key(kind, len(text))
+    for character in text:
+        key = mix(key ^ ord(character))
+    return key
+
+
+def stats_hash(hp: int, sp: int) -> int:
+    """
+    Return the hash of a character with the given HP and SP.
+
+    >>> stats_hash(100, 100) == zobrist_key(HP, 100) ^ zobrist_key(SP, 100)
+    True
+    """
+    return zobrist_key(HP, hp) ^ zobrist_key(SP, sp)
+
+
+class RollingHash:
+    """
+    A hash of a sequence that can be updated in O(1) when a code is added to
+    the back or removed from the front of the sequence.
+
+    value - the hash of the sequence, sum(code_i * BASE ** i) modulo 2 ** 64.
+    """
+    value: int
+
+    def __init__(self) -> None:
+        """
+        Initialize this RollingHash as the hash of an empty sequence.
+
+        >>> RollingHash().value
+        0
+        """
+        self.value = 0
+        self._top = 1
+
+    def push(self, code: int) -> None:
+        """
+        Update this RollingHash for code being added to the back.
+
+        >>> h = RollingHash()
+        >>> h.push(5)
+        >>> h.push(7)
+        >>> h.value == (5 + 7 * BASE) % (1 << 64)
+        True
+        """
+        self.value = (self.value + code * self._top) & MASK
+        self._top = (self._top * BASE) & MASK
+
+    def pop(self, code: int) -> None:
+        """
+        Update this RollingHash for code being removed from the front.
+
+        >>> h = RollingHash()
+        >>> h.push(5)
+        >>> h.push(7)
+        >>> h.pop(5)
+        >>> g = RollingHash()
+        >>> g.push(7)
+        >>> h.value == g.value
+        True
+        """
+        self.value = ((self.value - code) * BASE_INVERSE) & MASK
+        self._top = (self._top * BASE_INVERSE) & MASK
+
+    def clear(self) -> None:
+        """
+        Update this RollingHash for the sequence being emptied.
+        """
+        self.value = 0
+        self._top = 1
+
+    def copy(self) -> 'RollingHash':
+        """
+        Return a copy of this RollingHash.
+        """
+        other = RollingHash()
+        other.value = self.value
+        other._top = self._top
+        return other
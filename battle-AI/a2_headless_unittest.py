@@ -0,0 +1,57 @@
+"""
+Unittests for running A2 without a display.
+
+These tests check that the modules used by headless tools, servers and
+search workers, and a2_ui itself, can be imported without importing pygame,
+and that characters share their skills instead of making new ones.
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+from a2_battle_queue import BattleQueue
+from a2_game import CHARACTER_CLASSES
+from a2_playstyle import ManualPlaystyle
+
+HEADLESS_MODULES = ['a2_game', 'a2_ui', 'a2_ui_nonpygame', 'a2_match',
+                    'a2_server', 'a2_search_service', 'a2_snapshot',
+                    'a2_replay', 'a2_checkpoint', 'a2_heatmap',
+                    'a2_opening_book', 'a2_benchmark', 'a2_profile']
+
+
+class HeadlessUnitTests(unittest.TestCase):
+    def test_pygame_is_not_imported(self):
+        """
+        Test to make sure no headless module imports pygame.
+        """
+        code = "import sys\nimport {}\nprint('pygame' in sys.modules)" \
+            .format(", ".join(HEADLESS_MODULES))
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual("False", result.stdout.strip(),
+                         ("Importing the headless modules should not " +
+                          "import pygame:\n{}").format(result.stderr))
+
+    def test_skills_are_shared(self):
+        """
+        Test to make sure characters of the same class, and their copies,
+        share their skills.
+        """
+        for character_class in CHARACTER_CLASSES.values():
+            bq = BattleQueue()
+            c = character_class("c", bq, ManualPlaystyle(bq))
+            c2 = character_class("c2", bq, ManualPlaystyle(bq))
+            c.enemy = c2
+            c2.enemy = c
+            c_copy = c.copy(BattleQueue())
+            for action in ['A', 'S']:
+                self.assertTrue(c.get_skill(action) is c2.get_skill(action)
+                                is c_copy.get_skill(action),
+                                ("Every {} should share its {} skill."
+                                 ).format(character_class.__name__, action))
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,280 @@
+"""
+Heatmaps of exact game values for A2.
+
+For balance analysis, this finds get_state_score() at the start of a match
+for every point of a grid of starting HP and SP, both characters starting
+with the same HP and SP, for each class pairing and kind of BattleQueue.
+The score is from P1's side: positive if P1 wins, by the HP P1 has left,
+negative if P2 wins and 0 for a tie.
+
+    python a2_heatmap.py --output heatmaps --hp-step 5 --sp-step 5
+
+Every grid of a pairing is searched with one transposition table, starting
+from the smallest HP and SP, so most of each search is looked up instead of
+searched again, and the pairings are searched side by side in worker
+processes. With --checkpoints, each pairing's grid is searched with
+a2_checkpoint.CheckpointedSearch and one checkpoint file for the pairing in
+that directory, so a run that is stopped goes on from its checkpoints when
+it is started again.
+
+The grids are saved to scores.npz in the output directory, one int32 array
+of shape (HP, SP) per pairing, named by the keys of its queue type and
+classes, along with the 'hp' and 'sp' axes; numpy.load() reads it, and so
+does load_arrays() when NumPy is not installed. Each grid is also drawn as
+a heatmap: a PNG if matplotlib is installed, and a PPM image if not.
+"""
+from typing import Dict, List, Tuple, Union
+import argparse
+import array
+import ast
+import concurrent.futures
+import os
+import struct
+import sys
+import zipfile
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES
+from a2_checkpoint import CheckpointedSearch
+from a2_opening_book import START_HP, START_SP, build_start
+from a2_playstyle import get_state_score
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# How many pixels wide and high each grid point is in a PPM heatmap.
+PPM_SCALE = 8
+
+
+def score_grid(pairing: str, hps: List[int], sps: List[int],
+               checkpoint: Union[str, None] = None,
+               interval: float = 60.0) -> List[List[int]]:
+    """
+    Return get_state_score() at the start of a match of pairing, its queue
+    type and classes, where both characters start with hp HP and sp SP, for
+    each hp in hps and sp in sps.
+
+    If checkpoint is given, the searches save a checkpoint there every
+    interval seconds and after every grid point, and go on from the one
+    already there.
+
+    >>> score_grid('nrm', [10, 30], [0, 20])
+    [[0, 10], [0, 10]]
+    """
+    cache = None if checkpoint else {}
+    scores = {}
+    for hp in sorted(hps):
+        for sp in sorted(sps):
+            bq = build_start(pairing[0], pairing[1], pairing[2], hp, sp)
+            if not checkpoint:
+                scores[hp, sp] = get_state_score(bq, None, cache)
+                continue
+            search = CheckpointedSearch(bq, checkpoint, interval, cache)
+            scores[hp, sp] = search.run()
+            cache = search.cache
+    return [[scores[hp, sp] for sp in sps] for hp in hps]
+
+
+def _score_grid(pairing: str, hps: List[int], sps: List[int],
+                checkpoint: Union[str, None]) -> List[List[int]]:
+    """
+    Return score_grid(pairing, hps, sps, checkpoint), in a worker process.
+    """
+    sys.setrecursionlimit(100000)
+    return score_grid(pairing, hps, sps, checkpoint)
+
+
+def score_grids(pairings: List[str], hps: List[int], sps: List[int],
+                workers: int = None, verbose: bool = False,
+                checkpoints: Union[str, None] = None
+                ) -> Dict[str, List[List[int]]]:
+    """
+    Return score_grid(pairing, hps, sps) for each of pairings, searched in
+    workers worker processes. If checkpoints is given, each pairing's grid
+    is checkpointed to the file named after the pairing in that directory.
+    """
+    grids = {}
+    if checkpoints:
+        os.makedirs(checkpoints, exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = {}
+        for pairing in pairings:
+            checkpoint = os.path.join(checkpoints, pairing + '.a2c') \
+                if checkpoints else None
+            futures[executor.submit(_score_grid, pairing, hps, sps,
+                                    checkpoint)] = pairing
+        for future in concurrent.futures.as_completed(futures):
+            grids[futures[future]] = future.result()
+            if verbose:
+                print("{} done ({}/{})".format(futures[future], len(grids),
+                                               len(pairings)))
+    return {pairing: grids[pairing] for pairing in pairings}
+
+
+def encode_npy(values: List[int], shape: Tuple[int, ...]) -> bytes:
+    """
+    Return values, laid out in shape in row-major order, as the bytes of an
+    int32 .npy file.
+
+    >>> decode_npy(encode_npy([1, -2, 3, 4, 5, 6], (2, 3)))
+    ((2, 3), [1, -2, 3, 4, 5, 6])
+    """
+    header = "{{'descr': '<i4', 'fortran_order': False, 'shape': {}, }}" \
+        .format(shape)
+    # The header, with its length and the magic bytes, is padded with spaces
+    # to a multiple of 64 bytes and ends in a newline.
+    padding = -(len(NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header = (header + ' ' * padding + '\n').encode('latin1')
+    data = array.array('i', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header + \
+        data.tobytes()
+
+
+def decode_npy(data: bytes) -> Tuple[Tuple[int, ...], List[int]]:
+    """
+    Return the shape and the values, in row-major order, of the int32 .npy
+    file data, raising ValueError if it is not one.
+    """
+    if data[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError("not a version 1.0 .npy file")
+    (length,) = struct.unpack_from('<H', data, len(NPY_MAGIC))
+    start = len(NPY_MAGIC) + 2
+    header = ast.literal_eval(data[start:start + length].decode('latin1'))
+    if header['descr'] != '<i4' or header['fortran_order']:
+        raise ValueError("not a row-major int32 array")
+    values = array.array('i', data[start + length:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return header['shape'], values.tolist()
+
+
+def save_arrays(path: str, grids: Dict[str, List[List[int]]],
+                hps: List[int], sps: List[int]) -> None:
+    """
+    Save grids, with the hps and sps they were found for, as int32 arrays in
+    the .npz file at path.
+    """
+    arrays = {'hp': encode_npy(hps, (len(hps),)),
+              'sp': encode_npy(sps, (len(sps),))}
+    for pairing, grid in grids.items():
+        arrays[pairing] = encode_npy([score for row in grid for score in row],
+                                     (len(hps), len(sps)))
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as f:
+        for name, data in arrays.items():
+            f.writestr(name + '.npy', data)
+
+
+def load_arrays(path: str) -> Dict[str, Tuple[Tuple[int, ...], List[int]]]:
+    """
+    Return the shape and values of each array in the .npz file at path, by
+    name.
+    """
+    with zipfile.ZipFile(path) as f:
+        return {name[:-len('.npy')]: decode_npy(f.read(name))
+                for name in f.namelist()}
+
+
+def _colour(score: int, scale: int) -> bytes:
+    """
+    Return the colour of score in a heatmap whose scores are at most scale
+    away from 0: red where P1 wins, blue where P2 wins and white for a tie.
+
+    >>> _colour(0, 10), _colour(10, 10), _colour(-5, 10)
+    (b'\\xff\\xff\\xff', b'\\xff\\x00\\x00', b'\\x80\\x80\\xff')
+    """
+    fade = 255 - 255 * abs(score) // scale
+    return bytes([255, fade, fade] if score > 0 else [fade, fade, 255])
+
+
+def render_ppm(path: str, grid: List[List[int]]) -> None:
+    """
+    Draw grid as a heatmap in the PPM image at path, HP going up and SP
+    going right.
+    """
+    scale = max(1, max(abs(score) for row in grid for score in row))
+    rows = []
+    for row in reversed(grid):
+        pixels = b''.join(_colour(score, scale) * PPM_SCALE for score in row)
+        rows.append(pixels * PPM_SCALE)
+    with open(path, 'wb') as f:
+        f.write("P6\n{} {}\n255\n".format(len(grid[0]) * PPM_SCALE,
+                                          len(grid) * PPM_SCALE).encode())
+        f.write(b''.join(rows))
+
+
+def render_heatmap(directory: str, pairing: str, grid: List[List[int]],
+                   hps: List[int], sps: List[int]) -> str:
+    """
+    Draw grid, the scores of pairing, as a heatmap in directory, with
+    matplotlib if it is installed, and return the path of the image.
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as pyplot
+    except ImportError:
+        path = os.path.join(directory, pairing + '.ppm')
+        render_ppm(path, grid)
+        return path
+    path = os.path.join(directory, pairing + '.png')
+    scale = max(1, max(abs(score) for row in grid for score in row))
+    figure, axes = pyplot.subplots()
+    image = axes.imshow(grid, cmap='RdBu_r', vmin=-scale, vmax=scale,
+                        origin='lower', aspect='auto',
+                        extent=(sps[0], sps[-1], hps[0], hps[-1]))
+    figure.colorbar(image, ax=axes, label="score for P1")
+    axes.set_xlabel("starting SP")
+    axes.set_ylabel("starting HP")
+    axes.set_title("{} vs {} ({})".format(
+        CHARACTER_CLASSES[pairing[1]].__name__,
+        CHARACTER_CLASSES[pairing[2]].__name__,
+        BATTLE_QUEUE_CLASSES[pairing[0]].__name__))
+    figure.savefig(path)
+    pyplot.close(figure)
+    return path
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Find and save the grids of scores with the options in argv, and draw
+    them.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--output', required=True, metavar='DIRECTORY')
+    parser.add_argument('--max-hp', type=int, default=START_HP)
+    parser.add_argument('--max-sp', type=int, default=START_SP)
+    parser.add_argument('--hp-step', type=int, default=10)
+    parser.add_argument('--sp-step', type=int, default=10)
+    parser.add_argument('--queues', nargs='+',
+                        default=sorted(BATTLE_QUEUE_CLASSES))
+    parser.add_argument('--pairings', nargs='+',
+                        help="P1 and P2 types, such as mr or vv")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="how many worker processes to search in")
+    parser.add_argument('--checkpoints', metavar='DIRECTORY',
+                        help="checkpoint each pairing's searches there")
+    args = parser.parse_args(argv)
+
+    hps = list(range(args.hp_step, args.max_hp + 1, args.hp_step))
+    sps = list(range(0, args.max_sp + 1, args.sp_step))
+    pairings = [queue_type + p1_type + p2_type
+                for queue_type in args.queues
+                for p1_type in sorted(CHARACTER_CLASSES)
+                for p2_type in sorted(CHARACTER_CLASSES)
+                if not args.pairings or p1_type + p2_type in args.pairings]
+    grids = score_grids(pairings, hps, sps, args.workers, verbose=True,
+                        checkpoints=args.checkpoints)
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, 'scores.npz')
+    save_arrays(path, grids, hps, sps)
+    print("Saved {} grids of {}x{} scores to {}".format(
+        len(grids), len(hps), len(sps), path))
+    for pairing, grid in grids.items():
+        print("Drew {}".format(render_heatmap(args.output, pairing, grid,
+                                              hps, sps)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Unittests for A2's heatmaps.
+
+These tests check that the grids of scores are those get_state_score finds
+for each start on its own, whether they are searched here or in worker
+processes, and that they are saved as .npz files and drawn as PPM images
+that can be read back.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+from a2_heatmap import PPM_SCALE, load_arrays, render_ppm, save_arrays, \
+    score_grid, score_grids
+from a2_playstyle import get_state_score
+from a2_test_support import make_start
+
+HPS = [10, 25, 40]
+SPS = [0, 15, 30]
+PAIRINGS = ['nrm', 'nvs', 'rsv', 'rmm']
+
+
+class HeatmapUnitTests(unittest.TestCase):
+    def setUp(self):
+        """
+        Make a directory for the heatmaps.
+        """
+        sys.setrecursionlimit(100000)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Remove the heatmaps.
+        """
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_grids_match_get_state_score(self):
+        """
+        Test to make sure every score in a grid is the one get_state_score
+        finds for that start on its own, in worker processes too.
+        """
+        grids = score_grids(PAIRINGS, HPS, SPS, workers=2)
+        for pairing in PAIRINGS:
+            expected = [[get_state_score(make_start(pairing[0], pairing[1],
+                                                    pairing[2], hp, sp))
+                         for sp in SPS] for hp in HPS]
+            self.assertEqual(expected, score_grid(pairing, HPS, SPS),
+                             "The grid of {} is wrong.".format(pairing))
+            self.assertEqual(expected, grids[pairing],
+                             ("The grid of {} searched in a worker is " +
+                              "wrong.").format(pairing))
+
+    def test_arrays_are_saved(self):
+        """
+        Test to make sure the grids and axes are saved as int32 arrays in a
+        .npz file, and that they are drawn as PPM images of the right size.
+        """
+        grids = {'nrm': [[1, -2, 3], [0, 100, -100]],
+                 'rvs': [[4, 5, 6], [7, 8, 9]]}
+        path = os.path.join(self.directory, 'scores.npz')
+        save_arrays(path, grids, [10, 20], [0, 5, 10])
+        arrays = load_arrays(path)
+        self.assertEqual({'hp': ((2,), [10, 20]), 'sp': ((3,), [0, 5, 10]),
+                          'nrm': ((2, 3), [1, -2, 3, 0, 100, -100]),
+                          'rvs': ((2, 3), [4, 5, 6, 7, 8, 9])}, arrays,
+                         "The arrays should be read back as they were saved.")
+        path = os.path.join(self.directory, 'nrm.ppm')
+        render_ppm(path, grids['nrm'])
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = "P6\n{} {}\n255\n".format(3 * PPM_SCALE,
+                                           2 * PPM_SCALE).encode()
+        self.assertEqual(header, data[:len(header)],
+                         "The heatmap should be 3 by 2 grid points.")
+        self.assertEqual(len(header) + 3 * 6 * PPM_SCALE * PPM_SCALE,
+                         len(data), "The heatmap should have every pixel.")
+        corner = len(header) + (3 * PPM_SCALE - 1) * 3
+        self.assertEqual(b'\x00\x00\xff', data[corner:corner + 3],
+                         ("P2 wins by the most at 20 HP and 10 SP, in the " +
+                          "top right corner."))
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
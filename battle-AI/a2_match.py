@@ -0,0 +1,188 @@
+"""
+A match of A2 that keeps its state in an object.
+
+A Match holds the battle queue, the characters and the outcome of one
+match, and performs attacks on it, so any number of matches can be played
+side by side. a2_game plays the match of the UIs with a Match too.
+"""
+from typing import Any, Dict, Union
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES
+from a2_playstyle import RandomPlaystyle, stream_seed
+from a2_skill_decision_tree import create_default_tree
+from a2_transitions import perform_move
+
+
+class Match:
+    """
+    A match between two characters.
+
+    battle_queue - The BattleQueue the match is played in.
+    p1 - The first character.
+    p2 - The second character.
+    is_over - Whether the match is over.
+    winner - The character who won the match, or None if it is not over or
+             ended in a tie.
+    replay - The a2_replay.ReplayWriter recording the attacks performed, or
+             None if the match is not being recorded.
+    ponder - Whether a computer Playstyle that can ponder searches ahead in
+             the background after its move, while a manual player decides.
+    """
+    battle_queue: 'BattleQueue'
+    p1: 'Character'
+    p2: 'Character'
+    is_over: bool
+    winner: Union['Character', None]
+    replay: Union['ReplayWriter', None]
+    ponder: bool
+
+    def __init__(self, queue_type: str, p1_type: str, p1_name: str,
+                 p1_playstyle: str, p2_type: str, p2_name: str,
+                 p2_playstyle: str, seed: Union[int, None] = None) -> None:
+        """
+        Initialize this Match between a p1_type called p1_name and a p2_type
+        called p2_name, in a queue_type, with the default skill decision tree
+        for Sorcerers. queue_type, p1_type, p1_playstyle, p2_type and
+        p2_playstyle are keys of BATTLE_QUEUE_CLASSES, CHARACTER_CLASSES and
+        PLAYSTYLE_CLASSES. If seed is not None, RandomPlaystyles are seeded with streams of it.
+
+        >>> match = Match('n', 'm', 'A', 'm', 'r', 'B', 'm')
+        >>> match.battle_queue
+        A (Mage): 100/100 -> B (Rogue): 100/100
+        """
+        self.battle_queue = BATTLE_QUEUE_CLASSES[queue_type]()
+        self.p1 = CHARACTER_CLASSES[p1_type](
+            p1_name, self.battle_queue,
+            PLAYSTYLE_CLASSES[p1_playstyle](self.battle_queue))
+        self.p2 = CHARACTER_CLASSES[p2_type](
+            p2_name, self.battle_queue,
+            PLAYSTYLE_CLASSES[p2_playstyle](self.battle_queue))
+        if p1_type == 's':
+            self.p1.set_skill_decision_tree(create_default_tree())
+        if p2_type == 's':
+            self.p2.set_skill_decision_tree(create_default_tree())
+        self.p1.enemy = self.p2
+        self.p2.enemy = self.p1
+        self.battle_queue.add(self.p1)
+        self.battle_queue.add(self.p2)
+        self.is_over = False
+        self.winner = None
+        self.replay = None
+        self.ponder = False
+        if seed is not None:
+            self.reseed(stream_seed(seed, 'p1'), stream_seed(seed, 'p2'))
+
+    def reseed(self, p1_seed: int, p2_seed: int) -> None:
+        """
+        Restart the random streams of the characters using RandomPlaystyles
+        from p1_seed and p2_seed.
+
+        >>> match = Match('n', 'm', 'A', 'r', 'r', 'B', 'r', seed=1)
+        >>> match.p1.playstyle.seed == Match('n', 'v', 'C', 'r', 's', 'D',
+        ...                                  'r', seed=1).p1.playstyle.seed
+        True
+        >>> match.reseed(5, 6)
+        >>> match.p1.playstyle.seed, match.p2.playstyle.seed
+        (5, 6)
+        """
+        for character, seed in [(self.p1, p1_seed), (self.p2, p2_seed)]:
+            if isinstance(character.playstyle, RandomPlaystyle):
+                character.playstyle.reseed(seed)
+
+    def next_is_manual(self) -> bool:
+        """
+        Return whether the next character to act uses a manual Playstyle.
+
+        >>> Match('n', 'm', 'A', 'm', 'r', 'B', 'mr').next_is_manual()
+        True
+        """
+        return self.battle_queue.peek().playstyle.is_manual
+
+    def perform(self, move: str) -> bool:
+        """
+        Make the next character perform move if it is a valid action for
+        them, and update whether this Match is over and who won it. Return
+        whether move was performed, and record it if this Match is being
+        recorded.
+
+        >>> match = Match('n', 'm', 'A', 'm', 'r', 'B', 'm')
+        >>> match.perform('A'), match.perform('X')
+        (True, False)
+        >>> match.battle_queue
+        B (Rogue): 90/100 -> A (Mage): 100/95
+        """
+        next_character = self.battle_queue.peek()
+        performed = next_character.is_valid_action(move)
+        if performed:
+            perform_move(self.battle_queue, move)
+            if self.replay is not None:
+                self.replay.record(move, next_character, self.battle_queue)
+        self.is_over = self.battle_queue.is_over()
+        self.winner = self.battle_queue.get_winner()
+        return performed
+
+    def perform_attack(self, key_pressed: Any = None) -> str:
+        """
+        Use the next character's Playstyle to decide on an attack, passing it
+        key_pressed if it is manual, and perform the attack. Return the
+        attack chosen. If this Match ponders and a manual player is to act
+        next, the Playstyle then ponders, if it can.
+        """
+        playstyle = self.battle_queue.peek().playstyle
+        if playstyle.is_manual:
+            move = playstyle.select_attack(key_pressed)
+        else:
+            move = playstyle.select_attack()
+        self.perform(move)
+        if (self.ponder and playstyle.can_ponder and not self.is_over and
+                self.next_is_manual()):
+            playstyle.enable_pondering()
+            playstyle.ponder()
+        return move
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Return the state of this Match as a dictionary of plain values.
+
+        >>> state = Match('r', 'v', 'A', 'm', 's', 'B', 'm').state()
+        >>> state['players'][1]
+        {'name': 'B', 'class': 'Sorcerer', 'hp': 100, 'sp': 100}
+        >>> state['current_player'], state['actions']
+        ('A', ['A', 'S'])
+        """
+        players = [{'name': character.get_name(),
+                    'class': type(character).__name__,
+                    'hp': character.get_hp(), 'sp': character.get_sp()}
+                   for character in [self.p1, self.p2]]
+        if self.battle_queue.is_over():
+            current_player, actions = None, []
+        else:
+            current_player = self.battle_queue.peek().get_name()
+            actions = self.battle_queue.peek().get_available_actions()
+        return {'players': players, 'current_player': current_player,
+                'actions': actions, 'is_over': self.is_over,
+                'winner': None if self.winner is None
+                          else self.winner.get_name()}
+
+
+def match_from_queue(battle_queue: 'BattleQueue') -> Match:
+    """
+    Return a Match of the match being played in battle_queue, with the
+    characters numbered as battle_queue.members() numbers them.
+
+    >>> match = Match('n', 'm', 'A', 'm', 'r', 'B', 'm')
+    >>> match.perform('S')
+    True
+    >>> same = match_from_queue(match.battle_queue.copy())
+    >>> same.p1, same.p2.enemy is same.p1, same.is_over
+    (A (Mage): 100/70, True, False)
+    """
+    match = Match.__new__(Match)
+    match.battle_queue = battle_queue
+    match.p1, match.p2 = battle_queue.members()
+    match.is_over = battle_queue.is_over()
+    match.winner = battle_queue.get_winner()
+    match.replay = None
+    match.ponder = False
+    return match
@@ -0,0 +1,253 @@
+"""
+Opening books for A2.
+
+Every match starts with both characters at the same HP and SP, so the first
+moves of matches between the same classes on the same kind of BattleQueue
+are always searched from the same positions, and those are the most
+expensive positions to search. An OpeningBook holds the move a Playstyle
+chooses in every position up to some number of moves into these games,
+found ahead of time, so a BookPlaystyle can play them without searching.
+
+Run this file to build a book and save it as JSON:
+
+    python a2_opening_book.py --playstyle mr --depth 4 --output book.json
+
+Positions are keyed by the kind of BattleQueue and the state_hash() of the
+position once normalized, which does not depend on the characters' names.
+A book is only valid for Sorcerers using create_default_tree().
+"""
+from typing import Dict, List, Tuple, Union
+import argparse
+import json
+import sys
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES
+from a2_characters import Sorcerer
+from a2_playstyle import ManualPlaystyle
+from a2_skill_decision_tree import create_default_tree
+from a2_transitions import perform_move
+
+# The HP and SP every character starts a match with.
+START_HP = 100
+START_SP = 100
+
+
+class OpeningBook:
+    """
+    The moves a Playstyle chooses in the first positions of matches.
+
+    playstyle - The key in PLAYSTYLE_CLASSES of the Playstyle whose moves
+                these are.
+    depth - How many moves into a match the book goes.
+    moves - The move for each position, keyed by book_key().
+    """
+    playstyle: str
+    depth: int
+    moves: Dict[str, str]
+
+    def __init__(self, playstyle: str, depth: int) -> None:
+        """
+        Initialize this OpeningBook of playstyle's moves with no positions.
+
+        >>> book = OpeningBook('mr', 2)
+        >>> len(book)
+        0
+        """
+        self.playstyle = playstyle
+        self.depth = depth
+        self.moves = {}
+
+    def __len__(self) -> int:
+        """
+        Return the number of positions in this OpeningBook.
+        """
+        return len(self.moves)
+
+    def add(self, battle_queue: 'BattleQueue', move: str) -> None:
+        """
+        Record move as the move for the position in battle_queue.
+        """
+        self.moves[book_key(battle_queue)] = move
+
+    def move(self, battle_queue: 'BattleQueue') -> Union[str, None]:
+        """
+        Return the move for the position in battle_queue, or None if this
+        OpeningBook does not have it.
+
+        >>> bq = build_start('n', 'r', 'm', 30, 20)
+        >>> book = OpeningBook('mr', 1)
+        >>> book.move(bq) is None
+        True
+        >>> book.add(bq, 'S')
+        >>> book.move(build_start('n', 'r', 'm', 30, 20))
+        'S'
+        """
+        return self.moves.get(book_key(battle_queue))
+
+    def save(self, path: str) -> None:
+        """
+        Save this OpeningBook as JSON to the file at path.
+        """
+        with open(path, 'w') as f:
+            json.dump({'playstyle': self.playstyle, 'depth': self.depth,
+                       'moves': self.moves}, f, indent=0, sort_keys=True)
+
+
+def load_book(path: str) -> OpeningBook:
+    """
+    Return the OpeningBook saved as JSON in the file at path.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    book = OpeningBook(data['playstyle'], data['depth'])
+    book.moves = data['moves']
+    return book
+
+
+def book_key(battle_queue: 'BattleQueue') -> str:
+    """
+    Return the key of the position in battle_queue in an OpeningBook.
+
+    >>> book_key(build_start('r', 'v', 's', 100, 100)).startswith(
+    ...     'RestrictedBattleQueue:')
+    True
+    """
+    bq = battle_queue.copy()
+    bq.normalize()
+    return "{}:{:016x}".format(type(bq).__name__, bq.state_hash())
+
+
+def build_start(queue_type: str, p1_type: str, p2_type: str, hp: int,
+                sp: int) -> 'BattleQueue':
+    """
+    Return a new BattleQueue at the start of a match between a p1_type and a
+    p2_type that both have hp HP and sp SP, where queue_type, p1_type and
+    p2_type are keys of BATTLE_QUEUE_CLASSES and CHARACTER_CLASSES.
+
+    >>> build_start('n', 'r', 'm', 30, 20)
+    P1 (Rogue): 30/20 -> P2 (Mage): 30/20
+    """
+    return build_queue(BATTLE_QUEUE_CLASSES[queue_type],
+                       CHARACTER_CLASSES[p1_type], CHARACTER_CLASSES[p2_type],
+                       (hp, sp, hp, sp))
+
+
+def build_queue(queue_class: type, p1_class: type, p2_class: type,
+                stats: Tuple[int, int, int, int]) -> 'BattleQueue':
+    """
+    Return a new queue_class containing a p1_class called P1 and a p2_class
+    called P2, in that order, whose HP and SP are given by stats as (P1 HP,
+    P1 SP, P2 HP, P2 SP). Both use a ManualPlaystyle, and Sorcerers use
+    create_default_tree().
+
+    >>> from a2_battle_queue import RestrictedBattleQueue
+    >>> from a2_characters import Vampire
+    >>> build_queue(RestrictedBattleQueue, Vampire, Sorcerer, (40, 6, 14, 35))
+    P1 (Vampire): 40/6 -> P2 (Sorcerer): 14/35
+    """
+    bq = queue_class()
+    p1 = p1_class("P1", bq, ManualPlaystyle(bq))
+    p2 = p2_class("P2", bq, ManualPlaystyle(bq))
+    for character in [p1, p2]:
+        if isinstance(character, Sorcerer):
+            character.set_skill_decision_tree(create_default_tree())
+    p1.enemy = p2
+    p2.enemy = p1
+    bq.add(p1)
+    bq.add(p2)
+    p1.set_hp(stats[0])
+    p1.set_sp(stats[1])
+    p2.set_hp(stats[2])
+    p2.set_sp(stats[3])
+    return bq
+
+
+def play(battle_queue: 'BattleQueue', move: str) -> 'BattleQueue':
+    """
+    Return a copy of battle_queue after its next character performs move,
+    the way a2_game performs it.
+
+    >>> play(build_start('n', 'r', 'm', 30, 20), 'A')
+    P2 (Mage): 23/20 -> P1 (Rogue): 30/17
+    """
+    bq = battle_queue.copy()
+    perform_move(bq, move)
+    return bq
+
+
+def add_match_openings(book: OpeningBook, battle_queue: 'BattleQueue',
+                       verbose: bool = False) -> None:
+    """
+    Add to book the move of book's Playstyle in every position up to
+    book.depth moves after battle_queue, the start of a match, trying every
+    move either character can make.
+    """
+    level = [battle_queue]
+    for _ in range(book.depth):
+        next_level = []
+        for bq in level:
+            if bq.is_over() or book.move(bq) is not None:
+                continue
+            move = PLAYSTYLE_CLASSES[book.playstyle](bq).select_attack()
+            book.add(bq, move)
+            if verbose:
+                print("{:>5} {} {!r}".format(len(book), move, bq))
+            next_level.extend(play(bq, action) for action in
+                              bq.peek().get_available_actions())
+        level = next_level
+
+
+def generate_book(playstyle: str, depth: int,
+                  starts: List[Tuple[str, str, str]], hp: int = START_HP,
+                  sp: int = START_SP, verbose: bool = False) -> OpeningBook:
+    """
+    Return an OpeningBook of the moves of PLAYSTYLE_CLASSES[playstyle] up to
+    depth moves into every match in starts, given as (queue type, P1 type,
+    P2 type), with both characters starting with hp HP and sp SP.
+
+    >>> book = generate_book('mr', 2, [('n', 'r', 'm')], 30, 20)
+    >>> len(book)
+    3
+    """
+    book = OpeningBook(playstyle, depth)
+    for queue_type, p1_type, p2_type in starts:
+        add_match_openings(book, build_start(queue_type, p1_type, p2_type,
+                                             hp, sp), verbose)
+    return book
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Build an opening book with the options in argv and save it.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--playstyle', default='mr',
+                        choices=sorted(set(PLAYSTYLE_CLASSES) - {'m', 'r'}))
+    parser.add_argument('--depth', type=int, default=4,
+                        help="how many moves into each match to go")
+    parser.add_argument('--hp', type=int, default=START_HP)
+    parser.add_argument('--sp', type=int, default=START_SP)
+    parser.add_argument('--queues', nargs='+',
+                        default=sorted(BATTLE_QUEUE_CLASSES))
+    parser.add_argument('--pairings', nargs='+',
+                        help="P1 and P2 types, such as mr or vv")
+    parser.add_argument('--output', required=True,
+                        help="save the book to this JSON file")
+    args = parser.parse_args(argv)
+
+    starts = [(queue_type, p1_type, p2_type)
+              for queue_type in args.queues
+              for p1_type in sorted(CHARACTER_CLASSES)
+              for p2_type in sorted(CHARACTER_CLASSES)
+              if not args.pairings or p1_type + p2_type in args.pairings]
+    book = generate_book(args.playstyle, args.depth, starts, args.hp,
+                         args.sp, verbose=True)
+    book.save(args.output)
+    print("Saved {} positions to {}".format(len(book), args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    sys.exit(main())
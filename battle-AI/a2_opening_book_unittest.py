@@ -0,0 +1,71 @@
+"""
+Unittests for A2's opening books.
+
+These tests build a small opening book and check that a BookPlaystyle plays
+the moves a new search would have chosen, and that a book survives being
+saved and loaded.
+"""
+import os
+import tempfile
+import unittest
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES
+from a2_opening_book import build_start, generate_book, load_book, play
+from a2_playstyle import BookPlaystyle
+
+
+STARTS = [(queue_type, p1_type, p2_type)
+          for queue_type in sorted(BATTLE_QUEUE_CLASSES)
+          for p1_type in sorted(CHARACTER_CLASSES)
+          for p2_type in sorted(CHARACTER_CLASSES)]
+
+
+class OpeningBookUnitTests(unittest.TestCase):
+    def test_book_moves_match_search(self):
+        """
+        Test to make sure a BookPlaystyle answers the first moves of a match
+        from its book with the moves a new search would choose.
+        """
+        book = generate_book('mr', 3, STARTS, 30, 20)
+        for queue_type, p1_type, p2_type in STARTS:
+            bq = build_start(queue_type, p1_type, p2_type, 30, 20)
+            playstyle = BookPlaystyle(bq, book, PLAYSTYLE_CLASSES['mr'](bq))
+            playstyle.enable_stats()
+            from_book = 0
+            while not bq.is_over():
+                expected = PLAYSTYLE_CLASSES['mr'](bq).select_attack()
+                move = playstyle.select_attack()
+                from_book += playstyle.stats.nodes == 0
+                self.assertEqual(expected, move,
+                                 ("A BookPlaystyle chose {} instead of {} " +
+                                  "in:\n{}").format(move, expected, bq))
+                if not bq.peek().is_valid_action(move):
+                    break
+                bq = play(bq, move)
+                playstyle.battle_queue = bq
+                playstyle.fallback.battle_queue = bq
+            self.assertTrue(from_book > 0,
+                            ("A BookPlaystyle never played from its book " +
+                             "in a {} game between {} and {}.").format(
+                                 queue_type, p1_type, p2_type))
+
+    def test_save_and_load(self):
+        """
+        Test to make sure a saved book loads with the same moves.
+        """
+        book = generate_book('mr', 2, STARTS[:3], 30, 20)
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            book.save(path)
+            loaded = load_book(path)
+        finally:
+            os.remove(path)
+        self.assertEqual((book.playstyle, book.depth, book.moves),
+                         (loaded.playstyle, loaded.depth, loaded.moves),
+                         "A loaded book should equal the book saved.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -5,9 +5,72 @@ Docstring examples are not required for Playstyles.
 You are responsible for implementing the get_state_score function, as well as
 creating classes for both Iterative Minimax and Recursive Minimax.
 """
-from typing import Any
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+from array import array
+import hashlib
 import random
-from a2_tree_of_states import TOS, get_children
+import threading
+import time
+from a2_tree_of_states import TOS, expand_tree
+from a2_transitions import apply_transition, perform_move
+from a2_queue_stores import PersistentStore
+
+# How many moves in a row the opponent may make before a Ponderer stops
+# looking for the positions it will be asked about.
+PONDER_DEPTH = 3
+
+# The kind of queue store the minimax Playstyles search with. Its copies share
+# their contents with the state they were copied from.
+SEARCH_QUEUE_STORE = PersistentStore
+
+
+class SearchStats:
+    """
+    Statistics about a single call to a Playstyle's select_attack.
+
+    nodes - The number of game states expanded.
+    copies - The number of BattleQueue copies made.
+    cache_hits - The number of game states whose score was already cached.
+    cache_misses - The number of game states whose score had to be searched.
+    max_depth - The deepest number of moves searched ahead.
+    wall_time - The number of seconds select_attack took.
+    cpu_time - The number of seconds of CPU time select_attack used.
+    """
+    nodes: int
+    copies: int
+    cache_hits: int
+    cache_misses: int
+    max_depth: int
+    wall_time: float
+    cpu_time: float
+
+    def __init__(self) -> None:
+        """
+        Initialize this SearchStats with every statistic at 0.
+
+        >>> stats = SearchStats()
+        >>> stats.nodes
+        0
+        >>> stats.cache_hits
+        0
+        """
+        self.nodes = 0
+        self.copies = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.max_depth = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of this SearchStats.
+        """
+        return ("SearchStats(nodes={}, copies={}, cache={}/{}, max_depth={}, " +
+                "wall={:.3f}s, cpu={:.3f}s)").format(
+                    self.nodes, self.copies, self.cache_hits,
+                    self.cache_hits + self.cache_misses, self.max_depth,
+                    self.wall_time, self.cpu_time)
 
 
 class Playstyle:
@@ -15,11 +78,21 @@ class Playstyle:
     The Playstyle superclass.
 
     is_manual - Whether the class is a manual Playstyle or not.
+    can_ponder - Whether a copy of this Playstyle chooses the attack this
+                 Playstyle would in the same position, so that it can ponder.
     battle_queue - The BattleQueue corresponding to the game this Playstyle is
                    being used in.
+    stats - The SearchStats of the last call to select_attack, or None if
+            statistics are not enabled.
+    principal_variation - The line of play the last search expects, as
+                          (name of the character to act, action, BattleQueue
+                          after the action) triples, or [] if there is none.
     """
     is_manual: bool
+    can_ponder: bool
     battle_queue: 'BattleQueue'
+    stats: Union[SearchStats, None]
+    principal_variation: List[Tuple[str, str, 'BattleQueue']]
 
     def __init__(self, battle_queue: 'BattleQueue') -> None:
         """
@@ -27,16 +100,129 @@ class Playstyle:
         """
         self.battle_queue = battle_queue
         self.is_manual = True
+        self.can_ponder = False
+        self.stats = None
+        self._stats_enabled = False
+        self._stats_callback = None
+        self.principal_variation = []
+        self._pv_moves = {}
+        self._ponderer = None
+
+    def enable_stats(self, callback: Callable[['Playstyle', str, SearchStats],
+                                              None] = None) -> None:
+        """
+        Collect a SearchStats on every call to select_attack from now on.
+        If callback is given, it is called with this Playstyle, the attack
+        selected and the SearchStats after every call.
+        """
+        self._stats_enabled = True
+        self._stats_callback = callback
+
+    def disable_stats(self) -> None:
+        """
+        Stop collecting statistics on calls to select_attack.
+        """
+        self._stats_enabled = False
+        self._stats_callback = None
+        self.stats = None
 
     def select_attack(self, parameter: Any = None) -> str:
         """
         Return the attack for the next character in this Playstyle's
         battle_queue to perform.
 
+        Return 'X' if a valid move cannot be found.
+        """
+        if not self._stats_enabled:
+            return self._answer(parameter, None)
+        stats = SearchStats()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        attack = self._answer(parameter, stats)
+        stats.wall_time = time.perf_counter() - wall_start
+        stats.cpu_time = time.process_time() - cpu_start
+        self.stats = stats
+        if self._stats_callback:
+            self._stats_callback(self, attack, stats)
+        return attack
+
+    def _answer(self, parameter: Any, stats: Union[SearchStats, None]) -> str:
+        """
+        Return the attack found by pondering on this position if there is
+        one, recording it in stats as a cache hit unless stats is None, or
+        else the attack chosen by _select_attack.
+        """
+        if self._ponderer is not None:
+            move = self._ponderer.move(self.battle_queue)
+            if move is not None:
+                if stats is not None:
+                    stats.cache_hits += 1
+                return move
+        return self._select_attack(parameter, stats)
+
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
+        """
+        Return the attack for the next character in this Playstyle's
+        battle_queue to perform, recording statistics in stats unless it is
+        None.
+
         Return 'X' if a valid move cannot be found.
         """
         raise NotImplementedError
 
+    def enable_pondering(self) -> None:
+        """
+        Let ponder() search ahead in a background thread from now on, unless
+        this Playstyle cannot ponder.
+        """
+        if self.can_ponder and self._ponderer is None:
+            self._ponderer = Ponderer(self)
+
+    def disable_pondering(self) -> None:
+        """
+        Stop pondering, and forget everything found by pondering.
+        """
+        if self._ponderer is not None:
+            self._ponderer.stop()
+        self._ponderer = None
+
+    def ponder(self) -> None:
+        """
+        If pondering is enabled, start searching, in a background thread,
+        every position this Playstyle's character may face after the
+        opponent's next moves. Call this right after the character has
+        moved, while the opponent is deciding.
+        """
+        if self._ponderer is not None:
+            self._ponderer.start()
+
+    def _set_principal_variation(
+            self, line: List[Tuple[bytes, str, str, 'BattleQueue']]) -> None:
+        """
+        Remember line as the principal variation, given as (position key of
+        the state before the action, name of the character to act, action,
+        BattleQueue after the action) tuples.
+        """
+        self.principal_variation = [(name, action, bq)
+                                    for _, name, action, bq in line]
+        self._pv_moves = {key: action for key, _, action, _ in line}
+
+    def _principal_variation_move(self, stats: Union[SearchStats, None]
+                                  ) -> Union[str, None]:
+        """
+        Return the action the principal variation plays from the state of
+        this Playstyle's battle_queue, or None if the game has left the
+        principal variation. A move found is recorded in stats as a cache
+        hit, unless stats is None.
+        """
+        if not self._pv_moves:
+            return None
+        move = self._pv_moves.get(_position_key(self.battle_queue))
+        if move is not None and stats is not None:
+            stats.cache_hits += 1
+        return move
+
     def copy(self, new_battle_queue: 'BattleQueue') -> 'Playstyle':
         """
         Return a copy of this Playstyle which uses the BattleQueue 
@@ -45,12 +231,155 @@ class Playstyle:
         raise NotImplementedError
 
 
+class Ponderer:
+    """
+    Searches, in a background thread, the positions a Playstyle's character
+    may face once the opponent has moved, so that the answer is ready as
+    soon as the opponent's move is made.
+
+    Positions are found by playing out every sequence of up to PONDER_DEPTH
+    opponent moves on copies of the game, the way a2_game does. Positions
+    the Playstyle's principal variation already answers are skipped. Each
+    position is searched with a new copy of the Playstyle, so the move found
+    is the one the Playstyle would choose there. When the position reached
+    has not been searched yet, it is searched next and the rest are dropped.
+
+    playstyle - The Playstyle this Ponderer searches for.
+    """
+    playstyle: Playstyle
+
+    def __init__(self, playstyle: Playstyle) -> None:
+        """
+        Initialize this Ponderer for playstyle, with nothing searched yet.
+        """
+        self.playstyle = playstyle
+        self._moves = {}
+        self._pending = {}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Stop any search still running, and start searching every position
+        the character who just moved may face next.
+        """
+        self.stop()
+        battle_queue = self.playstyle.battle_queue
+        if battle_queue.is_over():
+            return
+        name = battle_queue.peek().enemy.get_name()
+        positions = [(key, bq) for key, bq in
+                     _positions_after_opponent(battle_queue, name)
+                     if key not in self.playstyle._pv_moves]
+        self._moves = {}
+        self._pending = {key: threading.Event() for key, _ in positions}
+        self._queue = positions
+        self._stopped = threading.Event()
+        threading.Thread(target=self._run,
+                         args=(self._queue, self._moves, self._pending,
+                               self._stopped),
+                         daemon=True).start()
+
+    def _run(self, queue: List[Tuple[bytes, 'BattleQueue']],
+             moves: Dict[bytes, str], pending: Dict[bytes, threading.Event],
+             stopped: threading.Event) -> None:
+        """
+        Search the positions in queue, given with their position keys, from
+        the front, recording the move found in moves and setting the
+        position's event in pending, until queue is empty or stopped is set.
+        """
+        while True:
+            with self._lock:
+                if stopped.is_set() or not queue:
+                    break
+                key, bq = queue.pop(0)
+            try:
+                moves[key] = self.playstyle.copy(bq).select_attack()
+            except Exception:
+                # Give up pondering: every position is left unanswered, so
+                # it is searched again when reached, outside this thread.
+                with self._lock:
+                    stopped.set()
+                    queue.clear()
+                for event in pending.values():
+                    event.set()
+                return
+            finally:
+                pending[key].set()
+
+    def move(self, battle_queue: 'BattleQueue') -> Union[str, None]:
+        """
+        Return the move found for the position in battle_queue, or None if
+        the position was not predicted or pondering failed. If its search is
+        still to come, it is searched next, after the one being searched, and
+        waited for. Either way, the positions that were not reached are no
+        longer searched.
+        """
+        key = _position_key(battle_queue)
+        with self._lock:
+            self._queue[:] = [(queued, bq) for queued, bq in self._queue
+                              if queued == key]
+        if key in self._pending:
+            self._pending[key].wait()
+        move = self._moves.get(key)
+        self.stop()
+        return move
+
+    def stop(self) -> None:
+        """
+        Stop searching after the position being searched, and forget every
+        move found.
+        """
+        self._stopped.set()
+        self._moves = {}
+        self._pending = {}
+        self._queue = []
+
+
+def _positions_after_opponent(battle_queue: 'BattleQueue', name: str
+                              ) -> List[Tuple[bytes, 'BattleQueue']]:
+    """
+    Return the position key and a copy of every position where the character
+    called name is next to act after up to PONDER_DEPTH moves of its
+    opponent in battle_queue, made the way a2_game makes them.
+    """
+    positions = []
+    frontier = [battle_queue]
+    for _ in range(PONDER_DEPTH):
+        next_frontier = []
+        for bq in frontier:
+            for action in bq.peek().get_available_actions():
+                bq_copy = bq.copy()
+                perform_move(bq_copy, action)
+                if bq_copy.is_over():
+                    continue
+                if bq_copy.peek().get_name() == name:
+                    positions.append((_position_key(bq_copy), bq_copy))
+                else:
+                    next_frontier.append(bq_copy)
+        frontier = next_frontier
+    return positions
+
+
+def _position_key(battle_queue: 'BattleQueue') -> bytes:
+    """
+    Return bytes that are the same for any two BattleQueues of the same
+    characters in the same game state, whether or not they have been
+    normalized.
+    """
+    bq = battle_queue.copy()
+    bq.normalize()
+    return bq.pack()
+
+
 class ManualPlaystyle(Playstyle):
     """
     The ManualPlaystyle. Inherits from Playstyle.
     """
 
-    def select_attack(self, parameter: Any = None) -> str:
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
         """
         Return the attack for the next character in this Playstyle's
         battle_queue to perform.
@@ -72,21 +401,112 @@ class ManualPlaystyle(Playstyle):
         return ManualPlaystyle(new_battle_queue)
 
 
+def stream_seed(seed: int, *path: Union[int, str]) -> int:
+    """
+    Return the 64-bit seed of the random stream named by path under seed,
+    such as the stream of one player in one match run by one worker process.
+    Streams with different paths are independent of each other.
+
+    >>> stream_seed(7, 0, 'p1') == stream_seed(7, 0, 'p1')
+    True
+    >>> stream_seed(7, 0, 'p1') == stream_seed(7, 0, 'p2')
+    False
+    """
+    digest = hashlib.blake2b(repr((seed,) + path).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little')
+
+
 class RandomPlaystyle(Playstyle):
     """
     The Random playstyle. Inherits from Playstyle.
+
+    seed - The seed of this RandomPlaystyle's random stream.
+    rng - The random stream attacks are chosen with. It is only made when
+          first used, and copies share it until one of them uses it.
     """
     is_manual: bool
     battle_queue: 'BattleQueue'
+    seed: int
 
-    def __init__(self, battle_queue: 'BattleQueue') -> None:
+    def __init__(self, battle_queue: 'BattleQueue',
+                 seed: Union[int, None] = None) -> None:
         """
-        Initialize this RandomPlaystyle with BattleQueue as its battle queue.
+        Initialize this RandomPlaystyle with BattleQueue as its battle queue,
+        choosing attacks with a random stream seeded with seed, or with a new
+        seed if seed is None.
         """
         super().__init__(battle_queue)
         self.is_manual = False
+        self.reseed(random.getrandbits(64) if seed is None else seed)
 
-    def select_attack(self, parameter: Any = None) -> str:
+    def reseed(self, seed: int) -> None:
+        """
+        Restart this RandomPlaystyle's random stream from seed.
+        """
+        self.seed = seed
+        self._rng = None
+        self._owns_rng = True
+
+    @property
+    def rng(self) -> random.Random:
+        """
+        Return this RandomPlaystyle's random stream, first making it if it
+        has not been made, or copying it if it is shared with a copy of this
+        RandomPlaystyle.
+
+        >>> playstyle = RandomPlaystyle(None, 1)
+        >>> copy = playstyle.copy(None)
+        >>> playstyle.rng.random() == copy.rng.random()
+        True
+        >>> playstyle.rng is copy.rng
+        False
+        """
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        elif not self._owns_rng:
+            rng = random.Random()
+            rng.setstate(self._rng.getstate())
+            self._rng = rng
+            self._owns_rng = True
+        return self._rng
+
+    def stream_state(self) -> Union[Tuple[int, ...], None]:
+        """
+        Return where this RandomPlaystyle's random stream is, as the 625
+        numbers of its Mersenne Twister state, or None if it has not been
+        used since it was seeded.
+
+        >>> playstyle = RandomPlaystyle(None, 1)
+        >>> playstyle.stream_state() is None
+        True
+        >>> draw = playstyle.rng.random()
+        >>> len(playstyle.stream_state())
+        625
+        """
+        if self._rng is None:
+            return None
+        return self._rng.getstate()[1]
+
+    def set_stream_state(self, state: Tuple[int, ...]) -> None:
+        """
+        Go on with this RandomPlaystyle's random stream from state, as
+        returned by stream_state(), raising ValueError if it is not a state
+        of a random stream.
+
+        >>> playstyle = RandomPlaystyle(None, 1)
+        >>> draw = playstyle.rng.random()
+        >>> other = RandomPlaystyle(None, 2)
+        >>> other.set_stream_state(playstyle.stream_state())
+        >>> playstyle.rng.random() == other.rng.random()
+        True
+        """
+        rng = random.Random()
+        rng.setstate((random.Random.VERSION, tuple(state), None))
+        self._rng = rng
+        self._owns_rng = True
+
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
         """
         Return the attack for the next character in this Playstyle's
         battle_queue to perform.
@@ -98,21 +518,33 @@ class RandomPlaystyle(Playstyle):
         if not actions:
             return 'X'
 
-        return random.choice(actions)
+        return self.rng.choice(actions)
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'Playstyle':
         """
         Return a copy of this RandomPlaystyle which uses the 
-        BattleQueue new_battle_queue.
+        BattleQueue new_battle_queue, and whose random stream goes on from
+        where this RandomPlaystyle's is now.
         """
-        return RandomPlaystyle(new_battle_queue)
+        new_playstyle = RandomPlaystyle(new_battle_queue, self.seed)
+        if self._rng is not None:
+            new_playstyle._rng = self._rng
+            new_playstyle._owns_rng = self._owns_rng = False
+        return new_playstyle
 
 
-def get_state_score(battle_queue: 'BattleQueue') -> int:
+def get_state_score(battle_queue: 'BattleQueue',
+                    stats: SearchStats = None,
+                    cache: Dict[int, int] = None) -> int:
     """
     Return an int corresponding to the highest score that the next player in
     battle_queue can guarantee.
 
+    If stats is given, the search is recorded in it. If cache is given, it is
+    used as a transposition table from BattleQueue.state_hash() to score, so
+    states that are reached more than once are only searched once. A cache
+    must only be shared between searches of the same two characters.
+
     For a state that's over, the score is the HP of the character who still has
     HP if the next player who was supposed to act is the winner. If the next
     player who was supposed to act is the loser, then the score is -1 * the
@@ -155,29 +587,169 @@ def get_state_score(battle_queue: 'BattleQueue') -> int:
     """
     # TODO: Implement the get_state_score function (which will be used in
     #                  recursive minimax)
-    if battle_queue.is_over():
-        if battle_queue.get_winner():
-            if battle_queue.peek().get_name() == \
-                    battle_queue.get_winner().get_name():
-                return battle_queue.peek().get_hp()
-            if battle_queue.peek().get_name() != \
-                    battle_queue.get_winner().get_name():
-                return -1 * battle_queue.get_winner().get_hp()
-        return 0
+    return StateScoreSearch(battle_queue, cache).run(stats)
+
+
+class StateScoreSearch:
+    """
+    A search for get_state_score() of a BattleQueue that keeps its work on an
+    explicit stack instead of recursing, so it can be stopped and resumed
+    where it left off, and can search deeper than the recursion limit.
+
+    Each frame of the stack is a BattleQueue being searched, the new
+    BattleQueues its moves lead to, how many of them have been scored and
+    the best score found among them.
+
+    battle_queue - The BattleQueue being searched.
+    cache - The transposition table, from BattleQueue.state_hash() to score,
+            or None to search every state every time it is reached.
+    """
+    battle_queue: 'BattleQueue'
+    cache: Union[Dict[int, int], None]
+
+    def __init__(self, battle_queue: 'BattleQueue',
+                 cache: Dict[int, int] = None) -> None:
+        """
+        Initialize this StateScoreSearch of battle_queue, with nothing
+        searched yet.
+        """
+        self.battle_queue = battle_queue
+        self.cache = cache
+        self._stack = []
+        self._score = None
+
+    @property
+    def frames(self) -> int:
+        """
+        Return how many frames the work stack of this StateScoreSearch has.
+        """
+        return len(self._stack)
+
+    def run(self, stats: SearchStats = None,
+            max_nodes: int = None) -> Union[int, None]:
+        """
+        Search until get_state_score(self.battle_queue) is found and return
+        it. If max_nodes is given, stop before expanding more than that many
+        game states below the BattleQueue being searched, and return None if
+        the search is not done; the next call goes on from there. If stats
+        is given, the search is recorded in it.
+
+        >>> from a2_opening_book import build_start
+        >>> search = StateScoreSearch(build_start('n', 'r', 'm', 40, 30), {})
+        >>> search.run(max_nodes=10) is None, search.frames
+        (True, 7)
+        >>> search.run()
+        10
+        """
+        if self._score is not None:
+            return self._score
+        if not self._stack:
+            score = self._lookup(self.battle_queue, stats)
+            if score is not None:
+                self._score = score
+                return score
+            self._stack.append([self.battle_queue,
+                                _expand(self.battle_queue, stats), 0, None])
+        nodes = 0
+        while self._stack:
+            frame = self._stack[-1]
+            bq, children, index, best = frame
+            if index == len(children):
+                self._stack.pop()
+                if self.cache is not None:
+                    self.cache[bq.state_hash()] = best
+                if self._stack:
+                    self._add_score(self._stack[-1], bq, best)
+                else:
+                    self._score = best
+                continue
+            child = children[index]
+            score = self._lookup(child, stats)
+            if score is not None:
+                self._add_score(frame, child, score)
+                continue
+            if max_nodes is not None and nodes == max_nodes:
+                return None
+            nodes += 1
+            self._stack.append([child, _expand(child, stats), 0, None])
+            self._expanded()
+        return self._score
+
+    def _lookup(self, battle_queue: 'BattleQueue',
+                stats: Union[SearchStats, None]) -> Union[int, None]:
+        """
+        Return the score of battle_queue, the next BattleQueue to search, if
+        it is over or cached, or None if it has to be expanded.
+        """
+        if self.cache is not None:
+            key = battle_queue.state_hash()
+            if key in self.cache:
+                if stats is not None:
+                    stats.cache_hits += 1
+                return self.cache[key]
+            if stats is not None:
+                stats.cache_misses += 1
+        if stats is not None:
+            stats.max_depth = max(stats.max_depth, len(self._stack))
+        if not battle_queue.is_over():
+            return None
+        score = _end_score(battle_queue)
+        if self.cache is not None:
+            self.cache[key] = score
+        return score
+
+    def _add_score(self, frame: list, child: 'BattleQueue',
+                   score: int) -> None:
+        """
+        Count score, the score of the next child of the BattleQueue in frame,
+        towards that BattleQueue's best score, and move on to its next child.
+        """
+        if frame[0].peek().get_name() != child.peek().get_name():
+            score = -score
+        if frame[3] is None or score > frame[3]:
+            frame[3] = score
+        frame[2] += 1
+
+    def _expanded(self) -> None:
+        """
+        Called every time this StateScoreSearch expands a game state.
+        """
+
+
+def _end_score(battle_queue: 'BattleQueue') -> int:
+    """
+    Return get_state_score(battle_queue) for a battle_queue that is over.
+    """
+    if battle_queue.get_winner():
+        if battle_queue.peek().get_name() == \
+                battle_queue.get_winner().get_name():
+            return battle_queue.peek().get_hp()
+        if battle_queue.peek().get_name() != \
+                battle_queue.get_winner().get_name():
+            return -1 * battle_queue.get_winner().get_hp()
+    return 0
+
+
+def _expand(battle_queue: 'BattleQueue', stats: Union[SearchStats, None]
+            ) -> List['BattleQueue']:
+    """
+    Return a new, normalized BattleQueue for the state reached by each action
+    the next character in battle_queue can take, in order.
+    """
     new_bq_list = []
+    if stats is not None:
+        stats.nodes += 1
     if battle_queue.peek().get_available_actions():
         for action in battle_queue.peek().get_available_actions():
             bq = battle_queue.copy()
-            if action == 'A':
-                bq.peek().attack()
-            elif action == 'S':
-                bq.peek().special_attack()
+            if stats is not None:
+                stats.copies += 1
+            apply_transition(bq, action)
             if not bq.is_empty():
                 bq.remove()
+            bq.normalize()
             new_bq_list.append(bq)
-    return max(-1 * get_state_score(bq) if 
-               battle_queue.peek().get_name() != bq.peek().get_name() 
-               else get_state_score(bq) for bq in new_bq_list if new_bq_list)
+    return new_bq_list
 
 # TODO: Implement classes for Recursive Minimax and Iterative Minimax
 
@@ -202,8 +774,10 @@ class RecursiveMinimax(Playstyle):
         """
         super().__init__(battle_queue)
         self.is_manual = False
+        self.can_ponder = True
 
-    def select_attack(self, parameter: Any = None) -> str:
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
         """
         Select the action that can guarantee the highest state score for the 
         character.
@@ -226,35 +800,68 @@ class RecursiveMinimax(Playstyle):
         actions = self.battle_queue.peek().get_available_actions()
         if not actions:
             return 'X'
-        current_player = self.battle_queue.peek().get_name()
-        current_state_score = get_state_score(self.battle_queue)
-        for action in actions:
-            a_copy = self.battle_queue.copy()
-            if action == 'A':
-                a_copy.peek().attack()
-                if not a_copy.is_over():
-                    a_copy.remove()
-                if a_copy.peek().get_name() == current_player:
-                    return 'A' if get_state_score(a_copy) == \
-                                  current_state_score else \
-                                  'S' if 'S' in actions else 'X'
-                if a_copy.peek().get_name() != current_player:
-                    return 'A' if -get_state_score(a_copy) == \
-                           current_state_score else 'S' if 'S' in actions else \
-                        'X'
-            elif action == 'S':
-                a_copy.peek().special_attack()
-                if not a_copy.is_empty():
-                    a_copy.remove()
-                if a_copy.peek().get_name() == current_player:
-                    return 'S' if get_state_score(a_copy) == \
-                                  current_state_score \
-                                  else 'A' if 'A' in actions else 'X'
-                if a_copy.peek().get_name() != current_player:
-                    return 'S' if -get_state_score(a_copy) == \
-                           current_state_score \
-                           else 'A' if 'A' in actions else 'X'
-        return 'X'
+        move = self._principal_variation_move(stats)
+        if move is not None:
+            return move
+        battle_queue = self.battle_queue.copy(SEARCH_QUEUE_STORE)
+        if stats is not None:
+            stats.copies += 1
+        cache = {}
+        line = []
+        action, after = self._choose(battle_queue, stats, cache)
+        while after is not None:
+            line.append((_position_key(battle_queue),
+                         battle_queue.peek().get_name(), action, after))
+            if after.is_over():
+                break
+            battle_queue = after
+            action, after = self._choose(battle_queue, stats, cache)
+        self._set_principal_variation(line)
+        return line[0][2] if line else action
+
+    def _choose(self, battle_queue: 'BattleQueue',
+                stats: Union[SearchStats, None], cache: Dict[int, int]
+                ) -> Tuple[str, Union['BattleQueue', None]]:
+        """
+        Return the action that can guarantee the highest state score for the
+        next character in battle_queue, and a new BattleQueue in the state it
+        leads to, or ('X', None) if there is no such action. Scores are
+        looked up in and added to cache.
+        """
+        actions = battle_queue.peek().get_available_actions()
+        if not actions:
+            return 'X', None
+        current_player = battle_queue.peek().get_name()
+        current_state_score = get_state_score(battle_queue, stats, cache)
+        action = actions[0]
+        a_copy = self._after(battle_queue, action, stats)
+        score = get_state_score(a_copy, stats, cache)
+        if a_copy.peek().get_name() != current_player:
+            score = -score
+        if score == current_state_score:
+            return action, a_copy
+        other = 'S' if action == 'A' else 'A'
+        if other not in actions:
+            return 'X', None
+        return other, self._after(battle_queue, other, stats)
+
+    def _after(self, battle_queue: 'BattleQueue', action: str,
+               stats: Union[SearchStats, None]) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the state reached by the next character
+        in battle_queue performing action.
+        """
+        a_copy = battle_queue.copy()
+        if stats is not None:
+            stats.copies += 1
+        apply_transition(a_copy, action)
+        if action == 'A':
+            if not a_copy.is_over():
+                a_copy.remove()
+        elif not a_copy.is_empty():
+            a_copy.remove()
+        a_copy.normalize()
+        return a_copy
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'RecursiveMinimax':
         """
@@ -282,117 +889,158 @@ class IterativeMinimax(Playstyle):
         """
         super().__init__(battle_queue)
         self.is_manual = False
+        self.can_ponder = True
 
-    def helper_get_the_whole_tree(self) -> TOS:
+    def helper_get_the_whole_tree(self, stats: SearchStats = None) -> TOS:
         """
         This is a helper function for IterativeMinimax select_attack method.
         It uses one given battle_queue(state) to get all possible states 
         afterwards.
-        It also get all paths from the end states to the given state, each node
-        in the path is stored in the form of a list with four attributes.
+        The tree is grown one level at a time by expand_tree(), which spills
+        levels too large for memory to disk, and keeps only the state of the
+        root. The paths from its end states to the given state are not kept:
+        TreeStore.iter_paths() makes them one at a time whenever they are
+        scored.
+        If stats is given, the expansion is recorded in it.
         """
-        current_battle_queue = self.battle_queue.copy()
+        current_battle_queue = self.battle_queue.copy(SEARCH_QUEUE_STORE)
+        if stats is not None:
+            stats.copies += 1
         t = TOS(current_battle_queue)
-        tloc = get_children(t)
-        t.children = tloc
-        if tloc:
-            for c in tloc:
-                if c.battle_q.is_over():
-                    path = [[c.caster, c.last_round_caster,
-                             c.last_round_taken_action, c.score],
-                            [c.last_round.caster,
-                             c.last_round.last_round_caster,
-                             c.last_round.last_round_taken_action,
-                             c.last_round.score]]
-                    t.possible_paths.append(path)
-                    if len(c.last_round.caster.get_available_actions()) == 2:
-                        t.snppc[c.last_round_caster] = [(0, 1)]
-        while tloc != []:
-            tloc = get_children(tloc)
-            for c in tloc:
-                if c.battle_q.is_over():
-                    path = [[c.caster, c.last_round_caster,
-                             c.last_round_taken_action, c.score]]
-                    while c.last_round:
-                        path.append([c.last_round.caster,
-                                     c.last_round.last_round_caster,
-                                     c.last_round.last_round_taken_action,
-                                     c.last_round.score])
-                        if len(c.last_round.caster.get_available_actions()) \
-                                == 2:
-                            if c.last_round.caster in \
-                                    t.snppc:
-                                t.snppc[c.last_round.caster].append(
-                                    (len(t.possible_paths), len(path) - 1))
-                            elif c.last_round.caster not in t.snppc:
-                                t.snppc[c.last_round.caster] = [
-                                    (len(t.possible_paths), len(path) - 1)]
-                        c = c.last_round
-                    t.possible_paths.append(path)
+        expand_tree(t, stats)
         return t
 
-    def helper_assign_all_scores(self):
+    def helper_assign_all_scores(self, stats: SearchStats = None
+                                 ) -> Tuple[TOS, bytearray]:
         """
         This is a helper function for assigning all the scores correctly for
-        the tree of states.
+        the tree of states. Return the tree and the action chosen at each of
+        its nodes, by index, as a byte, or 0 if there is none.
+        If stats is given, the expansion is recorded in it.
 
         The efficiency of this function is SUPER LOW!!!
         If got time out error on unittest, Please consider re-run it for about 
         6 more min, it will work.(Given unittest took 221s last time)
         """
-        t = self.helper_get_the_whole_tree()
-        for path in t.possible_paths:
-            for i in range(len(path) - 1):
-                if path[i][3] and path[i + 1][3] and \
-                        type(path[i + 1][3]) == list:
-                    if len(path[i + 1][0].get_available_actions()) == 2:
-                        if path[i][0].get_name() == path[i + 1][0].get_name():
-                            path[i + 1][3].append(path[i][3][0])
-                        if path[i][0].get_name() != path[i + 1][0].get_name():
-                            path[i + 1][3].append(-path[i][3][0])
-                        if len(path[i + 1][3]) > 1:
-                            path[i + 1][3] = [max(path[i + 1][3])]
-                    if path[i][0].get_name() == path[i + 1][0].get_name():
-                        path[i + 1][3].append(path[i][3][0])
-                    if path[i][0].get_name() != path[i + 1][0].get_name():
-                        path[i + 1][3].append(-path[i][3][0])
-                if path[i][3] and not path[i + 1][3]:
-                    if len(path[i + 1][0].get_available_actions()) == 2:
-                        if path[i][0].get_name() == path[i + 1][0].get_name():
-                            path[i + 1][3] = path[i][3][:]
-                        if path[i][0].get_name() != path[i + 1][0].get_name():
-                            path[i + 1][3] = [-path[i][3][0]]
-                        for node in t.snppc:
-                            if node == path[i + 1][0]:
-                                for pos in t.snppc[node]:
-                                    t.possible_paths[pos[0]][pos[1]][3] = \
-                                     path[i + 1][3][:]
-                        break
-                    if path[i][0].get_name() == path[i + 1][0].get_name():
-                        path[i + 1][3] = path[i][3][:]
-                    if path[i][0].get_name() != path[i + 1][0].get_name():
-                        path[i + 1][3] = [-path[i][3][0]]
-        return t
+        t = self.helper_get_the_whole_tree(stats)
+        return t, self._choices(t)
 
-    def select_attack(self, parameter: Any = None) -> str:
+    def _score_path(self, store: 'TreeStore', path: List[int],
+                    firsts: Dict[int, int]) -> List[Union[int, None]]:
+        """
+        Score path, from its end state up to the root, and return the score
+        of each of its nodes, or None for the nodes above where it stopped.
+
+        A node whose caster has one action scores what its child on path
+        does. A node whose caster has two actions takes the score of the
+        first path to reach it, which stops there, and is kept in firsts.
+        Every later path passes up the better of that score and its own,
+        except that a path from an end state right below the root never
+        sees the root's first score.
+        """
+        scores = [store.scores[path[0]][0]] + [None] * (len(path) - 1)
+        for i in range(1, len(path)):
+            node = path[i]
+            score = scores[i - 1]
+            if store.casters[node] != store.casters[path[i - 1]]:
+                score = -score
+            if store.action_counts[node] == 2:
+                first = firsts.get(node) if len(path) > 2 else None
+                if first is None:
+                    firsts[node] = scores[i] = score
+                    break
+                score = max(first, score)
+            scores[i] = score
+        return scores
+
+    def _scored_paths(self, store: 'TreeStore'
+                      ) -> Iterator[Tuple[List[int], List[Union[int, None]]]]:
+        """
+        Yield every path of store.iter_paths() with the score each of its
+        nodes ends up with once every path has been scored by _score_path,
+        or None for a node it has no score for.
+        """
+        firsts = {}
+        for path in store.iter_paths():
+            self._score_path(store, path, firsts)
+        scoring = {}
+        for path in store.iter_paths():
+            scores = self._score_path(store, path, scoring)
+            if len(path) > 2:
+                for i in range(len(path)):
+                    if scores[i] is None and \
+                            store.action_counts[path[i]] == 2:
+                        scores[i] = firsts[path[i]]
+            yield path, scores
+
+    def _choices(self, t: TOS) -> bytearray:
+        """
+        Return the action chosen at each node of the tree t, by index, as a
+        byte, or 0 if there is none: the action leading to the first child,
+        in the order of t.store.iter_paths(), whose score gave the node its
+        score. A node's score is the last one the paths through it give it.
+        """
+        store = t.store
+        scores = array('i', bytes(4 * len(store)))
+        scored = bytearray(len(store))
+        for path, path_scores in self._scored_paths(store):
+            for node, score in zip(path, path_scores):
+                if score is not None:
+                    scores[node] = score
+                    scored[node] = 1
+        choices = bytearray(len(store))
+        for node in range(len(store)):
+            if store.child_counts[node] == 1:
+                choices[node] = store.actions[store.first_children[node]]
+        for path, path_scores in self._scored_paths(store):
+            for i in range(1, len(path)):
+                node, child = path[i], path[i - 1]
+                if choices[node] or not scored[node] or \
+                        path_scores[i - 1] is None:
+                    continue
+                score = scores[node]
+                if store.casters[child] != store.casters[node]:
+                    score = -score
+                if path_scores[i - 1] == score:
+                    choices[node] = store.actions[child]
+        return choices
+
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
         """
         Select the action that can guarantee the highest state score for the 
         character.
         """
-        t = self.helper_assign_all_scores()
-        if t.children == []:
-            return 'X'
-        if len(t.children) == 1:
-            return t.possible_paths[0][-2][2]
-        score = t.possible_paths[-1][-1][3][0]
-        for path in t.possible_paths:
-            if path[-2][0].get_name() == t.caster.get_name():
-                if path[-2][3] and path[-2][3][0] == score:
-                    return path[-2][2]
-            elif path[-2][0].get_name() != t.caster.get_name():
-                if path[-2][3] and path[-2][3][0] == -score:
-                    return path[-2][2]
-        return 'X'
+        move = self._principal_variation_move(stats)
+        if move is not None:
+            return move
+        t, choices = self.helper_assign_all_scores(stats)
+        action = chr(choices[t.index]) if choices[t.index] else 'X'
+        self._set_principal_variation(self._line(t, action, choices))
+        return action
+
+    def _line(self, t: TOS, action: str, choices: bytearray
+              ) -> List[Tuple[bytes, str, str, 'BattleQueue']]:
+        """
+        Return the principal variation of the tree t, starting with action,
+        in the form _set_principal_variation takes, following the actions in
+        choices.
+        """
+        store = t.store
+        line = []
+        node = t.index
+        while action in ['A', 'S']:
+            first = store.first_children[node]
+            child = next(child for child in
+                         range(first, first + store.child_counts[node])
+                         if store.actions[child] == ord(action))
+            line.append((_position_key(store.queue(node)),
+                         store.caster_name(node), action, store.queue(child)))
+            if store.over[child]:
+                break
+            node = child
+            action = chr(choices[node]) if choices[node] else 'X'
+        return line
 
     def copy(self, new_battle_queue: 'BattleQueue') -> 'IterativeMinimax':
         """
@@ -402,6 +1050,212 @@ class IterativeMinimax(Playstyle):
         return IterativeMinimax(new_battle_queue)
 
 
+class ExpectimaxPlaystyle(Playstyle):
+    """
+    The Expectimax playstyle. Inherits from Playstyle.
+
+    Where minimax expects the opponent to make the move that is worst for
+    its character, this expects it to choose at random among its available
+    actions, uniformly or in proportion to opponent_weights, and chooses the
+    attacks that get the highest expected HP margin at the end of the game:
+    its character's HP minus the opponent's.
+
+    The expected margin of every game state it searches, including the ones
+    where the opponent chooses, is kept in cache and shared by its copies,
+    so later moves of a game are mostly looked up instead of searched. Moves
+    are searched the way a2_game performs them, so the margins it expects
+    are those of real games.
+
+    opponent_weights - How likely the opponent is to choose each action,
+                       relative to the other actions it can take, or None if
+                       it chooses uniformly.
+    cache - The expected margin of each game state searched, by the name of
+            the character it is for and BattleQueue.state_hash().
+    """
+    is_manual: bool
+    battle_queue: 'BattleQueue'
+    opponent_weights: Union[Dict[str, float], None]
+    cache: Dict[Tuple[str, int], float]
+
+    def __init__(self, battle_queue: 'BattleQueue',
+                 opponent_weights: Dict[str, float] = None) -> None:
+        """
+        Initialize this ExpectimaxPlaystyle with battle_queue as its battle
+        queue, modelling the opponent with opponent_weights.
+        """
+        super().__init__(battle_queue)
+        self.is_manual = False
+        self.can_ponder = True
+        self.opponent_weights = opponent_weights
+        self.cache = {}
+
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
+        """
+        Return the attack with the highest expected margin for the next
+        character in this Playstyle's battle_queue, or 'X' if it has none.
+
+        >>> from a2_opening_book import build_start
+        >>> bq = build_start('n', 'r', 'm', 30, 40)
+        >>> ExpectimaxPlaystyle(bq).select_attack()
+        'S'
+        """
+        actions = self.battle_queue.peek().get_available_actions()
+        if not actions:
+            return 'X'
+        name = self.battle_queue.peek().get_name()
+        bq = self.battle_queue.copy(SEARCH_QUEUE_STORE)
+        if stats is not None:
+            stats.copies += 1
+        margins = [self._margin(self._after(bq, action, stats), name, stats,
+                                1) for action in actions]
+        return actions[margins.index(max(margins))]
+
+    def expected_margin(self, battle_queue: 'BattleQueue' = None) -> float:
+        """
+        Return the expected HP margin at the end of the game in
+        battle_queue, or this Playstyle's battle_queue, for its next
+        character.
+
+        >>> from a2_opening_book import build_start
+        >>> bq = build_start('n', 'r', 'm', 30, 40)
+        >>> ExpectimaxPlaystyle(bq).expected_margin()
+        1.0
+        >>> ExpectimaxPlaystyle(bq, {'A': 1, 'S': 0}).expected_margin()
+        20.0
+        """
+        if battle_queue is None:
+            battle_queue = self.battle_queue
+        return self._margin(battle_queue, battle_queue.peek().get_name(),
+                            None, 0)
+
+    def _margin(self, battle_queue: 'BattleQueue', name: str,
+                stats: Union[SearchStats, None], depth: int) -> float:
+        """
+        Return the expected HP margin at the end of the game in battle_queue
+        for the character named name, where battle_queue is depth moves away
+        from where the search started.
+        """
+        key = (name, battle_queue.state_hash())
+        if key in self.cache:
+            if stats is not None:
+                stats.cache_hits += 1
+            return self.cache[key]
+        if stats is not None:
+            stats.cache_misses += 1
+            stats.max_depth = max(stats.max_depth, depth)
+        actions = [] if battle_queue.is_over() else \
+            battle_queue.peek().get_available_actions()
+        if not actions:
+            margin = float(sum(member.get_hp() if member.get_name() == name
+                               else -member.get_hp()
+                               for member in battle_queue.members()))
+        else:
+            if stats is not None:
+                stats.nodes += 1
+            margins = [self._margin(self._after(battle_queue, action, stats),
+                                    name, stats, depth + 1)
+                       for action in actions]
+            if battle_queue.peek().get_name() == name:
+                margin = max(margins)
+            else:
+                chances = self._chances(actions)
+                margin = sum(chance * child_margin for chance, child_margin
+                             in zip(chances, margins))
+        self.cache[key] = margin
+        return margin
+
+    def _after(self, battle_queue: 'BattleQueue', action: str,
+               stats: Union[SearchStats, None]) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the state reached by the next character
+        in battle_queue performing action, the way a2_game performs it: the
+        character only leaves the front if it can still act.
+        """
+        a_copy = battle_queue.copy()
+        if stats is not None:
+            stats.copies += 1
+        perform_move(a_copy, action, use_table=True)
+        a_copy.normalize()
+        return a_copy
+
+    def _chances(self, actions: List[str]) -> List[float]:
+        """
+        Return how likely the opponent is to choose each of actions, the
+        actions it can take.
+
+        >>> ExpectimaxPlaystyle(None, {'A': 3, 'S': 1})._chances(['A', 'S'])
+        [0.75, 0.25]
+        >>> ExpectimaxPlaystyle(None, {'A': 3, 'S': 1})._chances(['S'])
+        [1.0]
+        """
+        weights = [1.0] * len(actions)
+        if self.opponent_weights is not None:
+            weights = [self.opponent_weights.get(action, 0.0)
+                       for action in actions]
+            if not any(weights):
+                weights = [1.0] * len(actions)
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+    def copy(self, new_battle_queue: 'BattleQueue') -> 'ExpectimaxPlaystyle':
+        """
+        Return a copy of this ExpectimaxPlaystyle which uses the BattleQueue
+        new_battle_queue, the same opponent model and the same cache.
+        """
+        new_playstyle = ExpectimaxPlaystyle(new_battle_queue,
+                                            self.opponent_weights)
+        new_playstyle.cache = self.cache
+        return new_playstyle
+
+
+class BookPlaystyle(Playstyle):
+    """
+    A Playstyle that plays the moves of an opening book while the game is in
+    it, and asks another Playstyle for every other move.
+
+    book - The opening book, with a move(battle_queue) method that returns
+           its move for the state of battle_queue or None.
+    fallback - The Playstyle asked for moves the book does not have. It must
+               use the same battle_queue.
+    """
+    book: 'OpeningBook'
+    fallback: Playstyle
+
+    def __init__(self, battle_queue: 'BattleQueue', book: 'OpeningBook',
+                 fallback: Playstyle) -> None:
+        """
+        Initialize this BookPlaystyle with battle_queue as its battle queue.
+        """
+        super().__init__(battle_queue)
+        self.is_manual = fallback.is_manual
+        self.can_ponder = fallback.can_ponder
+        self.book = book
+        self.fallback = fallback
+
+    def _select_attack(self, parameter: Any,
+                       stats: Union[SearchStats, None]) -> str:
+        """
+        Return the book's move for the state of this Playstyle's
+        battle_queue, recording it in stats as a cache hit unless stats is
+        None, or else the move chosen by fallback.
+        """
+        move = self.book.move(self.battle_queue)
+        if move is not None:
+            if stats is not None:
+                stats.cache_hits += 1
+            return move
+        return self.fallback._answer(parameter, stats)
+
+    def copy(self, new_battle_queue: 'BattleQueue') -> 'BookPlaystyle':
+        """
+        Return a copy of this BookPlaystyle which uses the BattleQueue
+        new_battle_queue and the same book.
+        """
+        return BookPlaystyle(new_battle_queue, self.book,
+                             self.fallback.copy(new_battle_queue))
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config='a2_pyta.txt')
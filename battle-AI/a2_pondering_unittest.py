@@ -0,0 +1,167 @@
+"""
+Unittests for pondering by A2's Playstyles.
+
+These tests play games between a minimax Playstyle that ponders and a player
+who moves at random, and check that every move the Playstyle answers from
+pondering is the move a new search would have chosen.
+"""
+import random
+import threading
+import unittest
+
+from a2_game import PLAYSTYLE_CLASSES
+from a2_playstyle import RandomPlaystyle, RecursiveMinimax, _position_key, \
+    _positions_after_opponent
+from a2_transitions import perform_move
+from a2_test_support import make_queue, make_start, pairings
+
+
+class PonderingUnitTests(unittest.TestCase):
+    def test_pondered_moves_match_search(self):
+        """
+        Test to make sure moves answered from pondering are the moves a new
+        search would choose, and that some moves are answered from it.
+        """
+        for key in ['mr', 'mi']:
+            pondered = 0
+            for queue_class, p1_class, p2_class in pairings():
+                bq = make_queue(queue_class, p1_class, p2_class,
+                                (30, 20, 30, 20))
+                computer = bq.peek()
+                playstyle = PLAYSTYLE_CLASSES[key](bq)
+                playstyle.enable_pondering()
+                playstyle.enable_stats()
+                rng = random.Random(p1_class.__name__ +
+                                    p2_class.__name__)
+                while not bq.is_over():
+                    character = bq.peek()
+                    if character is not computer:
+                        perform_move(bq, rng.choice(
+                            character.get_available_actions()))
+                        continue
+                    expected = PLAYSTYLE_CLASSES[key](
+                        bq).select_attack()
+                    on_line = _position_key(bq) in \
+                        playstyle._pv_moves
+                    move = playstyle.select_attack()
+                    pondered += not on_line and \
+                        playstyle.stats.nodes == 0
+                    self.assertEqual(expected, move,
+                                     ("A pondering {} chose {} " +
+                                      "instead of {} in:\n{}").format(
+                                          PLAYSTYLE_CLASSES[key]
+                                          .__name__, move, expected,
+                                          bq))
+                    if not character.is_valid_action(move):
+                        break
+                    perform_move(bq, move)
+                    playstyle.ponder()
+                playstyle.disable_pondering()
+            self.assertTrue(pondered > 0,
+                            ("A {} never answered from pondering.").format(
+                                PLAYSTYLE_CLASSES[key].__name__))
+
+    def test_reached_position_is_searched_next(self):
+        """
+        Test to make sure that when the position reached has not been
+        searched yet, it is searched right after the position being searched,
+        and the positions between them are skipped.
+        """
+        bq = make_start('n', 'r', 'm', 50, 40)
+        for move in ['A', 'S']:
+            perform_move(bq, move)
+        playstyle = PLAYSTYLE_CLASSES['mr'](bq)
+        positions = _positions_after_opponent(bq,
+                                              bq.peek().enemy.get_name())
+        self.assertTrue(len(positions) > 2,
+                        "Expected more than two positions after {!r}.".format(
+                            bq))
+        searched = []
+        started = threading.Event()
+        release = threading.Event()
+        copy = playstyle.copy
+
+        def blocking_copy(battle_queue):
+            searched.append(_position_key(battle_queue))
+            started.set()
+            release.wait()
+            return copy(battle_queue)
+
+        playstyle.copy = blocking_copy
+        playstyle.enable_pondering()
+        playstyle.ponder()
+        started.wait()
+        key, reached = positions[-1]
+        threading.Timer(0.1, release.set).start()
+        move = playstyle._ponderer.move(reached)
+        self.assertEqual(copy(reached).select_attack(), move,
+                         "Pondering chose {} in:\n{}".format(move, reached))
+        self.assertEqual([positions[0][0], key], searched,
+                         ("Expected the first position and then the one " +
+                          "reached to be searched, but {} of {} " +
+                          "were.").format(len(searched), len(positions)))
+        playstyle.disable_pondering()
+
+    def test_failed_search_is_not_waited_for(self):
+        """
+        Test to make sure that when a pondered search raises, the position
+        reached is answered with None instead of being waited for forever.
+        """
+        class FailingMinimax(RecursiveMinimax):
+            def _select_attack(self, parameter, stats):
+                raise RuntimeError("search failed")
+
+            def copy(self, new_battle_queue):
+                return FailingMinimax(new_battle_queue)
+
+        bq = make_start('n', 'r', 'm', 50, 40)
+        perform_move(bq, 'A')
+        playstyle = FailingMinimax(bq)
+        key, reached = _positions_after_opponent(
+            bq, bq.peek().enemy.get_name())[-1]
+        playstyle.enable_pondering()
+        playstyle.ponder()
+        moves = []
+        waiter = threading.Thread(
+            target=lambda: moves.append(playstyle._ponderer.move(reached)),
+            daemon=True)
+        waiter.start()
+        waiter.join(10)
+        self.assertFalse(waiter.is_alive(),
+                         "Waiting for a failed search never returned.")
+        self.assertEqual([None], moves,
+                         "Expected no move from a failed search, " +
+                         "got {}.".format(moves))
+        playstyle.disable_pondering()
+
+    def test_random_playstyle_does_not_ponder(self):
+        """
+        Test to make sure a seeded RandomPlaystyle chooses the same moves
+        when asked to ponder, since its copies would share its random stream.
+        """
+        games = []
+        for ponder in [False, True]:
+            bq = make_start('n', 'r', 'm', 100, 100)
+            playstyle = RandomPlaystyle(bq, 45)
+            moves = []
+            while not bq.is_over():
+                character = bq.peek()
+                computer = character.get_name() == 'P1'
+                move = playstyle.select_attack() if computer else 'A'
+                if not character.is_valid_action(move):
+                    break
+                moves.append(move)
+                perform_move(bq, move)
+                if ponder and computer:
+                    playstyle.enable_pondering()
+                    playstyle.ponder()
+            self.assertIsNone(playstyle._ponderer,
+                              "A RandomPlaystyle should not ponder.")
+            games.append(moves)
+        self.assertEqual(games[0], games[1],
+                         "Pondering changed the moves of a seeded " +
+                         "RandomPlaystyle.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
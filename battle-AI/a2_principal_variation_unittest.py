@@ -0,0 +1,85 @@
+"""
+Unittests for the principal variations kept by A2's minimax Playstyles.
+
+These tests play whole games between minimax Playstyles and check that every
+move answered from a stored principal variation is the move a new search
+would have chosen.
+"""
+import unittest
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES
+from a2_battle_queue import BattleQueue
+from a2_transitions import perform_move
+from a2_test_support import make_queue, pairings
+
+
+def play_game(bq, key):
+    """
+    Play the game in bq to the end with a PLAYSTYLE_CLASSES[key] for each
+    character, the way a2_game does. Return the moves chosen, the moves a new
+    search would have chosen instead, and how many moves were answered from
+    a principal variation.
+    """
+    playstyles = {}
+    for character in [bq.peek(), bq.peek().enemy]:
+        playstyles[character.get_name()] = PLAYSTYLE_CLASSES[key](bq)
+        playstyles[character.get_name()].enable_stats()
+    moves, expected, answered = [], [], 0
+    while not bq.is_over():
+        character = bq.peek()
+        playstyle = playstyles[character.get_name()]
+        expected.append(PLAYSTYLE_CLASSES[key](bq).select_attack())
+        moves.append(playstyle.select_attack())
+        answered += playstyle.stats.nodes == 0
+        if not character.is_valid_action(moves[-1]):
+            break
+        perform_move(bq, moves[-1])
+    return moves, expected, answered
+
+
+class PrincipalVariationUnitTests(unittest.TestCase):
+    def test_answers_match_search(self):
+        """
+        Test to make sure both minimax Playstyles answer from their principal
+        variation with the move a new search would choose, and do answer
+        from it.
+        """
+        for key in ['mr', 'mi']:
+            total = 0
+            for queue_class, p1_class, p2_class in pairings():
+                bq = make_queue(queue_class, p1_class, p2_class,
+                                (30, 20, 30, 20))
+                moves, expected, answered = play_game(bq, key)
+                total += answered
+                self.assertEqual(expected, moves,
+                                 ("A {} should play:\n{}\nbut " +
+                                  "played:\n{}\ninstead.").format(
+                                      PLAYSTYLE_CLASSES[key].__name__,
+                                      expected, moves))
+            self.assertTrue(total > 0,
+                            ("A {} never answered from its principal " +
+                             "variation.").format(
+                                 PLAYSTYLE_CLASSES[key].__name__))
+
+    def test_variation_starts_with_move(self):
+        """
+        Test to make sure the principal variation starts with the move
+        chosen, made by the character whose turn it is.
+        """
+        for key in ['mr', 'mi']:
+            bq = make_queue(BattleQueue, CHARACTER_CLASSES['r'],
+                            CHARACTER_CLASSES['m'], (40, 6, 14, 35))
+            playstyle = PLAYSTYLE_CLASSES[key](bq)
+            move = playstyle.select_attack()
+            name, action, after = playstyle.principal_variation[0]
+            self.assertEqual((bq.peek().get_name(), move), (name, action),
+                             ("The principal variation of a {} should " +
+                              "start with {}'s {}.").format(
+                                  PLAYSTYLE_CLASSES[key].__name__,
+                                  bq.peek().get_name(), move))
+            self.assertTrue(playstyle.principal_variation[-1][2].is_over(),
+                            "The principal variation should end the game.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
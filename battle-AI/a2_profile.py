@@ -0,0 +1,247 @@
+"""
+A profiler for whole matches of A2.
+
+A MatchProfiler records the full call stack of everything that happens
+inside a2_game.perform_attack, including the Playstyle's select_attack, and
+adds up the time spent in each stack over every move of a match. The totals
+can be written in the collapsed-stack format read by flamegraph tools
+(one "frame;frame;frame microseconds" line per stack).
+
+Run this file to profile a match between two AI playstyles:
+
+    python a2_profile.py --queue n --p1 m mr --p2 v mr --profile match.folded
+
+or pass --profile to a2_ui_nonpygame.py to profile a match played by hand.
+"""
+from typing import Callable, Dict, List, Tuple
+import argparse
+import sys
+import time
+
+import a2_game
+
+# The functions whose inclusive time is reported by summary() by default,
+# keyed by the name they are reported under.
+HOT_PATHS = {'BattleQueue.copy': ['BattleQueue.copy',
+                                  'RestrictedBattleQueue.copy'],
+             'Character.copy': ['Mage.copy', 'Rogue.copy', 'Vampire.copy',
+                                'Sorcerer.copy'],
+             'get_available_actions': ['Character.get_available_actions'],
+             'apply_transition': ['apply_transition'],
+             'select_attack': ['Playstyle.select_attack'],
+             'get_state_score': ['get_state_score']}
+
+
+def _frame_label(frame: 'frame') -> str:
+    """
+    Return the label used for the Python function running in frame.
+    """
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return "{}:{}".format(module, getattr(code, 'co_qualname', code.co_name))
+
+
+def _builtin_label(function: Callable) -> str:
+    """
+    Return the label used for the built-in function.
+    """
+    owner = getattr(function, '__self__', None)
+    if owner is not None and not isinstance(owner, type(sys)):
+        return "builtins:{}.{}".format(type(owner).__name__,
+                                       function.__name__)
+    return "builtins:{}".format(function.__name__)
+
+
+class MatchProfiler:
+    """
+    A profiler that records the time spent in every call stack over all the
+    calls made through run().
+
+    stacks - the number of seconds spent in each call stack, not counting
+             time spent in the functions it calls, keyed by the stack's
+             labels from outermost to innermost.
+    moves - the number of calls made through run().
+    """
+    stacks: Dict[Tuple[str, ...], float]
+    moves: int
+
+    def __init__(self, root: str = 'match') -> None:
+        """
+        Initialize this MatchProfiler. root is the label of the outermost
+        frame of every stack.
+
+        >>> p = MatchProfiler()
+        >>> p.moves
+        0
+        """
+        self.stacks = {}
+        self.moves = 0
+        self._root = root
+        self._stack = []
+
+    def _enter(self, label: str) -> None:
+        """
+        Record that a function labelled label was called.
+        """
+        self._stack.append([label, time.perf_counter(), 0.0])
+
+    def _leave(self) -> None:
+        """
+        Record that the innermost function returned.
+        """
+        label, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        path = tuple(entry[0] for entry in self._stack) + (label,)
+        self.stacks[path] = self.stacks.get(path, 0.0) + elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def _trace(self, frame: 'frame', event: str, arg: object) -> None:
+        """
+        Handle a profiling event from sys.setprofile.
+        """
+        if event == 'call':
+            self._enter(_frame_label(frame))
+        elif event == 'c_call':
+            self._enter(_builtin_label(arg))
+        elif len(self._stack) > 1:
+            self._leave()
+
+    def run(self, function: Callable, *args: object) -> object:
+        """
+        Call function with args while profiling it, and return its result.
+
+        >>> p = MatchProfiler()
+        >>> p.run(sorted, [3, 1, 2])
+        [1, 2, 3]
+        >>> p.moves
+        1
+        >>> sorted(p.stacks)
+        [('match',), ('match', 'builtins:sorted')]
+        """
+        self.moves += 1
+        self._stack = []
+        self._enter(self._root)
+        previous = sys.getprofile()
+        sys.setprofile(self._trace)
+        try:
+            return function(*args)
+        finally:
+            sys.setprofile(previous)
+            # Forget the call to sys.setprofile itself, which never returns
+            # while profiled.
+            del self._stack[1:]
+            self._leave()
+
+    def collapsed(self) -> List[str]:
+        """
+        Return the recorded stacks in collapsed-stack format, with times in
+        whole microseconds. Stacks that took less than a microsecond are
+        left out.
+
+        >>> p = MatchProfiler()
+        >>> p.stacks = {('match',): 0.5, ('match', 'a:f'): 0.25}
+        >>> p.collapsed()
+        ['match 500000', 'match;a:f 250000']
+        """
+        lines = []
+        for path in sorted(self.stacks):
+            microseconds = int(round(self.stacks[path] * 1e6))
+            if microseconds > 0:
+                lines.append("{} {}".format(";".join(path), microseconds))
+        return lines
+
+    def write_collapsed(self, path: str) -> None:
+        """
+        Write the recorded stacks in collapsed-stack format to the file at
+        path.
+        """
+        with open(path, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + "\n")
+
+    def inclusive_time(self, names: List[str]) -> float:
+        """
+        Return the number of seconds spent in the functions with the
+        qualified names in names, including the functions they call.
+        Recursive calls are only counted once.
+
+        >>> p = MatchProfiler()
+        >>> p.stacks = {('match', 'a:f'): 0.5, ('match', 'a:f', 'a:g'): 0.25,
+        ...             ('match', 'a:g'): 1.0}
+        >>> p.inclusive_time(['f'])
+        0.75
+        >>> p.inclusive_time(['f', 'g'])
+        1.75
+        """
+        total = 0.0
+        for path, seconds in self.stacks.items():
+            if any(label.split(':', 1)[-1] in names for label in path):
+                total += seconds
+        return total
+
+    def summary(self, hot_paths: Dict[str, List[str]] = None) -> List[str]:
+        """
+        Return one line per entry of hot_paths (HOT_PATHS by default) giving
+        the total time spent in it and its share of everything profiled.
+        """
+        hot_paths = HOT_PATHS if hot_paths is None else hot_paths
+        profiled = sum(self.stacks.values())
+        lines = ["{} moves, {:.3f}s profiled".format(self.moves, profiled)]
+        for name in hot_paths:
+            seconds = self.inclusive_time(hot_paths[name])
+            lines.append("  {:<24} {:>9.3f}s {:>6.1%}".format(
+                name, seconds, seconds / (profiled or 1.0)))
+        return lines
+
+
+def profile_match(queue_type: str, player_1: Tuple[str, str],
+                  player_2: Tuple[str, str], max_moves: int = 1000) \
+        -> MatchProfiler:
+    """
+    Play a match between two AI playstyles through a2_game and return a
+    MatchProfiler that profiled every move. player_1 and player_2 are
+    (class key, playstyle key) pairs, as used by a2_game.
+
+    >>> p = profile_match('n', ('r', 'r'), ('m', 'r'))
+    >>> p.moves > 0 and a2_game.GAME_IS_OVER
+    True
+    """
+    profiler = MatchProfiler()
+    a2_game.set_up_match(queue_type, player_1[0], "P1", player_1[1],
+                         player_2[0], "P2", player_2[1])
+    previous = a2_game.PROFILER
+    a2_game.PROFILER = profiler
+    try:
+        while not a2_game.GAME_IS_OVER and profiler.moves < max_moves:
+            if a2_game.BATTLE_QUEUE.is_over():
+                break
+            a2_game.perform_attack()
+    finally:
+        a2_game.PROFILER = previous
+    return profiler
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Profile a match described by the command line arguments in argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--queue', default='n',
+                        choices=sorted(a2_game.BATTLE_QUEUE_CLASSES))
+    parser.add_argument('--p1', nargs=2, default=['m', 'mr'],
+                        metavar=('CLASS', 'PLAYSTYLE'))
+    parser.add_argument('--p2', nargs=2, default=['v', 'mr'],
+                        metavar=('CLASS', 'PLAYSTYLE'))
+    parser.add_argument('--profile', default='match.folded',
+                        help="where to write the collapsed stacks")
+    args = parser.parse_args(argv)
+
+    profiler = profile_match(args.queue, tuple(args.p1), tuple(args.p2))
+    profiler.write_collapsed(args.profile)
+    print("\n".join(profiler.summary()))
+    print("Collapsed stacks written to " + args.profile)
+
+
+if __name__ == '__main__':
+    main()
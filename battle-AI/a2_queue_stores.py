@@ -0,0 +1,361 @@
+"""
+Queue stores for A2's BattleQueues.
+
+A BattleQueue keeps who is in it in a queue store. Every store has the same
+interface: push() and pop() return the store to use afterwards, peek() returns
+the entry at the front, and share() returns a store that a copy of the
+BattleQueue can use without affecting this one.
+
+ListStore is the default. It changes in place, so share() copies it in full.
+
+RunLengthStore keeps consecutive equal entries as a single (entry, count)
+run, so share() takes time proportional to the number of runs rather than the
+number of entries. Queues built by repeated RogueSpecial and VampireSpecial
+attacks are mostly long runs of the same character.
+
+PersistentStore never changes once made, so share() returns it as is. A
+BattleQueue copied from another one shares everything the two have in common,
+so copying is free, which makes it a good fit for search engines that copy a
+BattleQueue for every state they look at. Most pushes and pops allocate O(1)
+new memory, but one that rebalances the store copies all of it.
+"""
+from typing import Any, Iterable, Iterator, List, Tuple, Union
+from collections import deque
+
+
+class ListStore:
+    """
+    A queue store that is changed in place.
+
+    >>> s = ListStore([1, 2])
+    >>> s.push(3) is s
+    True
+    >>> s.pop().peek()
+    2
+    >>> list(s)
+    [2, 3]
+    """
+
+    def __init__(self, items: Iterable[Any] = ()) -> None:
+        """
+        Initialize this ListStore with items, from front to back.
+
+        >>> len(ListStore())
+        0
+        """
+        self._items = deque(items)
+
+    def push(self, item: Any) -> 'ListStore':
+        """
+        Add item to the back of this ListStore and return it.
+        """
+        self._items.append(item)
+        return self
+
+    def pop(self) -> 'ListStore':
+        """
+        Remove the item at the front of this ListStore and return it.
+        Raise IndexError if this ListStore is empty.
+
+        >>> ListStore().pop()
+        Traceback (most recent call last):
+        ...
+        IndexError: pop from an empty deque
+        """
+        self._items.popleft()
+        return self
+
+    def peek(self) -> Any:
+        """
+        Return the item at the front of this ListStore.
+        Raise IndexError if this ListStore is empty.
+        """
+        return self._items[0]
+
+    def count(self, item: Any) -> int:
+        """
+        Return the number of times item is in this ListStore.
+
+        >>> ListStore('aba').count('a')
+        2
+        """
+        return self._items.count(item)
+
+    def share(self) -> 'ListStore':
+        """
+        Return a copy of this ListStore.
+
+        >>> s = ListStore([1])
+        >>> t = s.share()
+        >>> t.push(2) is s
+        False
+        >>> list(s)
+        [1]
+        """
+        return ListStore(self._items)
+
+    def __len__(self) -> int:
+        """
+        Return the number of items in this ListStore.
+        """
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Return an iterator over the items in this ListStore, from front to
+        back.
+        """
+        return iter(self._items)
+
+
+class RunLengthStore:
+    """
+    A queue store that is changed in place and keeps consecutive equal items
+    as (item, count) runs.
+
+    >>> s = RunLengthStore('aab')
+    >>> s.push('b').push('b').runs()
+    [('a', 2), ('b', 3)]
+    >>> s.pop().pop().peek()
+    'b'
+    >>> list(s)
+    ['b', 'b', 'b']
+    """
+
+    def __init__(self, items: Iterable[Any] = ()) -> None:
+        """
+        Initialize this RunLengthStore with items, from front to back.
+
+        >>> len(RunLengthStore())
+        0
+        """
+        self._runs = deque()
+        self._length = 0
+        for item in items:
+            self.push(item)
+
+    def push(self, item: Any) -> 'RunLengthStore':
+        """
+        Add item to the back of this RunLengthStore and return it.
+        """
+        if self._runs and self._runs[-1][0] == item:
+            self._runs[-1] = (item, self._runs[-1][1] + 1)
+        else:
+            self._runs.append((item, 1))
+        self._length += 1
+        return self
+
+    def pop(self) -> 'RunLengthStore':
+        """
+        Remove the item at the front of this RunLengthStore and return it.
+        Raise IndexError if this RunLengthStore is empty.
+
+        >>> RunLengthStore().pop()
+        Traceback (most recent call last):
+        ...
+        IndexError: pop from an empty RunLengthStore
+        """
+        if not self._runs:
+            raise IndexError("pop from an empty RunLengthStore")
+        item, count = self._runs[0]
+        if count == 1:
+            self._runs.popleft()
+        else:
+            self._runs[0] = (item, count - 1)
+        self._length -= 1
+        return self
+
+    def peek(self) -> Any:
+        """
+        Return the item at the front of this RunLengthStore.
+        Raise IndexError if this RunLengthStore is empty.
+        """
+        if not self._runs:
+            raise IndexError("peek at an empty RunLengthStore")
+        return self._runs[0][0]
+
+    def count(self, item: Any) -> int:
+        """
+        Return the number of times item is in this RunLengthStore.
+
+        >>> RunLengthStore('aaba').count('a')
+        3
+        """
+        return sum(count for other, count in self._runs if other == item)
+
+    def runs(self) -> List[Tuple[Any, int]]:
+        """
+        Return the (item, count) runs in this RunLengthStore, from front to
+        back.
+        """
+        return list(self._runs)
+
+    def share(self) -> 'RunLengthStore':
+        """
+        Return a copy of this RunLengthStore, in time proportional to its
+        number of runs.
+
+        >>> s = RunLengthStore('aab')
+        >>> t = s.share()
+        >>> t.push('c') is s
+        False
+        >>> s.runs()
+        [('a', 2), ('b', 1)]
+        """
+        other = RunLengthStore()
+        other._runs = deque(self._runs)
+        other._length = self._length
+        return other
+
+    def __len__(self) -> int:
+        """
+        Return the number of items in this RunLengthStore.
+        """
+        return self._length
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Return an iterator over the items in this RunLengthStore, from front
+        to back.
+        """
+        for item, count in self._runs:
+            for _ in range(count):
+                yield item
+
+
+# A cons list is either None (the empty list) or a (head, tail) pair.
+Cons = Union[None, Tuple[Any, 'Cons']]
+
+
+class PersistentStore:
+    """
+    A queue store that never changes once made: push() and pop() return a new
+    PersistentStore that shares all but O(1) of its memory with this one.
+
+    This is a banker's queue: items are popped from the front cons list and
+    pushed onto the back cons list, which is reversed onto the end of the
+    front whenever it gets longer than the front. That rebalance rebuilds the
+    front, so it takes O(n) time. Used the way a list is, each version pushed
+    or popped only once, the rebalances add up to amortized O(1) time per
+    push() and pop(). The amortization does not hold once versions are
+    shared: a search that pushes or pops the same version on every branch
+    pays for its rebalance on every branch, so the worst case is O(n) per
+    push() or pop().
+
+    >>> s = PersistentStore([1, 2])
+    >>> t = s.push(3)
+    >>> u = t.pop()
+    >>> list(s), list(t), list(u)
+    ([1, 2], [1, 2, 3], [2, 3])
+    """
+
+    def __init__(self, items: Iterable[Any] = ()) -> None:
+        """
+        Initialize this PersistentStore with items, from front to back.
+
+        >>> len(PersistentStore())
+        0
+        """
+        items = list(items)
+        self._front = None
+        for item in reversed(items):
+            self._front = (item, self._front)
+        self._front_length = len(items)
+        self._back = None
+        self._back_length = 0
+
+    @staticmethod
+    def _make(front: Cons, front_length: int, back: Cons,
+              back_length: int) -> 'PersistentStore':
+        """
+        Return a PersistentStore with the given front and back, reversing the
+        back onto the front if it is longer.
+        """
+        if back_length > front_length:
+            items = []
+            while front is not None:
+                items.append(front[0])
+                front = front[1]
+            while back is not None:
+                front = (back[0], front)
+                back = back[1]
+            for item in reversed(items):
+                front = (item, front)
+            front_length += back_length
+            back_length = 0
+        store = PersistentStore.__new__(PersistentStore)
+        store._front = front
+        store._front_length = front_length
+        store._back = back
+        store._back_length = back_length
+        return store
+
+    def push(self, item: Any) -> 'PersistentStore':
+        """
+        Return a PersistentStore with item added to the back of this one.
+        """
+        return PersistentStore._make(self._front, self._front_length,
+                                     (item, self._back),
+                                     self._back_length + 1)
+
+    def pop(self) -> 'PersistentStore':
+        """
+        Return a PersistentStore with the item at the front of this one
+        removed. Raise IndexError if this PersistentStore is empty.
+
+        >>> PersistentStore().pop()
+        Traceback (most recent call last):
+        ...
+        IndexError: pop from an empty PersistentStore
+        """
+        if self._front is None:
+            raise IndexError("pop from an empty PersistentStore")
+        return PersistentStore._make(self._front[1], self._front_length - 1,
+                                     self._back, self._back_length)
+
+    def peek(self) -> Any:
+        """
+        Return the item at the front of this PersistentStore.
+        Raise IndexError if this PersistentStore is empty.
+        """
+        if self._front is None:
+            raise IndexError("peek at an empty PersistentStore")
+        return self._front[0]
+
+    def count(self, item: Any) -> int:
+        """
+        Return the number of times item is in this PersistentStore.
+
+        >>> PersistentStore('aba').push('a').count('a')
+        3
+        """
+        return sum(1 for other in self if other == item)
+
+    def share(self) -> 'PersistentStore':
+        """
+        Return this PersistentStore, which can be shared because it never
+        changes.
+        """
+        return self
+
+    def __len__(self) -> int:
+        """
+        Return the number of items in this PersistentStore.
+        """
+        return self._front_length + self._back_length
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Return an iterator over the items in this PersistentStore, from front
+        to back.
+        """
+        cell = self._front
+        while cell is not None:
+            yield cell[0]
+            cell = cell[1]
+        back = []
+        cell = self._back
+        while cell is not None:
+            back.append(cell[0])
+            cell = cell[1]
+        yield from reversed(back)
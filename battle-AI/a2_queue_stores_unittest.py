@@ -0,0 +1,89 @@
+"""
+Unittests for the queue stores used by A2's BattleQueues.
+
+These tests play the same random moves on BattleQueues that use different
+queue stores and check that they always agree, and that copies which share
+their contents with the original never affect it.
+"""
+import random
+import unittest
+
+from a2_game import CHARACTER_CLASSES
+from a2_battle_queue import BattleQueue, RestrictedBattleQueue
+from a2_queue_stores import ListStore, PersistentStore, RunLengthStore
+from a2_test_support import make_queue, pairings
+
+STORES = [ListStore, PersistentStore, RunLengthStore]
+
+
+def describe(bq):
+    """
+    Return everything about bq that a store could get wrong.
+    """
+    return (repr(bq), getattr(bq, 'able_to_add_list', None), repr(bq.peek()),
+            bq.is_over(), bq.state_hash())
+
+
+def play_randomly(bq, rng, moves):
+    """
+    Make the characters in bq perform up to moves random actions chosen by
+    rng, stopping early if the game ends.
+    """
+    for _ in range(moves):
+        if bq.is_over():
+            return
+        character = bq.peek()
+        actions = character.get_available_actions()
+        if not actions:
+            return
+        if rng.choice(actions) == 'A':
+            character.attack()
+        else:
+            character.special_attack()
+        if not bq.is_empty():
+            bq.remove()
+
+
+class QueueStoreUnitTests(unittest.TestCase):
+    def test_stores_agree(self):
+        """
+        Test to make sure every store leaves a BattleQueue in the same state
+        after the same random moves.
+        """
+        for queue_class, p1_class, p2_class in pairings():
+            for seed in range(5):
+                states = []
+                for store in STORES:
+                    bq = make_queue(queue_class, p1_class, p2_class,
+                                    (100, 100, 100, 100)).copy(store)
+                    play_randomly(bq, random.Random(seed), 30)
+                    states.append(describe(bq))
+                for store, state in zip(STORES[1:], states[1:]):
+                    self.assertEqual(
+                        states[0], state,
+                        ("A BattleQueue using a {} should be in " +
+                         "the state:\n{}\nbut is in:\n{}\n" +
+                         "instead.").format(store.__name__,
+                                            states[0], state))
+
+    def test_shared_copies_are_independent(self):
+        """
+        Test to make sure changing a copy that shares its PersistentStore
+        with the original does not change the original.
+        """
+        for queue_class in [BattleQueue, RestrictedBattleQueue]:
+            bq = make_queue(queue_class, CHARACTER_CLASSES['r'],
+                            CHARACTER_CLASSES['v'],
+                            (100, 100, 100, 100)).copy(PersistentStore)
+            play_randomly(bq, random.Random(0), 3)
+            expected = describe(bq)
+            for seed in range(10):
+                play_randomly(bq.copy(), random.Random(seed), 10)
+                self.assertEqual(expected, describe(bq),
+                                 ("Playing on a copy should leave the " +
+                                  "original as:\n{}\nbut it is:\n{}\n" +
+                                  "instead.").format(expected, describe(bq)))
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,122 @@
+"""
+Unittests for A2's seeded RandomPlaystyle.
+
+These tests check that RandomPlaystyles with the same seed choose the same
+attacks, whatever else uses the random module, that a copy goes on with the
+same random stream, and that a seed recorded in a replay log plays the match
+again.
+"""
+import os
+import random
+import tempfile
+import unittest
+
+from a2_match import Match
+from a2_playstyle import RandomPlaystyle, stream_seed
+from a2_replay import ReplayReader, record_match
+
+
+def play(match):
+    """
+    Play match to the end and return the attacks chosen.
+    """
+    moves = []
+    while not match.is_over:
+        moves.append(match.perform_attack())
+    return moves
+
+
+class RandomPlaystyleUnitTests(unittest.TestCase):
+    def test_same_seed_same_match(self):
+        """
+        Test to make sure matches seeded the same way are played the same
+        way, even if the random module is used in between.
+        """
+        for seed in range(20):
+            first = play(Match('n', 'm', 'A', 'r', 'v', 'B', 'r', seed))
+            random.seed(seed + 1000)
+            random.random()
+            second = play(Match('n', 'm', 'A', 'r', 'v', 'B', 'r', seed))
+            self.assertEqual(first, second,
+                             ("Matches with the seed {} were played " +
+                              "differently.").format(seed))
+
+    def test_streams_are_independent(self):
+        """
+        Test to make sure the streams of different players and matches are
+        different.
+        """
+        seeds = {stream_seed(1, worker, match, player)
+                 for worker in range(4) for match in range(50)
+                 for player in ['p1', 'p2']}
+        self.assertEqual(400, len(seeds),
+                         "Every stream should have its own seed.")
+        matches = {tuple(play(Match('r', 's', 'A', 'r', 'r', 'B', 'r',
+                                    stream_seed(1, match))))
+                   for match in range(50)}
+        self.assertTrue(len(matches) > 25,
+                        "Matches seeded from different streams should " +
+                        "mostly be played differently.")
+
+    def test_copy_continues_stream(self):
+        """
+        Test to make sure a copy of a RandomPlaystyle chooses the same
+        attacks as the original would from then on.
+        """
+        match = Match('n', 'm', 'A', 'r', 'r', 'B', 'r', 3)
+        playstyle = match.p1.playstyle
+        playstyle.rng.random()
+        copy = playstyle.copy(match.battle_queue)
+        self.assertTrue(isinstance(copy, RandomPlaystyle),
+                        "A copy of a RandomPlaystyle should be one.")
+        self.assertEqual([playstyle.rng.random() for _ in range(5)],
+                         [copy.rng.random() for _ in range(5)],
+                         "A copy should go on with the same random stream.")
+
+    def test_copies_of_copies(self):
+        """
+        Test to make sure copies that share a random stream each go on from
+        where it was when they were copied, whichever of them draws first.
+        """
+        original = RandomPlaystyle(None, 5)
+        expected = RandomPlaystyle(None, 5)
+        fresh = original.copy(None)
+        original.rng.random()
+        expected.rng.random()
+        first = original.copy(None)
+        second = first.copy(None)
+        streams = [[playstyle.rng.random() for _ in range(3)]
+                   for playstyle in [second, original, first]]
+        after_one = [expected.rng.random() for _ in range(3)]
+        self.assertEqual([after_one] * 3, streams,
+                         "Every copy should go on from where it was copied.")
+        self.assertEqual(RandomPlaystyle(None, 5).rng.random(),
+                         fresh.rng.random(),
+                         "A copy made before any draw should start over.")
+
+    def test_replay_records_seeds(self):
+        """
+        Test to make sure the seeds recorded in a replay log play the match
+        again.
+        """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'random.a2r')
+        try:
+            record_match(path, 'r', ('v', 'r'), ('m', 'r'), 11)
+            reader = ReplayReader(path)
+            moves = [reader.record(turn)[0] for turn in range(len(reader))]
+            seeds = reader.seeds
+            reader.close()
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+        self.assertEqual((stream_seed(11, 'p1'), stream_seed(11, 'p2')),
+                         seeds, "The replay log should hold both seeds.")
+        match = Match('r', 'v', 'P1', 'r', 'm', 'P2', 'r')
+        match.reseed(*seeds)
+        self.assertEqual(moves, play(match),
+                         "The recorded seeds should play the same match.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,393 @@
+"""
+Binary replay logs of A2 matches.
+
+A replay log starts with a header giving the kind of BattleQueue, both
+characters' classes, names and playstyles, the seeds of any RandomPlaystyles,
+and the packed game state the match started in. After it comes one
+fixed-size record for every attack performed:
+
+    action ('A' or 'S'), who performed it, who acts next (255 once the
+    match is over), both characters' HP and SP after it, the state_hash()
+    of the BattleQueue after it, and its pack(), padded to MAX_PACKED bytes
+
+Characters are numbered as BattleQueue.members() numbers them. Because every
+record has the same size, the record of any turn, and the game state after
+it, is read in O(1) time, and check() scans millions of records a second.
+validate() replays the match and checks every record against the game.
+Names longer than 32 bytes are cut short at the last whole character that
+fits.
+
+Set a2_game.REPLAY to a ReplayWriter, or pass --replay PATH to a2_ui.py or
+a2_ui_nonpygame.py, to record a match, and run this file to read one:
+
+    python a2_replay.py record --p1 m mr --p2 v mi match.a2r
+    python a2_replay.py record --p1 m r --p2 v r --seed 42 random.a2r
+    python a2_replay.py show match.a2r --turn 10
+    python a2_replay.py validate match.a2r
+"""
+from typing import Iterator, List, Tuple, Union
+import argparse
+import mmap
+import struct
+import sys
+import time
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES, CHARACTER_KEYS, PLAYSTYLE_KEYS, \
+    BATTLE_QUEUE_KEYS
+from a2_characters import Sorcerer
+from a2_match import Match
+from a2_playstyle import ManualPlaystyle, RandomPlaystyle
+from a2_skill_decision_tree import create_default_tree
+from a2_transitions import perform_move
+
+MAGIC = b'A2RP'
+VERSION = 3
+
+# The most bytes the packed game state in a record can take. The longest
+# seen in thousands of random matches is 45.
+MAX_PACKED = 96
+
+# The header of a replay log: the magic bytes, the version, the keys of the
+# BattleQueue class, both characters' classes and playstyles, both
+# characters' names, the seeds of both characters' RandomPlaystyles (0 for
+# other playstyles), and the length of the packed starting state that
+# follows it.
+HEADER = struct.Struct('<4sHccc2s2s32s32s2QH')
+
+# One turn of a replay log: the action, who performed it, who acts next,
+# both characters' HP and SP, the state hash, and the length of the packed
+# game state and the state itself, padded to 128 bytes.
+RECORD = struct.Struct('<cBB4iQH{}s3x'.format(MAX_PACKED))
+
+# Who acts next in the record of the turn that ends the match.
+NOBODY = 255
+
+
+def _next_index(battle_queue: 'BattleQueue') -> int:
+    """
+    Return the number of the character who acts next in battle_queue, or
+    NOBODY if its match is over.
+    """
+    if battle_queue.is_over():
+        return NOBODY
+    return battle_queue.members().index(battle_queue.peek())
+
+
+def _encode_name(name: str) -> bytes:
+    """
+    Return name encoded for a header, cut short at the last whole character
+    that fits in 32 bytes.
+
+    >>> len(_encode_name('a' + 'é' * 20)), _encode_name('Sophia')
+    (31, b'Sophia')
+    """
+    return name.encode()[:32].decode(errors='ignore').encode()
+
+
+def make_record(move: str, actor: 'Character',
+                battle_queue: 'BattleQueue') -> bytes:
+    """
+    Return the record of actor, one of the characters in battle_queue,
+    performing move, leaving battle_queue as it is now, raising ValueError
+    if its packed game state is longer than MAX_PACKED bytes.
+
+    >>> from a2_opening_book import build_start
+    >>> from a2_transitions import perform_move
+    >>> bq = build_start('n', 'r', 'm', 30, 20)
+    >>> actor = perform_move(bq, 'A')
+    >>> len(make_record('A', actor, bq)) == RECORD.size
+    True
+    """
+    members = battle_queue.members()
+    stats = []
+    for member in members:
+        stats.extend([member.get_hp(), member.get_sp()])
+    following = _next_index(battle_queue)
+    packed = battle_queue.pack()
+    if len(packed) > MAX_PACKED:
+        raise ValueError("a game state of {} bytes cannot be recorded".format(
+            len(packed)))
+    return RECORD.pack(move.encode(), members.index(actor),
+                       following, *stats, battle_queue.state_hash(),
+                       len(packed), packed)
+
+
+class ReplayWriter:
+    """
+    A writer of the replay log of one match.
+
+    path - The file the replay log is written to.
+    turns - How many turns have been recorded.
+    """
+    path: str
+    turns: int
+
+    def __init__(self, path: str, battle_queue: 'BattleQueue') -> None:
+        """
+        Initialize this ReplayWriter, writing the header of the match in
+        battle_queue, as it is now, to the file at path.
+        """
+        self.path = path
+        self.turns = 0
+        members = battle_queue.members()
+        start = battle_queue.pack()
+        header = HEADER.pack(
+            MAGIC, VERSION, BATTLE_QUEUE_KEYS[type(battle_queue)].encode(),
+            *[CHARACTER_KEYS[type(member)].encode() for member in members],
+            *[PLAYSTYLE_KEYS.get(type(member.playstyle), '').encode()
+              for member in members],
+            *[_encode_name(member.get_name()) for member in members],
+            *[member.playstyle.seed if isinstance(member.playstyle,
+                                                  RandomPlaystyle) else 0
+              for member in members],
+            len(start))
+        self._file = open(path, 'wb')
+        self._file.write(header + start)
+
+    def record(self, move: str, actor: 'Character',
+               battle_queue: 'BattleQueue') -> None:
+        """
+        Record that actor performed move, leaving battle_queue as it is now.
+        """
+        self._file.write(make_record(move, actor, battle_queue))
+        self.turns += 1
+
+    def close(self) -> None:
+        """
+        Write out everything recorded and close the replay log.
+        """
+        self._file.close()
+
+
+class ReplayReader:
+    """
+    A reader of a replay log.
+
+    queue_type - The key of the match's BattleQueue class.
+    classes - The keys of both characters' classes.
+    playstyles - The keys of both characters' playstyles.
+    names - Both characters' names.
+    seeds - The seeds of both characters' RandomPlaystyles, or None for a
+            character with another playstyle.
+    start - The packed game state the match started in.
+    """
+    queue_type: str
+    classes: Tuple[str, str]
+    playstyles: Tuple[str, str]
+    names: Tuple[str, str]
+    seeds: Tuple[Union[int, None], Union[int, None]]
+    start: bytes
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize this ReplayReader on the replay log at path, raising
+        ValueError if it is not one.
+        """
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._data) < HEADER.size:
+            raise ValueError("{} is too short to be a replay log".format(
+                path))
+        magic, version, queue_type, class0, class1, playstyle0, playstyle1, \
+            name0, name1, seed0, seed1, start_length = \
+            HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} replay log".format(
+                path, VERSION))
+        self.queue_type = queue_type.decode()
+        self.classes = (class0.decode(), class1.decode())
+        self.playstyles = (playstyle0.rstrip(b'\0').decode(),
+                           playstyle1.rstrip(b'\0').decode())
+        self.names = (name0.rstrip(b'\0').decode(),
+                      name1.rstrip(b'\0').decode())
+        self.seeds = tuple(seed if playstyle == 'r' else None for
+                           seed, playstyle in zip([seed0, seed1],
+                                                  self.playstyles))
+        self._offset = HEADER.size + start_length
+        self.start = self._data[HEADER.size:self._offset]
+
+    def __len__(self) -> int:
+        """
+        Return the number of turns in this replay log.
+        """
+        return (len(self._data) - self._offset) // RECORD.size
+
+    def record(self, turn: int) -> Tuple[str, int, int, int, int, int, int,
+                                         int]:
+        """
+        Return the record of turn, counting from 0, as the action, who
+        performed it, who acts next, both characters' HP and SP, and the
+        state hash.
+        """
+        return self._record(turn)[:8]
+
+    def _record(self, turn: int) -> tuple:
+        """
+        Return the whole record of turn, counting from 0, with the action
+        decoded.
+        """
+        if not 0 <= turn < len(self):
+            raise IndexError("turn {} is not in this replay".format(turn))
+        record = RECORD.unpack_from(self._data,
+                                    self._offset + turn * RECORD.size)
+        return (record[0].decode(),) + record[1:]
+
+    def records(self) -> Iterator[tuple]:
+        """
+        Yield the whole record of every turn, in order, with the action as
+        bytes.
+        """
+        end = self._offset + len(self) * RECORD.size
+        return RECORD.iter_unpack(memoryview(self._data)[self._offset:end])
+
+    def check(self) -> int:
+        """
+        Check that the records of this replay log are consistent with each
+        other: every action is 'A' or 'S', is performed by who the record
+        before said would act next, and leaves no HP or SP negative. Return
+        the number of turns, or raise ValueError at the first that is not.
+
+        This does not replay the match, so it is fast; validate() does.
+        """
+        expected = _next_index(self.battle_queue(0))
+        turn = -1
+        for turn, (action, actor, following, hp0, sp0, hp1, sp1, _, _, _) \
+                in enumerate(self.records()):
+            if action not in (b'A', b'S') or actor != expected or \
+                    min(hp0, sp0, hp1, sp1) < 0:
+                raise ValueError("turn {} is inconsistent: {}".format(
+                    turn, self.record(turn)))
+            expected = following
+        return turn + 1
+
+    def battle_queue(self, turn: int) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the game state after turn turns of this
+        replay log were played, unpacked from the record of the last of them.
+        """
+        if turn == 0:
+            return self._template().unpack(self.start)
+        if turn > len(self):
+            raise IndexError("turn {} is not in this replay".format(turn))
+        record = self._record(turn - 1)
+        return self._template().unpack(record[9][:record[8]])
+
+    def _template(self) -> 'BattleQueue':
+        """
+        Return a new BattleQueue holding the characters of this replay log,
+        to unpack its game states with.
+        """
+        bq = BATTLE_QUEUE_CLASSES[self.queue_type]()
+        characters = [CHARACTER_CLASSES[kind](name, bq, ManualPlaystyle(bq))
+                      for kind, name in zip(self.classes, self.names)]
+        for character in characters:
+            if isinstance(character, Sorcerer):
+                character.set_skill_decision_tree(create_default_tree())
+        characters[0].enemy = characters[1]
+        characters[1].enemy = characters[0]
+        bq.add(characters[0])
+        bq.add(characters[1])
+        return bq
+
+    def validate(self) -> int:
+        """
+        Replay the match in this replay log and check that every record
+        matches the game. Return the number of turns, or raise ValueError at
+        the first that does not match.
+        """
+        bq = self.battle_queue(0)
+        members = bq.members()
+        turn = -1
+        for turn, record in enumerate(self.records()):
+            actor = bq.peek() if not bq.is_over() else None
+            if actor is None or members.index(actor) != record[1] or \
+                    not actor.is_valid_action(record[0].decode()):
+                raise ValueError("turn {} cannot be played: {}".format(
+                    turn, self.record(turn)))
+            perform_move(bq, record[0].decode())
+            # a2_game checks whether the match is over after every move, and
+            # that cleans up the queue.
+            bq.is_over()
+            if RECORD.unpack(make_record(record[0].decode(), actor, bq)) != \
+                    record:
+                raise ValueError("turn {} does not match the game: {}".format(
+                    turn, self.record(turn)))
+        return turn + 1
+
+    def close(self) -> None:
+        """
+        Close this ReplayReader.
+        """
+        self._data.close()
+
+
+def record_match(path: str, queue_type: str, p1: Tuple[str, str],
+                 p2: Tuple[str, str], seed: Union[int, None] = None) -> int:
+    """
+    Play a match on a BattleQueue of the type queue_type between a p1 and a
+    p2, given as (class, playstyle) keys, recording it to the replay log at
+    path. RandomPlaystyles are seeded from seed, unless it is None. Return
+    the number of turns.
+    """
+    match = Match(queue_type, p1[0], 'P1', p1[1], p2[0], 'P2', p2[1], seed)
+    match.replay = ReplayWriter(path, match.battle_queue)
+    while not match.is_over:
+        if match.perform_attack() not in ('A', 'S'):
+            break
+    match.replay.close()
+    return match.replay.turns
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Record, show, check or validate a replay log with the options in argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help="record a computer match")
+    record.add_argument('--queue', default='n',
+                        choices=sorted(BATTLE_QUEUE_CLASSES))
+    record.add_argument('--p1', nargs=2, default=['m', 'mr'],
+                        metavar=('CLASS', 'PLAYSTYLE'))
+    record.add_argument('--p2', nargs=2, default=['v', 'mr'],
+                        metavar=('CLASS', 'PLAYSTYLE'))
+    record.add_argument('--seed', type=int, default=None,
+                        help="seed the random playstyles with this")
+    show = commands.add_parser('show', help="describe a replay log")
+    show.add_argument('--turn', type=int, default=None,
+                      help="also show this turn and the state after it")
+    check = commands.add_parser('check', help="check a replay log's records")
+    validate = commands.add_parser('validate',
+                                   help="replay a replay log's match")
+    for command in [record, show, check, validate]:
+        command.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        turns = record_match(args.path, args.queue, tuple(args.p1),
+                             tuple(args.p2), args.seed)
+        print("Recorded {} turns to {}".format(turns, args.path))
+        return
+    reader = ReplayReader(args.path)
+    if args.command == 'show':
+        print("{} ({}, {}) vs {} ({}, {}) on queue {}: {} turns".format(
+            reader.names[0], reader.classes[0], reader.playstyles[0],
+            reader.names[1], reader.classes[1], reader.playstyles[1],
+            reader.queue_type, len(reader)))
+        print("Random seeds: {}, {}".format(*reader.seeds))
+        if args.turn is not None:
+            print(reader.record(args.turn))
+            print(reader.battle_queue(args.turn + 1))
+    else:
+        start = time.perf_counter()
+        turns = getattr(reader, args.command)()
+        elapsed = time.perf_counter() - start
+        print("{} turns are valid ({:.0f} records per second)".format(
+            turns, turns / elapsed if elapsed else float('inf')))
+    reader.close()
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    main()
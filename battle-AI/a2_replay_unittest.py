@@ -0,0 +1,165 @@
+"""
+Unittests for A2's replay logs.
+
+These tests record matches played by a2_game and by a Match, and check that
+the replay logs are the same, can be read back turn by turn and replayed,
+cut long names short without splitting characters, and that a replay log
+that was tampered with fails validation.
+"""
+import os
+import tempfile
+import unittest
+
+import a2_game
+from a2_match import Match
+from a2_replay import RECORD, ReplayReader, ReplayWriter
+
+
+SETUPS = [('n', 'm', 'A', 'mr', 'v', 'B', 'mi'),
+          ('r', 's', 'A', 'mi', 'r', 'B', 'mr'),
+          ('n', 'v', 'A', 'mr', 's', 'B', 'mr')]
+
+
+class ReplayUnitTests(unittest.TestCase):
+    def setUp(self):
+        """
+        Make a directory for the replay logs.
+        """
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Remove the replay logs.
+        """
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def record(self, number, setup):
+        """
+        Record the match set up with setup, with both characters at 30 HP and
+        20 SP, with a Match and with a2_game. Return the paths of both replay
+        logs and the state of the match after every turn.
+        """
+        match = Match(*setup)
+        a2_game.set_up_match(*setup)
+        for character in [match.p1, match.p2, a2_game.P1, a2_game.P2]:
+            character.set_hp(30)
+            character.set_sp(20)
+        paths = [os.path.join(self.directory, '{}{}.a2r'.format(kind, number))
+                 for kind in ['match', 'game']]
+        match.replay = ReplayWriter(paths[0], match.battle_queue)
+        a2_game.REPLAY = ReplayWriter(paths[1], a2_game.BATTLE_QUEUE)
+        states = [repr(match.battle_queue)]
+        try:
+            while not match.is_over:
+                match.perform_attack()
+                a2_game.perform_attack()
+                states.append(repr(match.battle_queue))
+        finally:
+            match.replay.close()
+            a2_game.REPLAY.close()
+            a2_game.REPLAY = None
+        return paths, states
+
+    def test_replays_match_games(self):
+        """
+        Test to make sure a Match and a2_game record the same replay log,
+        which replays the match turn by turn.
+        """
+        for number, setup in enumerate(SETUPS):
+            paths, states = self.record(number, setup)
+            with open(paths[0], 'rb') as f, open(paths[1], 'rb') as g:
+                self.assertEqual(f.read(), g.read(),
+                                 "A Match and a2_game should record the " +
+                                 "same replay log.")
+            reader = ReplayReader(paths[0])
+            self.assertEqual((len(states) - 1,) * 3,
+                             (len(reader), reader.check(), reader.validate()),
+                             "The replay log should have every turn.")
+            self.assertEqual((setup[1], setup[4]), reader.classes,
+                             "The replay log should know the classes.")
+            for turn in range(len(reader) + 1):
+                self.assertEqual(states[turn],
+                                 repr(reader.battle_queue(turn)),
+                                 ("The replay log should be in the state " +
+                                  "{} after {} turns.").format(states[turn],
+                                                               turn))
+            last = reader.record(len(reader) - 1)
+            self.assertEqual(255, last[2],
+                             "Nobody should act after the last turn.")
+            reader.close()
+
+    def test_long_names_are_cut_short(self):
+        """
+        Test to make sure a name too long for a replay log is cut short
+        without splitting a character, and the replay log still validates.
+        """
+        path = os.path.join(self.directory, 'names.a2r')
+        match = Match('n', 'm', 'a' + 'é' * 20, 'mr', 'r', 'B', 'mr')
+        for character in [match.p1, match.p2]:
+            character.set_hp(20)
+            character.set_sp(20)
+        match.replay = ReplayWriter(path, match.battle_queue)
+        while not match.is_over:
+            match.perform_attack()
+        match.replay.close()
+        reader = ReplayReader(path)
+        self.assertEqual('a' + 'é' * 15, reader.names[0],
+                         "The name should be cut short at a character.")
+        self.assertEqual(len(reader), reader.validate(),
+                         "The replay log should still validate.")
+        reader.close()
+
+    def test_players_with_the_same_name(self):
+        """
+        Test to make sure each turn of a match between two characters with
+        the same name records the character who acted.
+        """
+        path = os.path.join(self.directory, 'same.a2r')
+        match = Match('n', 'm', 'A', 'm', 'r', 'A', 'm')
+        match.replay = ReplayWriter(path, match.battle_queue)
+        actors = []
+        while not match.is_over:
+            actors.append(match.battle_queue.members().index(
+                match.battle_queue.peek()))
+            match.perform_attack('S' if len(actors) % 3 else 'A')
+        match.replay.close()
+        reader = ReplayReader(path)
+        self.assertEqual(actors,
+                         [reader.record(turn)[1]
+                          for turn in range(len(reader))],
+                         "The replay log should record who acted.")
+        self.assertEqual(len(reader), reader.validate(),
+                         "The replay log should validate.")
+        reader.close()
+
+    def test_tampered_replays_fail(self):
+        """
+        Test to make sure a replay log whose records were changed fails
+        validation, and fails checking if they are inconsistent.
+        """
+        paths, _ = self.record(0, SETUPS[0])
+        reader = ReplayReader(paths[0])
+        offset = reader._offset
+        reader.close()
+        with open(paths[0], 'rb') as f:
+            data = bytearray(f.read())
+        hp = offset + RECORD.size + 3
+        data[hp] = (data[hp] + 1) % 100
+        action = offset + 2 * RECORD.size
+        with open(paths[1], 'wb') as f:
+            f.write(bytes(data[:action]) + b'X' + bytes(data[action + 1:]))
+        with open(paths[0], 'wb') as f:
+            f.write(data)
+        reader = ReplayReader(paths[0])
+        reader.check()
+        self.assertRaises(ValueError, reader.validate)
+        reader.close()
+        reader = ReplayReader(paths[1])
+        self.assertRaises(ValueError, reader.check)
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,387 @@
+"""
+A search service for A2 that many matches can share.
+
+Matches played side by side often ask for moves in the same positions. A
+SearchService answers select_attack requests sent over a Unix socket and
+keeps the answers in a shared LRU cache. Requests for a position that is
+already being searched wait for that search instead of starting another, and
+positions that miss the cache are gathered into batches, each split across a
+pool of worker processes.
+
+A request is one line of text:
+
+    <playstyle> <queue type><class of character 0><class of character 1> <hex>
+
+where the playstyle, queue type and classes are keys of PLAYSTYLE_CLASSES,
+BATTLE_QUEUE_CLASSES and CHARACTER_CLASSES, the characters are numbered as
+BattleQueue.members() numbers them, and <hex> is the pack() of the normalized
+BattleQueue. encode_request() makes one. The answer is a line holding the
+attack, or "E" and a message if the request is malformed or its search
+failed. The line "stats" is answered with the service's counters.
+
+Run this file to start the service, and use SearchServicePlaystyle to play
+with it:
+
+    python a2_search_service.py --unix /tmp/a2_search.sock --workers 8
+
+Requests are answered for Sorcerers using create_default_tree() only.
+"""
+from typing import Dict, List, Tuple, Union
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import os
+import socket
+import sys
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES, BATTLE_QUEUE_KEYS, CHARACTER_KEYS
+from a2_opening_book import build_start
+from a2_playstyle import Playstyle, SearchStats
+
+# Where the service listens unless told otherwise.
+DEFAULT_SOCKET = '/tmp/a2_search.sock'
+
+# The keys of the Playstyles whose attacks are searched for and cached; the
+# manual and random Playstyles are left out.
+SEARCHED_PLAYSTYLES = sorted(set(PLAYSTYLE_CLASSES) - {'m', 'r'})
+
+# The BattleQueue whose characters unpack each request, by the request's
+# queue type and classes.
+_TEMPLATES = {}
+
+
+def encode_request(playstyle: str, battle_queue: 'BattleQueue') -> bytes:
+    """
+    Return the request for the attack PLAYSTYLE_CLASSES[playstyle] chooses
+    in battle_queue, without the newline that ends it.
+
+    >>> encode_request('mr', build_start('r', 'v', 's', 3, 2)).split()[:2]
+    [b'mr', b'rvs']
+    """
+    bq = battle_queue.copy()
+    bq.normalize()
+    kinds = BATTLE_QUEUE_KEYS[type(bq)] + ''.join(
+        CHARACTER_KEYS[type(member)] for member in bq.members())
+    return "{} {} {}".format(playstyle, kinds, bq.pack().hex()).encode()
+
+
+def decode_request(request: bytes) -> Tuple[str, str, bytes]:
+    """
+    Return the playstyle, the queue type and classes, and the packed
+    BattleQueue of request, raising ValueError if it is malformed.
+
+    >>> decode_request(b'mi nmr 00ff')
+    ('mi', 'nmr', b'\\x00\\xff')
+    >>> decode_request(b'mi nxr 00')
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown classes 'nxr'
+    """
+    playstyle, kinds, data = request.decode().split()
+    if playstyle not in SEARCHED_PLAYSTYLES:
+        raise ValueError("unknown playstyle {!r}".format(playstyle))
+    if len(kinds) != 3 or kinds[0] not in BATTLE_QUEUE_CLASSES or \
+            any(kind not in CHARACTER_CLASSES for kind in kinds[1:]):
+        raise ValueError("unknown classes {!r}".format(kinds))
+    return playstyle, kinds, bytes.fromhex(data)
+
+
+def search(request: bytes) -> str:
+    """
+    Return the attack asked for by request.
+
+    >>> search(encode_request('mr', build_start('n', 'r', 'm', 30, 20)))
+    'A'
+    """
+    playstyle, kinds, data = decode_request(request)
+    if kinds not in _TEMPLATES:
+        _TEMPLATES[kinds] = build_start(kinds[0], kinds[1], kinds[2], 1, 1)
+    battle_queue = _TEMPLATES[kinds].unpack(data)
+    return PLAYSTYLE_CLASSES[playstyle](battle_queue).select_attack()
+
+
+def search_batch(requests: List[bytes]) -> List[str]:
+    """
+    Return the answer to each of requests: the attack asked for, or "E" and
+    a message if searching for it failed.
+
+    >>> search_batch([b'mr nmr 00ff', encode_request(
+    ...     'mr', build_start('n', 'r', 'm', 30, 20))])[1]
+    'A'
+    """
+    answers = []
+    for request in requests:
+        try:
+            answers.append(search(request))
+        except Exception as error:
+            answers.append('E {}: {}'.format(type(error).__name__, error))
+    return answers
+
+
+class SearchService:
+    """
+    A cache of answers to requests, which coalesces and batches the searches
+    for the requests that miss it.
+
+    cache_size - How many answers the cache holds.
+    batch_size - The most requests searched in one batch.
+    workers - How many jobs each batch is split into.
+    batch_delay - How many seconds a request waits for others to batch with.
+    hits - How many requests were answered from the cache.
+    misses - How many requests were searched.
+    coalesced - How many requests waited for the search of an equal request.
+    batches - How many batches were searched.
+    """
+    cache_size: int
+    batch_size: int
+    workers: int
+    batch_delay: float
+    hits: int
+    misses: int
+    coalesced: int
+    batches: int
+
+    def __init__(self, executor: concurrent.futures.Executor,
+                 cache_size: int = 1 << 20, batch_size: int = 32,
+                 batch_delay: float = 0.002, workers: int = None) -> None:
+        """
+        Initialize this SearchService with an empty cache, searching in
+        executor, which has workers workers, or one per CPU if workers is
+        None.
+        """
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_delay = batch_delay
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+        self._executor = executor
+        self._cache = collections.OrderedDict()
+        self._pending = {}
+        self._waiting = []
+        self._timer = None
+        self._searches = set()
+
+    def __len__(self) -> int:
+        """
+        Return the number of answers in this SearchService's cache.
+        """
+        return len(self._cache)
+
+    async def select_attack(self, request: bytes) -> str:
+        """
+        Return the answer to request, which must be well formed: the attack
+        asked for, or "E" and a message if searching for it failed.
+        """
+        if request in self._cache:
+            self._cache.move_to_end(request)
+            self.hits += 1
+            return self._cache[request]
+        if request in self._pending:
+            self.coalesced += 1
+            return await asyncio.shield(self._pending[request])
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        self._pending[request] = loop.create_future()
+        self._waiting.append(request)
+        if len(self._waiting) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_delay, self._flush)
+        return await asyncio.shield(self._pending[request])
+
+    def _flush(self) -> None:
+        """
+        Start searching every request waiting for a batch.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        if batch:
+            task = asyncio.ensure_future(self._search(batch))
+            self._searches.add(task)
+            task.add_done_callback(self._searches.discard)
+
+    async def _search(self, batch: List[bytes]) -> None:
+        """
+        Search every request in batch, split into one job for each worker.
+        """
+        self.batches += 1
+        size = -(-len(batch) // self.workers)
+        await asyncio.gather(*[self._search_job(batch[start:start + size])
+                               for start in range(0, len(batch), size)])
+
+    async def _search_job(self, requests: List[bytes]) -> None:
+        """
+        Search every one of requests in one job, and cache and hand out the
+        answers. Errors are handed out but not cached.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            answers = await loop.run_in_executor(self._executor,
+                                                 search_batch, requests)
+        except Exception as error:
+            answers = ['E {}: {}'.format(type(error).__name__, error)] * \
+                len(requests)
+        for request, answer in zip(requests, answers):
+            if not answer.startswith('E'):
+                self._cache[request] = answer
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            self._pending.pop(request).set_result(answer)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the counters of this SearchService.
+
+        >>> SearchService(None).stats()
+        {'size': 0, 'hits': 0, 'misses': 0, 'coalesced': 0, 'batches': 0}
+        """
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'batches': self.batches}
+
+    async def serve_client(self, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the requests sent by one client, in order, until it
+        disconnects.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = line.strip()
+                if request == b'stats':
+                    answer = ' '.join('{}={}'.format(key, value) for
+                                      key, value in self.stats().items())
+                else:
+                    try:
+                        decode_request(request)
+                    except (UnicodeDecodeError, ValueError) as error:
+                        answer = 'E {}'.format(error)
+                    else:
+                        answer = await self.select_attack(request)
+                writer.write(answer.encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, path: str) -> asyncio.AbstractServer:
+        """
+        Start serving clients on the Unix socket at path, and return the
+        asyncio server.
+        """
+        return await asyncio.start_unix_server(self.serve_client, path)
+
+
+class SearchServicePlaystyle(Playstyle):
+    """
+    A Playstyle that asks a SearchService for its attacks.
+
+    path - The Unix socket the SearchService listens on.
+    playstyle - The key in PLAYSTYLE_CLASSES of the Playstyle whose attacks
+                the SearchService is asked for.
+    """
+    path: str
+    playstyle: str
+
+    def __init__(self, battle_queue: 'BattleQueue',
+                 path: str = DEFAULT_SOCKET, playstyle: str = 'mr') -> None:
+        """
+        Initialize this SearchServicePlaystyle with battle_queue as its
+        battle queue. It connects to the SearchService when first asked for
+        an attack.
+        """
+        super().__init__(battle_queue)
+        self.is_manual = False
+        self.path = path
+        self.playstyle = playstyle
+        self._connection = None
+        self._answers = None
+
+    def _select_attack(self, parameter: Union[None, str],
+                       stats: Union[SearchStats, None]) -> str:
+        """
+        Return the attack the SearchService chooses for the next character
+        in this Playstyle's battle_queue, raising ValueError if the
+        SearchService rejects the request and ConnectionError if it closes
+        the connection without answering.
+        """
+        if self._connection is None:
+            self._connection = socket.socket(socket.AF_UNIX,
+                                             socket.SOCK_STREAM)
+            self._connection.connect(self.path)
+            self._answers = self._connection.makefile('rb')
+        self._connection.sendall(
+            encode_request(self.playstyle, self.battle_queue) + b'\n')
+        answer = self._answers.readline().decode().strip()
+        if not answer:
+            self.close()
+            raise ConnectionError("the search service closed the connection")
+        if answer.startswith('E'):
+            raise ValueError("the search service rejected the request: " +
+                             answer[2:])
+        return answer
+
+    def close(self) -> None:
+        """
+        Close this SearchServicePlaystyle's connection, if it has one.
+        """
+        if self._connection is not None:
+            self._answers.close()
+            self._connection.close()
+            self._connection = None
+
+    def copy(self, new_battle_queue: 'BattleQueue'
+             ) -> 'SearchServicePlaystyle':
+        """
+        Return a copy of this SearchServicePlaystyle which uses the
+        BattleQueue new_battle_queue and asks the same SearchService.
+        """
+        return SearchServicePlaystyle(new_battle_queue, self.path,
+                                      self.playstyle)
+
+
+async def serve(service: SearchService, path: str) -> None:
+    """
+    Run service on the Unix socket at path forever.
+    """
+    listener = await service.start(path)
+    print("Serving searches on {}".format(path))
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Run a SearchService with the options in argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--unix', metavar='PATH', default=DEFAULT_SOCKET)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="how many worker processes to search in")
+    parser.add_argument('--cache-size', type=int, default=1 << 20,
+                        help="how many answers to cache")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batch-delay', type=float, default=0.002,
+                        help="seconds to wait for requests to batch")
+    args = parser.parse_args(argv)
+
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+        service = SearchService(executor, args.cache_size, args.batch_size,
+                                args.batch_delay, args.workers)
+        try:
+            asyncio.run(serve(service, args.unix))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    main()
@@ -0,0 +1,183 @@
+"""
+Unittests for A2's search service.
+
+These tests check that a SearchService answers requests with the attacks a
+search would choose, searches each position once however many requests ask
+for it, forgets the least recently used answers first, answers a request
+whose search fails with an error without failing the others, and that a
+SearchServicePlaystyle plays the same games as the Playstyle it asks for and
+notices when the service hangs up.
+"""
+import asyncio
+import concurrent.futures
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from a2_game import PLAYSTYLE_CLASSES
+from a2_search_service import SearchService, SearchServicePlaystyle, \
+    encode_request
+from a2_opening_book import play
+from a2_test_support import make_queue, make_start, pairings
+
+
+def opening_requests(number):
+    """
+    Return the requests for the first number positions of a match between a
+    Rogue and a Mage, found breadth first.
+    """
+    requests, level = [], [make_start('n', 'r', 'm', 30, 20)]
+    while len(requests) < number:
+        requests.extend(encode_request('mr', bq) for bq in level)
+        level = [play(bq, action) for bq in level
+                 for action in bq.peek().get_available_actions()]
+    return requests[:number]
+
+
+class SearchServiceUnitTests(unittest.TestCase):
+    def test_coalesces_and_caches(self):
+        """
+        Test to make sure equal requests made at the same time are searched
+        once, and later ones are answered from the cache.
+        """
+        async def ask(service, requests):
+            return await asyncio.gather(*[service.select_attack(request)
+                                          for request in requests])
+
+        requests = opening_requests(5)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            service = SearchService(executor, batch_size=4)
+            first = asyncio.run(ask(service, requests * 3))
+            self.assertEqual((5, 10, 0), (service.misses, service.coalesced,
+                                          service.hits),
+                             ("5 requests asked 3 times each should be " +
+                              "searched once each, not:\n{}").format(
+                                  service.stats()))
+            self.assertEqual(2, service.batches,
+                             "5 requests should be searched in 2 batches.")
+            second = asyncio.run(ask(service, requests))
+            self.assertEqual(5, service.hits,
+                             "Requests asked again should hit the cache.")
+        self.assertEqual(first, second * 3,
+                         "Equal requests should get equal answers.")
+
+    def test_least_recently_used_are_forgotten(self):
+        """
+        Test to make sure the cache holds at most cache_size answers and
+        forgets the least recently used one first.
+        """
+        async def ask(service, requests):
+            for request in requests:
+                await service.select_attack(request)
+
+        first, second, third = opening_requests(3)
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            service = SearchService(executor, cache_size=2, batch_size=1)
+            asyncio.run(ask(service, [first, second, first, third, first]))
+            self.assertEqual((3, 2, 2), (service.misses, service.hits,
+                                         len(service)),
+                             ("Only the third request should have pushed " +
+                              "an answer out, not:\n{}").format(
+                                  service.stats()))
+            asyncio.run(ask(service, [second, first]))
+            self.assertEqual((4, 3), (service.misses, service.hits),
+                             ("The second request should have been " +
+                              "forgotten and the first kept, not:\n{}"
+                              ).format(service.stats()))
+
+    def test_bad_request_in_batch(self):
+        """
+        Test to make sure a request whose search fails is answered with an
+        error, and does not stop the requests batched with it from being
+        answered.
+        """
+        async def ask(service, requests):
+            return await asyncio.gather(*[service.select_attack(request)
+                                          for request in requests])
+
+        good = opening_requests(3)
+        bad = b'mr nmr 00ff'
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            service = SearchService(executor, batch_size=4, workers=2)
+            answers = asyncio.run(ask(service, good + [bad]))
+            self.assertTrue(answers[-1].startswith('E '),
+                            ("A request that cannot be unpacked should be " +
+                             "answered with an error, not {!r}.").format(
+                                 answers[-1]))
+            self.assertEqual(answers[:-1], asyncio.run(ask(service, good)),
+                             "The other requests should be answered.")
+            self.assertEqual(3, len(service),
+                             "Only the good answers should be cached.")
+
+    def test_playstyle_closed_connection(self):
+        """
+        Test to make sure a SearchServicePlaystyle raises ConnectionError if
+        the search service closes the connection without answering.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'search.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+
+        def hang_up():
+            connection, _ = listener.accept()
+            connection.recv(1024)
+            connection.close()
+
+        thread = threading.Thread(target=hang_up)
+        thread.start()
+        try:
+            playstyle = SearchServicePlaystyle(
+                make_start('n', 'r', 'm', 30, 20), path)
+            with self.assertRaises(ConnectionError):
+                playstyle.select_attack()
+        finally:
+            thread.join()
+            listener.close()
+            os.remove(path)
+
+    def test_playstyle_matches_search(self):
+        """
+        Test to make sure a SearchServicePlaystyle chooses the attacks the
+        Playstyle it asks for would.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'search.sock')
+        loop = asyncio.new_event_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(2)
+        service = SearchService(executor)
+        listener = loop.run_until_complete(service.start(path))
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            for key in ['mr', 'mi']:
+                for queue_class, p1_class, p2_class in pairings():
+                    bq = make_queue(queue_class, p1_class, p2_class,
+                                    (30, 20, 30, 20))
+                    playstyle = SearchServicePlaystyle(bq, path, key)
+                    while not bq.is_over():
+                        expected = PLAYSTYLE_CLASSES[key](
+                            bq).select_attack()
+                        move = playstyle.select_attack()
+                        self.assertEqual(
+                            expected, move,
+                            ("The search service chose {} instead " +
+                             "of {} in:\n{}").format(move, expected,
+                                                     bq))
+                        if not bq.peek().is_valid_action(move):
+                            break
+                        bq = play(bq, move)
+                        playstyle.battle_queue = bq
+                    playstyle.close()
+        finally:
+            loop.call_soon_threadsafe(listener.close)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            executor.shutdown()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
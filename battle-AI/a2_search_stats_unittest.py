@@ -0,0 +1,91 @@
+"""
+Unittests for the search statistics collected by Playstyles for A2.
+"""
+import unittest
+
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES
+from a2_playstyle import ManualPlaystyle, SearchStats
+from a2_battle_queue import BattleQueue
+MageConstructor = CHARACTER_CLASSES['m']
+RogueConstructor = CHARACTER_CLASSES['r']
+
+
+class SearchStatsUnitTests(unittest.TestCase):
+    def setUp(self):
+        """
+        Sets up a Battle Queue containing a Mage and a Rogue a few moves away
+        from the end of the game.
+        """
+        self.battle_queue = BattleQueue()
+        playstyle = ManualPlaystyle(self.battle_queue)
+
+        self.p1 = RogueConstructor("R", self.battle_queue, playstyle)
+        self.p2 = MageConstructor("M", self.battle_queue, playstyle)
+
+        self.p1.enemy = self.p2
+        self.p2.enemy = self.p1
+
+        self.battle_queue.add(self.p1)
+        self.battle_queue.add(self.p2)
+
+        self.p1.set_hp(40)
+        self.p1.set_sp(6)
+        self.p2.set_hp(14)
+        self.p2.set_sp(35)
+
+    def tearDown(self):
+        """
+        Delete the attributes that were created in setUp.
+        """
+        del self.battle_queue
+        del self.p1
+        del self.p2
+
+    def test_disabled_by_default(self):
+        """
+        Test to make sure no statistics are collected unless asked for.
+        """
+        for key in ['r', 'mr', 'mi']:
+            playstyle = PLAYSTYLE_CLASSES[key](self.battle_queue)
+            playstyle.select_attack()
+            self.assertIsNone(playstyle.stats,
+                              ("A {} should not collect statistics unless " +
+                               "enable_stats is called.").format(
+                                   type(playstyle).__name__))
+
+    def test_minimax_counts_nodes(self):
+        """
+        Test to make sure both minimax playstyles record their search.
+        """
+        for key in ['mr', 'mi']:
+            playstyle = PLAYSTYLE_CLASSES[key](self.battle_queue)
+            playstyle.enable_stats()
+            playstyle.select_attack()
+            stats = playstyle.stats
+            self.assertTrue(stats.nodes > 0 and stats.copies > 0 and
+                            stats.max_depth > 0,
+                            ("A {} should record nodes, copies and depth " +
+                             "but got {} instead.").format(
+                                 type(playstyle).__name__, stats))
+
+    def test_callback(self):
+        """
+        Test to make sure the callback is given every call's statistics.
+        """
+        calls = []
+        playstyle = PLAYSTYLE_CLASSES['mr'](self.battle_queue)
+        playstyle.enable_stats(lambda p, attack, stats:
+                               calls.append((p, attack, stats)))
+        attack = playstyle.select_attack()
+        self.assertEqual([(playstyle, attack, playstyle.stats)], calls,
+                         "The callback should be called once per call.")
+        self.assertIsInstance(calls[0][2], SearchStats)
+
+        playstyle.disable_stats()
+        playstyle.select_attack()
+        self.assertEqual(1, len(calls),
+                         "The callback should not be called once disabled.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -0,0 +1,275 @@
+"""
+A server that hosts many independent matches of A2 at once.
+
+Clients connect over TCP or a Unix socket and send requests as JSON objects,
+one per line. The server answers every request with one line of JSON, which
+repeats the request's "id" if it has one, so a client may send many requests
+without waiting for each answer. The requests are:
+
+    {"op": "new", "queue": "n", "p1": ["m", "Alice", "m"],
+     "p2": ["v", "Bob", "mr"]}
+    {"op": "move", "match": 1, "action": "A"}
+    {"op": "state", "match": 1}
+    {"op": "snapshot", "match": 1}
+    {"op": "close", "match": 1}
+
+where "p1" and "p2" give the class, name and playstyle of each character,
+and a "new" request may give a "seed" for the characters' RandomPlaystyles.
+A "snapshot" request is answered with an a2_snapshot snapshot of the match
+in hex, and a "new" request may give one as "snapshot", instead of "p1" and
+"p2", to go on with that match.
+After a new match is set up and after every move, the server plays the moves
+of computer playstyles until the match is over or a manual player is to act,
+and answers with the match's id, its state and the moves it played, as
+[name, action] pairs. A request that cannot be carried out, or whose search
+fails, is answered with {"error": message}, and the traceback of a failure
+that is not the request's fault is printed to stderr.
+
+Moves of computer playstyles are searched in an executor, so the event loop
+keeps serving every other match while a search runs. With --processes the
+searches run in worker processes on copies of the match, so they do not
+share the interpreter lock, but Playstyles forget what they learned from one
+search to the next.
+
+Run this file to start a server:
+
+    python a2_server.py --port 8765
+    python a2_server.py --unix /tmp/a2.sock --processes --workers 8
+"""
+from typing import Any, Dict, List, Union
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import sys
+import traceback
+
+from a2_match import Match
+from a2_snapshot import load_match, save_match
+from a2_playstyle import RandomPlaystyle
+
+
+def choose_move(battle_queue: 'BattleQueue') -> str:
+    """
+    Return the attack the next character in battle_queue chooses with their
+    Playstyle.
+    """
+    return battle_queue.peek().playstyle.select_attack()
+
+
+class MatchServer:
+    """
+    A server for many matches, played through requests.
+
+    matches - The matches being played, by id.
+    executor - The executor computer moves are searched in.
+    """
+    matches: Dict[int, Match]
+    executor: concurrent.futures.Executor
+
+    def __init__(self, executor: concurrent.futures.Executor) -> None:
+        """
+        Initialize this MatchServer with no matches, searching computer moves
+        in executor.
+        """
+        self.matches = {}
+        self.executor = executor
+        self._locks = {}
+        self._next_id = 1
+        self._clients = set()
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Carry out request and return the answer to it.
+        """
+        try:
+            answer = await self._dispatch(request)
+        except (KeyError, TypeError, ValueError) as error:
+            answer = {'error': "bad request: {!r}".format(error)}
+        except Exception as error:
+            traceback.print_exc()
+            answer = {'error': "{}: {}".format(type(error).__name__, error)}
+        if isinstance(request, dict) and 'id' in request:
+            answer['id'] = request['id']
+        return answer
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Carry out request and return the answer to it, raising KeyError,
+        TypeError or ValueError if request is malformed.
+        """
+        op = request['op']
+        if op == 'new' and 'snapshot' in request:
+            match = load_match(bytes.fromhex(request['snapshot']))
+        elif op == 'new':
+            p1_type, p1_name, p1_playstyle = request['p1']
+            p2_type, p2_name, p2_playstyle = request['p2']
+            match = Match(request.get('queue', 'n'), p1_type, p1_name,
+                          p1_playstyle, p2_type, p2_name, p2_playstyle,
+                          request.get('seed'))
+        if op == 'new':
+            match_id = self._next_id
+            self._next_id += 1
+            self.matches[match_id] = match
+            self._locks[match_id] = asyncio.Lock()
+            async with self._locks[match_id]:
+                moves = await self._play_computer_moves(match)
+                return self._answer(match_id, moves)
+        match_id = request['match']
+        if match_id not in self.matches:
+            return {'error': "no match {}".format(match_id)}
+        match = self.matches[match_id]
+        async with self._locks[match_id]:
+            if match_id not in self.matches:
+                return {'error': "match {} was closed".format(match_id)}
+            if op == 'state':
+                return self._answer(match_id, [])
+            if op == 'snapshot':
+                return {'match': match_id,
+                        'snapshot': save_match(match).hex()}
+            if op == 'close':
+                del self.matches[match_id]
+                del self._locks[match_id]
+                return {'match': match_id, 'closed': True}
+            if op != 'move':
+                return {'error': "unknown op {!r}".format(op)}
+            if match.is_over or not match.next_is_manual():
+                return {'error': "it is not a manual player's turn"}
+            name = match.battle_queue.peek().get_name()
+            if not match.perform(request['action']):
+                return {'error': "{} cannot perform {!r}".format(
+                    name, request['action'])}
+            moves = [[name, request['action']]]
+            moves.extend(await self._play_computer_moves(match))
+            return self._answer(match_id, moves)
+
+    async def _play_computer_moves(self, match: Match) -> List[List[str]]:
+        """
+        Play the moves of computer playstyles in match until it is over or a
+        manual player is to act, and return them as [name, action] pairs.
+        """
+        loop = asyncio.get_running_loop()
+        moves = []
+        while not match.is_over and not match.battle_queue.is_over() and \
+                not match.next_is_manual():
+            name = match.battle_queue.peek().get_name()
+            if isinstance(match.battle_queue.peek().playstyle,
+                          RandomPlaystyle):
+                # Keep the random stream in this process, so a worker
+                # process does not draw from a copy of it.
+                move = choose_move(match.battle_queue)
+            else:
+                move = await loop.run_in_executor(
+                    self.executor, choose_move, match.battle_queue)
+            moves.append([name, move])
+            if not match.perform(move):
+                break
+        return moves
+
+    def _answer(self, match_id: int, moves: List[List[str]]
+                ) -> Dict[str, Any]:
+        """
+        Return the answer giving the state of the match with id match_id
+        after moves were played.
+        """
+        return {'match': match_id, 'state': self.matches[match_id].state(),
+                'moves': moves}
+
+    async def serve_client(self, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the requests sent by one client until it disconnects.
+        """
+        self._clients.add(asyncio.current_task())
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._serve_line(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+            self._clients.discard(asyncio.current_task())
+
+    async def wait_for_clients(self) -> None:
+        """
+        Wait until every client connected to this MatchServer has
+        disconnected and had its requests answered.
+        """
+        if self._clients:
+            await asyncio.wait(list(self._clients))
+
+    async def _serve_line(self, line: bytes,
+                          writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the request in line and write the answer to writer.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            answer = {'error': "bad JSON: {}".format(error)}
+        else:
+            answer = await self.handle(request)
+        writer.write(json.dumps(answer).encode() + b'\n')
+        await writer.drain()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0,
+                    path: Union[str, None] = None) -> asyncio.AbstractServer:
+        """
+        Start serving clients on the Unix socket at path, or on host and port
+        if path is None, and return the asyncio server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.serve_client, path)
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+async def serve(server: MatchServer, host: str, port: int,
+                path: Union[str, None]) -> None:
+    """
+    Run server on the Unix socket at path, or on host and port, forever.
+    """
+    listener = await server.start(host, port, path)
+    for sock in listener.sockets:
+        print("Serving matches on {}".format(sock.getsockname()))
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Serve matches with the options in argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH',
+                        help="serve on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="how many searches to run at once")
+    parser.add_argument('--processes', action='store_true',
+                        help="search in worker processes, not threads")
+    args = parser.parse_args(argv)
+
+    if args.processes:
+        executor = concurrent.futures.ProcessPoolExecutor(args.workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(args.workers)
+    with executor:
+        try:
+            asyncio.run(serve(MatchServer(executor), args.host, args.port,
+                              args.unix))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    main()
@@ -0,0 +1,206 @@
+"""
+Unittests for A2's Match and MatchServer.
+
+These tests check that a Match plays a game the way a2_game does, and that a
+MatchServer plays many matches at once over a socket, answering each request
+about the right match.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import unittest
+
+import a2_game
+from a2_match import Match
+from a2_server import MatchServer
+
+
+async def request(reader, writer, message):
+    """
+    Send message as a line of JSON with writer and return the answer read
+    with reader.
+    """
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def play_manual_match(port, number):
+    """
+    Play a match against a RandomPlaystyle on the MatchServer at port,
+    always attacking, and return the answers to every request.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    answers = [await request(reader, writer, {
+        'op': 'new', 'queue': 'nr'[number % 2], 'id': number,
+        'p1': ['m', 'Human{}'.format(number), 'm'],
+        'p2': ['r', 'Bot{}'.format(number), 'r']})]
+    match_id = answers[0]['match']
+    while not answers[-1]['state']['is_over']:
+        answers.append(await request(reader, writer, {
+            'op': 'move', 'match': match_id, 'id': number,
+            'action': answers[-1]['state']['actions'][0]}))
+    answers.append(await request(reader, writer,
+                                 {'op': 'close', 'match': match_id}))
+    writer.close()
+    await writer.wait_closed()
+    return answers
+
+
+class MatchUnitTests(unittest.TestCase):
+    def test_match_plays_like_game(self):
+        """
+        Test to make sure a Match makes the same moves and ends in the same
+        state as a game played by a2_game.
+        """
+        for setup in [('n', 'm', 'A', 'mr', 'v', 'B', 'mi'),
+                      ('r', 's', 'A', 'mi', 'r', 'B', 'mr')]:
+            match = Match(*setup)
+            a2_game.set_up_match(*setup)
+            for character in [match.p1, match.p2, a2_game.P1, a2_game.P2]:
+                character.set_hp(30)
+                character.set_sp(20)
+            while not a2_game.GAME_IS_OVER:
+                a2_game.perform_attack()
+                match.perform_attack()
+                self.assertEqual(repr(a2_game.BATTLE_QUEUE),
+                                 repr(match.battle_queue),
+                                 ("A Match should be in the same state as " +
+                                  "a2_game, but it is in:\n{}").format(
+                                      match.battle_queue))
+            self.assertTrue(match.is_over, "The Match should be over.")
+            self.assertEqual(a2_game.GAME_WINNER.get_name() if
+                             a2_game.GAME_WINNER else None,
+                             match.state()['winner'],
+                             "The Match should have the same winner.")
+
+    def test_game_plays_its_match(self):
+        """
+        Test to make sure a2_game plays its match with a Match, which
+        ponders for a computer playstyle while the manual player decides.
+        """
+        a2_game.set_up_match('n', 'm', 'A', 'm', 'r', 'B', 'mr')
+        self.assertEqual((a2_game.BATTLE_QUEUE, a2_game.P1, a2_game.P2),
+                         (a2_game.MATCH.battle_queue, a2_game.MATCH.p1,
+                          a2_game.MATCH.p2),
+                         "a2_game should show the state of its Match.")
+        a2_game.PONDER = True
+        a2_game.LAST_KEY_PRESSED = 'A'
+        try:
+            a2_game.perform_attack()
+            a2_game.perform_attack()
+        finally:
+            a2_game.PONDER = False
+            a2_game.LAST_KEY_PRESSED = None
+        playstyle = a2_game.P2.playstyle
+        self.assertIsNotNone(playstyle._ponderer,
+                             "The computer should ponder after its move.")
+        playstyle.disable_pondering()
+        self.assertEqual('A', a2_game.BATTLE_QUEUE.peek().get_name(),
+                         "The manual player should be next, in:\n{}".format(
+                             a2_game.BATTLE_QUEUE))
+        self.assertEqual((a2_game.MATCH.is_over, a2_game.MATCH.winner),
+                         (a2_game.GAME_IS_OVER, a2_game.GAME_WINNER),
+                         "a2_game should show the outcome of its Match.")
+
+
+class MatchServerUnitTests(unittest.TestCase):
+    def run_with_server(self, client):
+        """
+        Start a MatchServer on a free port, run client(server, port) and
+        return what it returns.
+        """
+        async def run():
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                server = MatchServer(executor)
+                listener = await server.start()
+                port = listener.sockets[0].getsockname()[1]
+                try:
+                    return await client(server, port)
+                finally:
+                    await server.wait_for_clients()
+                    listener.close()
+                    await listener.wait_closed()
+        return asyncio.run(run())
+
+    def test_concurrent_matches(self):
+        """
+        Test to make sure many matches can be played at once, and every
+        answer is about the match it was asked about.
+        """
+        async def client(server, port):
+            results = await asyncio.gather(*[play_manual_match(port, number)
+                                             for number in range(20)])
+            return results, len(server.matches)
+
+        results, remaining = self.run_with_server(client)
+        for number, answers in enumerate(results):
+            names = {'Human{}'.format(number), 'Bot{}'.format(number)}
+            for answer in answers[:-1]:
+                self.assertEqual(number, answer['id'],
+                                 "An answer should repeat its request's id.")
+                self.assertTrue({player['name'] for player in
+                                 answer['state']['players']} == names and
+                                all(name in names for name, _ in
+                                    answer['moves']),
+                                ("An answer about match {} was about " +
+                                 "another match:\n{}").format(number, answer))
+            self.assertEqual({'match': answers[0]['match'], 'closed': True},
+                             answers[-1], "The match should be closed.")
+        self.assertEqual(0, remaining, "Every match should have been closed.")
+
+    def test_computer_match_and_errors(self):
+        """
+        Test to make sure a match between computers is played to the end
+        when it is set up, and bad requests are answered with errors.
+        """
+        async def client(server, port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            answers = [await request(reader, writer, message) for message in [
+                {'op': 'new', 'p1': ['v', 'A', 'r'], 'p2': ['s', 'B', 'r']},
+                {'op': 'move', 'match': 1, 'action': 'A'},
+                {'op': 'state', 'match': 2},
+                {'op': 'new', 'p1': ['x', 'A', 'r'], 'p2': ['s', 'B', 'r']},
+                {'op': 'new', 'snapshot': '41325345'},
+                {'op': 'fly', 'match': 1}]]
+            writer.write(b'not json\n')
+            answers.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+            return answers
+
+        answers = self.run_with_server(client)
+        self.assertTrue(answers[0]['state']['is_over'],
+                        "A match between computers should be played out.")
+        self.assertTrue(len(answers[0]['moves']) > 0,
+                        "The moves of the match should be in the answer.")
+        for answer in answers[1:]:
+            self.assertEqual(['error'], list(answer),
+                             ("A bad request should be answered with an " +
+                              "error, not:\n{}").format(answer))
+
+    def test_failed_searches_are_answered(self):
+        """
+        Test to make sure a request whose search fails is answered with an
+        error, repeating its id, and the failure is printed.
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        executor.shutdown()
+        server = MatchServer(executor)
+        log = io.StringIO()
+        with contextlib.redirect_stderr(log):
+            answer = asyncio.run(server.handle(
+                {'op': 'new', 'id': 7, 'p1': ['v', 'A', 'mr'],
+                 'p2': ['s', 'B', 'mr']}))
+        self.assertEqual(['error', 'id'], sorted(answer),
+                         "A failed search should be answered with an " +
+                         "error, not:\n{}".format(answer))
+        self.assertEqual(7, answer['id'], "The answer should repeat the id.")
+        self.assertIn('RuntimeError', log.getvalue(),
+                      "The failure should be printed.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -331,19 +331,8 @@ class SorcererSpecial(Skill):
         >>> m.get_hp()
         83
         """
-        from a2_battle_queue import RestrictedBattleQueue
         self._deal_damage(caster, target)
-        if type(caster.battle_queue) == RestrictedBattleQueue:
-            caster.battle_queue.empty_queue()
-            caster.battle_queue.add(caster)
-            caster.battle_queue.add(target)
-            caster.battle_queue.add(caster)
-        else:
-            while not caster.battle_queue.is_empty():    
-                caster.battle_queue.remove()
-            caster.battle_queue.add(caster)
-            caster.battle_queue.add(target)
-            caster.battle_queue.add(caster)
+        caster.battle_queue.reset_to([caster, target, caster])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,383 @@
+"""
+Snapshots of whole A2 matches.
+
+A snapshot holds everything needed to go on with a match: the kind of
+BattleQueue and its packed game state, and for both characters their class,
+name, playstyle, the seed of a RandomPlaystyle and where its random stream
+is, the sprite they are drawn with, and a Sorcerer's skill decision tree. It
+is a few hundred bytes, and 2.5 KB more for each RandomPlaystyle that has
+chosen attacks, and loads without replaying any moves, so benchmarks and
+workers can start from snapshots of the positions they need.
+
+    data = save_match(match)
+    match = load_match(data)
+
+A loaded RandomPlaystyle goes on with its random stream from where it was
+saved, so the loaded match makes the same moves as the saved one. The
+skills and conditions of a skill decision tree are saved by name, and only
+the skills of a2_skills and the conditions of a2_skill_decision_tree, those
+in SKILLS and CONDITIONS, can be saved and loaded, so loading a snapshot
+never runs code it names.
+"""
+from typing import Callable, List, Tuple
+import argparse
+import struct
+import sys
+
+import a2_skill_decision_tree
+import a2_skills
+from a2_game import CHARACTER_CLASSES, PLAYSTYLE_CLASSES, \
+    BATTLE_QUEUE_CLASSES, CHARACTER_KEYS, PLAYSTYLE_KEYS, \
+    BATTLE_QUEUE_KEYS
+from a2_match import Match, match_from_queue
+from a2_playstyle import RandomPlaystyle
+from a2_skill_decision_tree import SkillDecisionTree
+
+MAGIC = b'A2SN'
+VERSION = 2
+
+# The header of a snapshot: the magic bytes, the version, the key of the
+# BattleQueue class and the length of its packed game state, which follows.
+HEADER = struct.Struct('<4sHcH')
+
+# A character in a snapshot: the keys of its class and playstyle, its
+# animation and the frame of it, the seed of a RandomPlaystyle (0 for other
+# playstyles), whether the state of its random stream and a skill decision
+# tree follow, and the length of its name, which follows.
+CHARACTER = struct.Struct('<c2sBBQ??B')
+
+# The state of a RandomPlaystyle's random stream, once it has been used, as
+# given by RandomPlaystyle.stream_state().
+STREAM = struct.Struct('<625I')
+
+# A node of a skill decision tree, in preorder: its priority, the number of
+# its skill and its condition in the tables that follow the nodes, and how
+# many children it has.
+NODE = struct.Struct('<iBBB')
+COUNT = struct.Struct('<H')
+
+# The most levels a skill decision tree in a snapshot can have. The trees are
+# searched recursively, so deeper ones are neither saved nor loaded.
+MAX_TREE_DEPTH = 100
+
+# The animations a character can be in.
+SPRITE_STATES = ['idle', 'attack', 'special']
+
+# The skills a skill decision tree can use, by the name they are saved under.
+SKILLS = {name: value for name, value in vars(a2_skills).items()
+          if isinstance(value, type) and issubclass(value, a2_skills.Skill)}
+
+# The conditions of a skill decision tree, by the name they are saved under:
+# the public functions of a2_skill_decision_tree other than
+# create_default_tree().
+CONDITIONS = {'a2_skill_decision_tree:' + name: value
+              for name, value in vars(a2_skill_decision_tree).items()
+              if callable(value) and not isinstance(value, type) and
+              getattr(value, '__module__', None) == 'a2_skill_decision_tree'
+              and not name.startswith('_') and name != 'create_default_tree'}
+
+
+def _condition_name(condition: Callable) -> str:
+    """
+    Return the name condition is saved under, raising ValueError if it is
+    not one of CONDITIONS.
+
+    >>> from a2_skill_decision_tree import caster_hp_more_than_50
+    >>> _condition_name(caster_hp_more_than_50)
+    'a2_skill_decision_tree:caster_hp_more_than_50'
+    >>> _condition_name(len)
+    Traceback (most recent call last):
+    ...
+    ValueError: builtins:len cannot be saved
+    """
+    name = "{}:{}".format(condition.__module__, condition.__qualname__)
+    if CONDITIONS.get(name) is not condition:
+        raise ValueError("{} cannot be saved".format(name))
+    return name
+
+
+def _load_named(table: dict, name: str) -> object:
+    """
+    Return the skill or condition saved under name in table, raising
+    ValueError if there is none.
+    """
+    if name not in table:
+        raise ValueError("unknown skill or condition {!r}".format(name))
+    return table[name]
+
+
+def _save_tree(tree: SkillDecisionTree) -> bytes:
+    """
+    Return tree saved as bytes, raising ValueError if it cannot be saved.
+    """
+    nodes, skills, conditions = [], [], []
+    stack = [(tree, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_TREE_DEPTH:
+            raise ValueError("a tree deeper than {} cannot be saved".format(
+                MAX_TREE_DEPTH))
+        skill = type(node.value).__name__
+        if SKILLS.get(skill) is not type(node.value):
+            raise ValueError("a {} cannot be saved".format(skill))
+        condition = _condition_name(node.condition)
+        if skill not in skills:
+            skills.append(skill)
+        if condition not in conditions:
+            conditions.append(condition)
+        nodes.append(NODE.pack(node.priority, skills.index(skill),
+                               conditions.index(condition),
+                               len(node.children)))
+        stack.extend((child, depth + 1) for child in reversed(node.children))
+    data = [COUNT.pack(len(nodes))] + nodes
+    for table in [skills, conditions]:
+        data.append(COUNT.pack(len(table)))
+        for name in table:
+            data.append(_save_string(name))
+    return b''.join(data)
+
+
+def _load_tree(data: bytes, offset: int) -> Tuple[SkillDecisionTree, int]:
+    """
+    Return the skill decision tree saved in data at offset, and where the
+    rest of data starts, raising ValueError if it is deeper than
+    MAX_TREE_DEPTH.
+    """
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    nodes = [NODE.unpack_from(data, offset + i * NODE.size)
+             for i in range(count)]
+    offset += count * NODE.size
+    tables = []
+    for _ in range(2):
+        (length,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        table = []
+        for _ in range(length):
+            name, offset = _load_string(data, offset)
+            table.append(name)
+        tables.append(table)
+    skills = [_load_named(SKILLS, name) for name in tables[0]]
+    conditions = [_load_named(CONDITIONS, name) for name in tables[1]]
+
+    # The nodes whose children are still being read, from the root down,
+    # with the subtrees of their children read so far.
+    stack = []
+    for node in nodes:
+        stack.append((node, []))
+        if len(stack) > MAX_TREE_DEPTH:
+            raise ValueError("a tree deeper than {} cannot be loaded".format(
+                MAX_TREE_DEPTH))
+        while len(stack[-1][1]) == stack[-1][0][3]:
+            (priority, skill, condition, _), subtrees = stack.pop()
+            subtree = SkillDecisionTree(skills[skill](), conditions[condition],
+                                        priority, subtrees)
+            if not stack:
+                return subtree, offset
+            stack[-1][1].append(subtree)
+    raise IndexError("skill decision tree ends after {} nodes".format(count))
+
+
+def _save_string(text: str) -> bytes:
+    """
+    Return text saved as bytes.
+    """
+    data = text.encode()
+    return COUNT.pack(len(data)) + data
+
+
+def _load_string(data: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Return the string saved in data at offset, and where the rest of data
+    starts.
+    """
+    (length,) = COUNT.unpack_from(data, offset)
+    text, offset = _read(data, offset + COUNT.size, length)
+    return text.decode(), offset
+
+
+def _read(data: bytes, offset: int, length: int) -> Tuple[bytes, int]:
+    """
+    Return the length bytes in data at offset, and where the rest of data
+    starts, raising IndexError if data ends first.
+    """
+    if offset + length > len(data):
+        raise IndexError("snapshot ends at {}, not {}".format(
+            len(data), offset + length))
+    return data[offset:offset + length], offset + length
+
+
+def save_queue(battle_queue: 'BattleQueue') -> bytes:
+    """
+    Return a snapshot of the match being played in battle_queue, raising
+    ValueError if a character's playstyle or skill decision tree cannot be
+    saved.
+
+    >>> from a2_opening_book import build_start
+    >>> len(save_queue(build_start('r', 's', 'v', 100, 100)))
+    470
+    """
+    packed = battle_queue.pack()
+    data = [HEADER.pack(MAGIC, VERSION,
+                        BATTLE_QUEUE_KEYS[type(battle_queue)].encode(),
+                        len(packed)), packed]
+    for member in battle_queue.members():
+        playstyle = type(member.playstyle)
+        if playstyle not in PLAYSTYLE_KEYS:
+            raise ValueError("a {} cannot be saved".format(
+                playstyle.__name__))
+        state, frame = member.get_sprite_state()
+        tree = getattr(member, 'skill_decision_tree', None)
+        name = member.get_name().encode()
+        stream = member.playstyle.stream_state() \
+            if playstyle is RandomPlaystyle else None
+        data.append(CHARACTER.pack(
+            CHARACTER_KEYS[type(member)].encode(),
+            PLAYSTYLE_KEYS[playstyle].encode(), SPRITE_STATES.index(state),
+            frame, member.playstyle.seed if playstyle is RandomPlaystyle
+            else 0, stream is not None, tree is not None, len(name)))
+        data.append(name)
+        if stream is not None:
+            data.append(STREAM.pack(*stream))
+        if tree is not None:
+            data.append(_save_tree(tree))
+    return b''.join(data)
+
+
+def load_queue(data: bytes) -> 'BattleQueue':
+    """
+    Return a new BattleQueue playing the match in the snapshot data, raising
+    ValueError if data is not a snapshot or is cut short.
+
+    >>> from a2_opening_book import build_start, play
+    >>> bq = play(build_start('r', 's', 'v', 100, 100), 'S')
+    >>> bq
+    P2 (Vampire): 78/100 -> P1 (Sorcerer): 100/80
+    >>> load_queue(save_queue(bq))
+    P2 (Vampire): 78/100 -> P1 (Sorcerer): 100/80
+    >>> load_queue(bytes.fromhex('41325345'))  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: malformed snapshot: unpack_from requires a buffer of ...
+    """
+    try:
+        return _load_queue(data)
+    except (struct.error, IndexError, KeyError, UnicodeDecodeError) as error:
+        raise ValueError("malformed snapshot: {}".format(error)) from error
+
+
+def _load_queue(data: bytes) -> 'BattleQueue':
+    """
+    Return a new BattleQueue playing the match in the snapshot data, raising
+    ValueError if data is not a snapshot, and struct.error, IndexError,
+    KeyError or UnicodeDecodeError if it is malformed.
+    """
+    magic, version, queue_type, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version {} snapshot".format(VERSION))
+    packed, offset = _read(data, HEADER.size, length)
+    template = BATTLE_QUEUE_CLASSES[queue_type.decode()]()
+    characters, sprites = [], []
+    for _ in range(2):
+        kind, playstyle, state, frame, seed, has_stream, has_tree, \
+            name_length = CHARACTER.unpack_from(data, offset)
+        offset += CHARACTER.size
+        name, offset = _read(data, offset, name_length)
+        name = name.decode()
+        playstyle = PLAYSTYLE_CLASSES[playstyle.rstrip(b'\0').decode()]
+        if has_stream and playstyle is not RandomPlaystyle:
+            raise ValueError("a {} has no random stream".format(
+                playstyle.__name__))
+        if playstyle is RandomPlaystyle:
+            playstyle = RandomPlaystyle(template, seed)
+            if has_stream:
+                stream, offset = _read(data, offset, STREAM.size)
+                playstyle.set_stream_state(STREAM.unpack(stream))
+        else:
+            playstyle = playstyle(template)
+        character = CHARACTER_CLASSES[kind.decode()](name, template,
+                                                     playstyle)
+        if has_tree:
+            tree, offset = _load_tree(data, offset)
+            character.set_skill_decision_tree(tree)
+        characters.append(character)
+        sprites.append((SPRITE_STATES[state], frame))
+    if offset != len(data):
+        raise ValueError("{} bytes follow the snapshot".format(
+            len(data) - offset))
+    characters[0].enemy = characters[1]
+    characters[1].enemy = characters[0]
+    template.add(characters[0])
+    template.add(characters[1])
+    battle_queue = template.unpack(packed)
+    for member, (state, frame) in zip(battle_queue.members(), sprites):
+        member.set_sprite_state(state, frame)
+    return battle_queue
+
+
+def save_match(match: Match) -> bytes:
+    """
+    Return a snapshot of match.
+    """
+    return save_queue(match.battle_queue)
+
+
+def load_match(data: bytes) -> Match:
+    """
+    Return a new Match going on from the snapshot data.
+
+    >>> match = Match('n', 'v', 'A', 'r', 's', 'B', 'mr', 7)
+    >>> match.perform('A')
+    True
+    >>> loaded = load_match(save_match(match))
+    >>> loaded.p2.playstyle.__class__.__name__, loaded.p1.get_sprite_state()
+    ('RecursiveMinimax', ('attack', 0))
+    """
+    return match_from_queue(load_queue(data))
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Save a snapshot of a new match, or describe a saved one, with the
+    options in argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    save = commands.add_parser('save', help="save a snapshot of a new match")
+    save.add_argument('--queue', default='n',
+                      choices=sorted(BATTLE_QUEUE_CLASSES))
+    save.add_argument('--p1', nargs=2, default=['m', 'mr'],
+                      metavar=('CLASS', 'PLAYSTYLE'))
+    save.add_argument('--p2', nargs=2, default=['v', 'mr'],
+                      metavar=('CLASS', 'PLAYSTYLE'))
+    save.add_argument('--stats', nargs=4, type=int, default=None,
+                      metavar=('P1_HP', 'P1_SP', 'P2_HP', 'P2_SP'))
+    show = commands.add_parser('show', help="describe a snapshot")
+    for command in [save, show]:
+        command.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'save':
+        match = Match(args.queue, args.p1[0], 'P1', args.p1[1], args.p2[0],
+                      'P2', args.p2[1])
+        if args.stats:
+            match.p1.set_hp(args.stats[0])
+            match.p1.set_sp(args.stats[1])
+            match.p2.set_hp(args.stats[2])
+            match.p2.set_sp(args.stats[3])
+        with open(args.path, 'wb') as f:
+            f.write(save_match(match))
+        print("Saved {!r} to {}".format(match.battle_queue, args.path))
+    else:
+        with open(args.path, 'rb') as f:
+            match = load_match(f.read())
+        for character in [match.p1, match.p2]:
+            print("{!r} playing {}, drawn {}".format(
+                character, type(character.playstyle).__name__,
+                "_".join(str(part) for part in
+                         character.get_sprite_state())))
+        print(match.battle_queue)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Unittests for A2's match snapshots.
+
+These tests save snapshots of matches between every pairing of classes in
+both kinds of BattleQueue, and check that the loaded matches are in the same
+state, are drawn the same way and go on the same way as the saved ones, and
+that malformed snapshots are rejected with ValueError.
+"""
+import unittest
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES
+from a2_match import Match
+from a2_playstyle import RandomPlaystyle
+from a2_skill_decision_tree import SkillDecisionTree, caster_hp_more_than_50
+from a2_snapshot import COUNT, MAX_TREE_DEPTH, NODE, _save_string, \
+    _save_tree, load_match, load_queue, save_match, save_queue
+
+
+def describe(match):
+    """
+    Return what a snapshot of match should keep.
+    """
+    return (repr(match.battle_queue), match.battle_queue.state_hash(),
+            [(type(character.playstyle), character.get_sprite_state())
+             for character in [match.p1, match.p2]],
+            match.is_over, match.state()['winner'])
+
+
+class SnapshotUnitTests(unittest.TestCase):
+    def test_snapshots_keep_matches(self):
+        """
+        Test to make sure a loaded snapshot is of the same match as the saved
+        one, at the start and halfway through it, and goes on the same way.
+        """
+        for queue_type in BATTLE_QUEUE_CLASSES:
+            for p1_type in CHARACTER_CLASSES:
+                for p2_type in CHARACTER_CLASSES:
+                    match = Match(queue_type, p1_type, 'A', 'mr', p2_type,
+                                  'B', 'mi')
+                    for character in [match.p1, match.p2]:
+                        character.set_hp(30)
+                        character.set_sp(20)
+                    for turns in [0, 3]:
+                        for _ in range(turns):
+                            match.perform_attack()
+                        loaded = load_match(save_match(match))
+                        self.assertEqual(describe(match), describe(loaded),
+                                         ("The snapshot of\n{}\nshould " +
+                                          "load the same match.").format(
+                                              match.battle_queue))
+                    moves = []
+                    while not match.is_over:
+                        moves.append((match.perform_attack(),
+                                      loaded.perform_attack()))
+                        self.assertEqual(repr(match.battle_queue),
+                                         repr(loaded.battle_queue),
+                                         ("The loaded match should go on " +
+                                          "like the saved one after {}."
+                                          ).format(moves))
+                    self.assertTrue(loaded.is_over,
+                                    "The loaded match should be over.")
+
+    def test_random_playstyles_restart(self):
+        """
+        Test to make sure a loaded RandomPlaystyle restarts from its seed.
+        """
+        match = Match('n', 'r', 'A', 'r', 'm', 'B', 'r', 11)
+        loaded = load_match(save_match(match))
+        for character, other in [(match.p1, loaded.p1),
+                                 (match.p2, loaded.p2)]:
+            self.assertIsInstance(other.playstyle, RandomPlaystyle,
+                                  "A RandomPlaystyle should be loaded.")
+            self.assertEqual(character.playstyle.seed, other.playstyle.seed,
+                             "A RandomPlaystyle should keep its seed.")
+        while not match.is_over:
+            self.assertEqual(match.perform_attack(), loaded.perform_attack(),
+                             "Both matches should make the same moves.")
+
+    def test_random_playstyles_go_on(self):
+        """
+        Test to make sure a RandomPlaystyle loaded halfway through a match
+        goes on with its random stream from where it was saved.
+        """
+        for turns in [1, 4, 9]:
+            match = Match('n', 'r', 'A', 'r', 'm', 'B', 'r', 11)
+            for _ in range(turns):
+                match.perform_attack()
+            loaded = load_match(save_match(match))
+            moves = []
+            while not match.is_over:
+                moves.append((match.perform_attack(), loaded.perform_attack()))
+                self.assertEqual(moves[-1][0], moves[-1][1],
+                                 ("The loaded match should make the same " +
+                                  "moves after {} turns, not {}.").format(
+                                      turns, moves))
+
+    def test_skill_decision_trees_are_kept(self):
+        """
+        Test to make sure a Sorcerer's skill decision tree is saved, and that
+        one whose conditions cannot be saved raises ValueError.
+        """
+        match = Match('r', 's', 'A', 'mr', 's', 'B', 'mr')
+        trees = [match.p1.skill_decision_tree, match.p2.skill_decision_tree]
+        for hp in range(10, 101, 30):
+            for sp in range(0, 101, 25):
+                for character in [match.p1, match.p2]:
+                    character.set_hp(hp)
+                    character.set_sp(sp)
+                loaded = load_queue(save_queue(match.battle_queue))
+                for tree, member in zip(trees, loaded.members()):
+                    self.assertEqual(
+                        type(tree.pick_skill(member, member.enemy)),
+                        type(member.skill_decision_tree.pick_skill(
+                            member, member.enemy)),
+                        "The loaded tree should pick the same skill.")
+        match.p1.set_skill_decision_tree(SkillDecisionTree(
+            type(trees[0].value)(), lambda caster, target: True, 1))
+        self.assertRaises(ValueError, save_match, match)
+
+    def test_malformed_snapshots(self):
+        """
+        Test to make sure loading a snapshot that is cut short, corrupted or
+        names a function other than a condition raises ValueError.
+        """
+        data = save_match(Match('r', 's', 'A', 'mr', 'v', 'B', 'r', 3))
+        for length in range(len(data)):
+            self.assertRaises(ValueError, load_queue, data[:length])
+        for index in range(len(data)):
+            corrupted = bytearray(data)
+            corrupted[index] ^= 0xff
+            try:
+                load_queue(bytes(corrupted))
+            except ValueError:
+                pass
+        name = _save_string('a2_skill_decision_tree:caster_hp_more_than_50')
+        self.assertIn(name, data, "The snapshot should name its conditions.")
+        for other in ['os:getcwd', 'a2_skill_decision_tree:' +
+                      'create_default_tree']:
+            self.assertRaises(ValueError, load_queue,
+                              data.replace(name, _save_string(other)))
+
+    def test_deep_trees(self):
+        """
+        Test to make sure a skill decision tree deeper than MAX_TREE_DEPTH
+        is neither saved nor loaded, and raises ValueError.
+        """
+        match = Match('r', 's', 'A', 'mr', 'v', 'B', 'mr')
+        skill = type(match.p1.skill_decision_tree.value)
+        leaf = SkillDecisionTree(skill(), caster_hp_more_than_50, 1)
+        match.p1.set_skill_decision_tree(leaf)
+        saved = _save_tree(leaf)
+        data = save_match(match)
+        tables = saved[COUNT.size + NODE.size:]
+        for depth in [MAX_TREE_DEPTH, MAX_TREE_DEPTH + 1, 5000]:
+            chain = (COUNT.pack(depth) + NODE.pack(1, 0, 0, 1) * (depth - 1) +
+                     NODE.pack(1, 0, 0, 0) + tables)
+            deep = data.replace(saved, chain)
+            if depth <= MAX_TREE_DEPTH:
+                tree = load_queue(deep).members()[0].skill_decision_tree
+                self.assertEqual(chain, _save_tree(tree),
+                                 "A tree {} deep should be kept.".format(
+                                     depth))
+            else:
+                self.assertRaises(ValueError, load_queue, deep)
+        tree = leaf
+        for _ in range(MAX_TREE_DEPTH):
+            tree = SkillDecisionTree(skill(), caster_hp_more_than_50, 1,
+                                     [tree])
+        match.p1.set_skill_decision_tree(tree)
+        self.assertRaises(ValueError, save_match, match)
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
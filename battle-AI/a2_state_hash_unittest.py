@@ -0,0 +1,101 @@
+"""
+Unittests for A2's incremental state hashes.
+
+These tests check that BattleQueue.state_hash(), which is kept up to date
+as characters are added, removed and hurt, is the same as a hash computed
+from scratch from the game state, after random sequences of moves on both
+kinds of BattleQueue.
+"""
+import random
+import unittest
+
+from a2_battle_queue import RestrictedBattleQueue
+from a2_game import CHARACTER_CLASSES
+from a2_hashing import ABLE_TO_ADD, ADDITION_COUNTER, CHARACTER_TYPE, \
+    FIRST_PLAYER, FIRST_PLAYER_SLOT, QUEUE_ENTRY, SECOND_PLAYER, \
+    RollingHash, mix, stats_hash, string_key, zobrist_key
+from a2_queue_stores import ListStore, PersistentStore, RunLengthStore
+from a2_test_support import make_start
+from a2_transitions import perform_move
+
+STORES = [ListStore, PersistentStore, RunLengthStore]
+
+
+def scratch_hash(bq):
+    """
+    Return the state hash of bq, computed from scratch from who is in it,
+    the players' types, HP and SP, and, for a RestrictedBattleQueue, who can
+    add.
+    """
+    members = bq.members()
+    contents = RollingHash()
+    for index in bq._queue:
+        contents.push(zobrist_key(QUEUE_ENTRY, index))
+    value = contents.value
+    p1 = bq._p1
+    if p1 is not None:
+        value ^= zobrist_key(FIRST_PLAYER_SLOT, members.index(p1))
+        for kind, player in [(FIRST_PLAYER, p1), (SECOND_PLAYER, p1.enemy)]:
+            value ^= zobrist_key(kind, stats_hash(player.get_hp(),
+                                                  player.get_sp()) ^
+                                 string_key(CHARACTER_TYPE,
+                                            player.get_character_type()))
+    value = mix(value)
+    if not isinstance(bq, RestrictedBattleQueue):
+        return value
+    able = RollingHash()
+    for entry in bq.able_to_add_list:
+        able.push(string_key(ABLE_TO_ADD, entry))
+    counter = 0
+    for i, (_, added) in enumerate(bq.first_time_addition_counter):
+        counter |= (added + 2) << (2 * i)
+    return mix(value ^ zobrist_key(ABLE_TO_ADD, able.value) ^
+               zobrist_key(ADDITION_COUNTER, counter))
+
+
+def random_moves(bq, rng):
+    """
+    Play random valid moves on bq the way a2_game performs them, sometimes
+    going on with a copy of bq, until it is over, yielding the BattleQueue
+    after each move.
+    """
+    while not bq.is_over():
+        perform_move(bq, rng.choice(bq.peek().get_available_actions()))
+        if rng.random() < 0.3:
+            bq = bq.copy()
+        yield bq
+
+
+class StateHashUnitTests(unittest.TestCase):
+    def test_matches_scratch_hash(self):
+        """
+        Test to make sure state_hash() matches a hash computed from scratch
+        after every move of random matches, for every pairing, kind of
+        BattleQueue and store.
+        """
+        rng = random.Random(2018)
+        for queue_type in ['n', 'r']:
+            for store in STORES:
+                for p1_type in CHARACTER_CLASSES:
+                    for p2_type in CHARACTER_CLASSES:
+                        for _ in range(3):
+                            bq = make_start(queue_type, p1_type, p2_type,
+                                            rng.randrange(20, 101),
+                                            rng.randrange(0, 101))
+                            self._check_match(bq.copy(store), rng)
+
+    def _check_match(self, bq, rng):
+        """
+        Check state_hash() against scratch_hash() after every move of a
+        random match played on bq.
+        """
+        self.assertEqual(scratch_hash(bq), bq.state_hash(),
+                         "The hash of {!r} is wrong.".format(bq))
+        for moved in random_moves(bq, rng):
+            self.assertEqual(scratch_hash(moved), moved.state_hash(),
+                             ("The hash of {!r} is wrong after a " +
+                              "move.").format(moved))
+
+
+if __name__ == '__main__':
+    unittest.main(exit = False)
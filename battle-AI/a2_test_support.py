@@ -0,0 +1,75 @@
+"""
+Shared fixtures for A2's unittests.
+
+The unittests build their games with these instead of importing them from
+each other or from the modules they test, so a test module only depends on
+the code it tests.
+"""
+from typing import List, Tuple
+
+from a2_game import CHARACTER_CLASSES, BATTLE_QUEUE_CLASSES
+from a2_characters import Sorcerer
+from a2_playstyle import ManualPlaystyle
+from a2_skill_decision_tree import create_default_tree
+
+
+def make_queue(queue_class: type, p1_class: type, p2_class: type,
+               stats: Tuple[int, int, int, int]) -> 'BattleQueue':
+    """
+    Return a queue_class containing a p1_class called P1 and a p2_class
+    called P2, in that order, whose HP and SP are given by stats as (P1 HP,
+    P1 SP, P2 HP, P2 SP). Both use a ManualPlaystyle, and Sorcerers use
+    create_default_tree().
+
+    >>> from a2_battle_queue import RestrictedBattleQueue
+    >>> from a2_characters import Vampire
+    >>> make_queue(RestrictedBattleQueue, Vampire, Sorcerer, (40, 6, 14, 35))
+    P1 (Vampire): 40/6 -> P2 (Sorcerer): 14/35
+    """
+    bq = queue_class()
+    p1 = p1_class("P1", bq, ManualPlaystyle(bq))
+    p2 = p2_class("P2", bq, ManualPlaystyle(bq))
+    for character in [p1, p2]:
+        if isinstance(character, Sorcerer):
+            character.set_skill_decision_tree(create_default_tree())
+    p1.enemy = p2
+    p2.enemy = p1
+    bq.add(p1)
+    bq.add(p2)
+    p1.set_hp(stats[0])
+    p1.set_sp(stats[1])
+    p2.set_hp(stats[2])
+    p2.set_sp(stats[3])
+    return bq
+
+
+def make_start(queue_type: str, p1_type: str, p2_type: str, hp: int,
+               sp: int) -> 'BattleQueue':
+    """
+    Return make_queue() of the classes whose keys in BATTLE_QUEUE_CLASSES and
+    CHARACTER_CLASSES are queue_type, p1_type and p2_type, where both
+    characters have hp HP and sp SP.
+
+    >>> make_start('n', 'r', 'm', 30, 20)
+    P1 (Rogue): 30/20 -> P2 (Mage): 30/20
+    """
+    return make_queue(BATTLE_QUEUE_CLASSES[queue_type],
+                      CHARACTER_CLASSES[p1_type], CHARACTER_CLASSES[p2_type],
+                      (hp, sp, hp, sp))
+
+
+def pairings() -> List[Tuple[type, type, type]]:
+    """
+    Return (queue_class, p1_class, p2_class) for every kind of BattleQueue
+    and every pairing of character classes, in the order of
+    BATTLE_QUEUE_CLASSES and CHARACTER_CLASSES.
+
+    >>> len(pairings())
+    32
+    >>> [cls.__name__ for cls in pairings()[1]]
+    ['BattleQueue', 'Mage', 'Rogue']
+    """
+    return [(queue_class, p1_class, p2_class)
+            for queue_class in BATTLE_QUEUE_CLASSES.values()
+            for p1_class in CHARACTER_CLASSES.values()
+            for p2_class in CHARACTER_CLASSES.values()]
@@ -0,0 +1,256 @@
+"""
+A precomputed transition table for A2.
+
+Every skill's effect is a deterministic function of the caster's class, the
+target's class, and their HP and SP. Rather than calling Skill.use on live
+characters, search code can look the effect up in TRANSITIONS and apply it
+with apply_transition. perform_move makes a move the way a2_game does, and
+is used by everything that plays a move, a2_game included.
+
+The table is generated once, at import, by using every skill on probe
+characters and recording what changed, so it always agrees with a2_skills.
+
+Looking an effect up is not measurably faster than using the skill: both
+take a few microseconds next to the copy of the BattleQueue every search
+step makes, and the searches run no faster with the table. What it does
+give search code is a way to apply a move without changing sprites.
+"""
+from typing import Dict, Tuple
+
+from a2_battle_queue import BattleQueue
+from a2_characters import Mage, Rogue, Vampire, Sorcerer
+from a2_skills import SorcererAttack
+
+CHARACTER_CLASSES = [Mage, Rogue, Vampire, Sorcerer]
+ACTIONS = ['A', 'S']
+
+# Large enough that no probe reaches 0 HP or runs out of SP.
+PROBE_STAT = 1000
+
+
+class Transition:
+    """
+    The effect of a skill used by a caster on a target of a given class.
+
+    sp_cost - the SP that the caster spends.
+    damage - the HP that the target loses (the target's HP stops at 0).
+    lifesteal - whether the caster gains the HP that the target lost.
+    additions - who is added to the BattleQueue afterwards, in order.
+                'C' stands for the caster and 'T' for the target.
+    resets_queue - whether the BattleQueue is emptied before the additions.
+    delegates - whether the caster's SkillDecisionTree picks another skill to
+                use instead. Only sp_cost is meaningful if so.
+    """
+    sp_cost: int
+    damage: int
+    lifesteal: bool
+    additions: Tuple[str, ...]
+    resets_queue: bool
+    delegates: bool
+
+    def __init__(self, sp_cost: int, damage: int, lifesteal: bool,
+                 additions: Tuple[str, ...], resets_queue: bool,
+                 delegates: bool = False) -> None:
+        """
+        Initialize this Transition.
+
+        >>> t = Transition(5, 12, False, ('C',), False)
+        >>> t
+        Transition(sp=-5, hp=-12, queue=+C)
+        """
+        self.sp_cost = sp_cost
+        self.damage = damage
+        self.lifesteal = lifesteal
+        self.additions = additions
+        self.resets_queue = resets_queue
+        self.delegates = delegates
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of this Transition.
+
+        >>> TRANSITIONS[('vampire', 'mage', 'S')]
+        Transition(sp=-20, hp=-22, lifesteal, queue=+CCT)
+        >>> TRANSITIONS[('sorcerer', 'rogue', 'S')]
+        Transition(sp=-20, hp=-15, queue=reset CTC)
+        >>> TRANSITIONS[('sorcerer', 'rogue', 'A')]
+        Transition(sp=-15, delegates)
+        """
+        if self.delegates:
+            return "Transition(sp=-{}, delegates)".format(self.sp_cost)
+        parts = ["sp=-{}".format(self.sp_cost), "hp=-{}".format(self.damage)]
+        if self.lifesteal:
+            parts.append("lifesteal")
+        parts.append("queue={}{}".format(
+            "reset " if self.resets_queue else "+", "".join(self.additions)))
+        return "Transition({})".format(", ".join(parts))
+
+
+def probe_skill(skill: 'Skill', target_class: type) -> Transition:
+    """
+    Return the Transition recorded by having a probe character use skill on
+    a character of class target_class.
+
+    >>> from a2_skills import MageSpecial
+    >>> probe_skill(MageSpecial(), Rogue)
+    Transition(sp=-30, hp=-30, queue=+TC)
+    """
+    bq = BattleQueue()
+    caster = Mage("caster", bq, None)
+    target = target_class("target", bq, None)
+    caster.enemy = target
+    target.enemy = caster
+    for character in [caster, target]:
+        character.set_hp(PROBE_STAT)
+        character.set_sp(PROBE_STAT)
+    # The target is queued twice so that a reset can be told apart from
+    # additions that happen to look the same.
+    before = [caster, target, target]
+    for character in before:
+        bq.add(character)
+
+    skill.use(caster, target)
+
+    after = []
+    while not bq.is_empty():
+        after.append(bq.remove())
+    resets_queue = after[:len(before)] != before
+    added = after if resets_queue else after[len(before):]
+    damage = PROBE_STAT - target.get_hp()
+    return Transition(PROBE_STAT - caster.get_sp(), damage,
+                      damage > 0 and caster.get_hp() - PROBE_STAT == damage,
+                      tuple('C' if c is caster else 'T' for c in added),
+                      resets_queue)
+
+
+def build_transition_tables() -> Tuple[Dict[Tuple[str, str, str], Transition],
+                                       Dict[Tuple[type, str], Transition]]:
+    """
+    Return the transition table for every (caster type, target type, action)
+    and the table of every non-delegating skill's effect on every target type,
+    keyed by (skill class, target type).
+
+    >>> table, skills = build_transition_tables()
+    >>> len(table)
+    32
+    >>> from a2_skills import RogueAttack
+    >>> skills[(RogueAttack, 'mage')]
+    Transition(sp=-3, hp=-7, queue=+C)
+    """
+    table = {}
+    skills = {}
+    characters = [cls("c", BattleQueue(), None) for cls in CHARACTER_CLASSES]
+    for target_class, target in zip(CHARACTER_CLASSES, characters):
+        target_type = target.get_character_type()
+        for caster in characters:
+            for action in ACTIONS:
+                skill = caster.get_skill(action)
+                if isinstance(skill, SorcererAttack):
+                    transition = Transition(skill.get_sp_cost(), 0, False,
+                                            (), False, True)
+                else:
+                    transition = probe_skill(skill, target_class)
+                    skills[(type(skill), target_type)] = transition
+                table[(caster.get_character_type(), target_type,
+                       action)] = transition
+    return table, skills
+
+
+TRANSITIONS, SKILL_TRANSITIONS = build_transition_tables()
+
+
+def _apply_effect(battle_queue: 'BattleQueue', caster: 'Character',
+                  target: 'Character', transition: Transition) -> None:
+    """
+    Apply the effect described by transition to caster, target and
+    battle_queue.
+    """
+    target_hp = target.get_hp()
+    new_target_hp = max(target_hp - transition.damage, 0)
+    caster.set_sp(caster.get_sp() - transition.sp_cost)
+    target.set_hp(new_target_hp)
+    if transition.lifesteal:
+        caster.set_hp(caster.get_hp() + target_hp - new_target_hp)
+    added = [caster if who == 'C' else target
+             for who in transition.additions]
+    if transition.resets_queue:
+        battle_queue.reset_to(added)
+    else:
+        for character in added:
+            battle_queue.add(character)
+
+
+def apply_transition(battle_queue: 'BattleQueue', action: str) -> None:
+    """
+    Make the character at the front of battle_queue perform action, using
+    the precomputed transition table instead of Skill.use.
+
+    Unlike attack() and special_attack(), this does not change which sprite
+    the character shows, so it is meant for copies used in search.
+
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq = BattleQueue()
+    >>> v = Vampire("v", bq, ManualPlaystyle(bq))
+    >>> m = Mage("m", bq, ManualPlaystyle(bq))
+    >>> v.enemy = m
+    >>> m.enemy = v
+    >>> bq.add(v)
+    >>> bq.add(m)
+    >>> m.set_hp(10)
+    >>> apply_transition(bq, 'S')
+    >>> v
+    v (Vampire): 110/80
+    >>> m
+    m (Mage): 0/100
+    """
+    caster = battle_queue.peek()
+    target = caster.enemy
+    transition = TRANSITIONS.get((caster.get_character_type(),
+                                  target.get_character_type(), action))
+    if transition is None:
+        caster.get_skill(action).use(caster, target)
+    elif transition.delegates:
+        original_sp = caster.get_sp()
+        skill = caster.skill_decision_tree.pick_skill(caster, target)
+        picked = SKILL_TRANSITIONS.get((type(skill),
+                                        target.get_character_type()))
+        if picked is None:
+            skill.use(caster, target)
+        else:
+            _apply_effect(battle_queue, caster, target, picked)
+        caster.set_sp(original_sp - transition.sp_cost)
+    else:
+        _apply_effect(battle_queue, caster, target, transition)
+
+
+def perform_move(battle_queue: 'BattleQueue', move: str,
+                 use_table: bool = False) -> 'Character':
+    """
+    Make the character at the front of battle_queue perform move, 'A' or
+    'S', the way a2_game does: the character only leaves the front if it can
+    still act. Return the character that performed move. If use_table is
+    True, the move is applied with apply_transition, so no sprite changes.
+
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq = BattleQueue()
+    >>> r = Rogue("r", bq, ManualPlaystyle(bq))
+    >>> m = Mage("m", bq, ManualPlaystyle(bq))
+    >>> r.enemy = m
+    >>> m.enemy = r
+    >>> bq.add(r)
+    >>> bq.add(m)
+    >>> perform_move(bq, 'A')
+    r (Rogue): 100/97
+    >>> bq
+    m (Mage): 93/100 -> r (Rogue): 100/97
+    """
+    caster = battle_queue.peek()
+    if use_table:
+        apply_transition(battle_queue, move)
+    elif move == 'A':
+        caster.attack()
+    else:
+        caster.special_attack()
+    if caster.get_available_actions() != []:
+        battle_queue.remove()
+    return caster
@@ -0,0 +1,70 @@
+"""
+Unittests for the precomputed transition table for A2.
+
+These tests check that applying a transition from the table leaves a
+BattleQueue in exactly the same state as having the character use the skill
+itself, for every class pairing and both kinds of BattleQueue.
+"""
+import unittest
+
+from a2_game import CHARACTER_CLASSES
+from a2_battle_queue import BattleQueue
+from a2_transitions import TRANSITIONS, apply_transition
+from a2_test_support import make_queue, pairings
+
+
+class TransitionUnitTests(unittest.TestCase):
+    def test_table_has_every_pairing(self):
+        """
+        Test to make sure the table has an entry for every class pairing and
+        action.
+        """
+        expected = len(CHARACTER_CLASSES) ** 2 * 2
+        self.assertEqual(expected, len(TRANSITIONS),
+                         ("The transition table should have {} entries " +
+                          "but has {} instead.").format(expected,
+                                                        len(TRANSITIONS)))
+
+    def test_matches_skill_use(self):
+        """
+        Test to make sure apply_transition matches attack() and
+        special_attack() for every pairing, action and queue type.
+        """
+        for queue_class, p1_class, p2_class in pairings():
+            for stats in [(100, 100, 100, 100), (40, 36, 14, 35),
+                          (60, 25, 12, 80)]:
+                for action in ['A', 'S']:
+                    used = make_queue(queue_class, p1_class, p2_class, stats)
+                    looked_up = make_queue(queue_class, p1_class,
+                                           p2_class, stats)
+                    if not used.peek().is_valid_action(action):
+                        continue
+                    if action == 'A':
+                        used.peek().attack()
+                    else:
+                        used.peek().special_attack()
+                    apply_transition(looked_up, action)
+                    self.assertEqual(
+                        repr(used), repr(looked_up),
+                        ("Using {} with stats {} should leave the " +
+                         "queue as:\n{}\nbut got:\n{}\n" +
+                         "instead.").format(action, stats,
+                                            repr(used),
+                                            repr(looked_up)))
+
+    def test_vampire_lifesteal_is_capped(self):
+        """
+        Test to make sure a Vampire only heals by the HP its target had left.
+        """
+        bq = make_queue(BattleQueue, CHARACTER_CLASSES['v'],
+                        CHARACTER_CLASSES['m'], (50, 100, 5, 100))
+        apply_transition(bq, 'S')
+        actual = bq.peek().get_hp()
+        self.assertEqual(55, actual,
+                         ("A Vampire at 50 HP that kills a Mage at 5 HP " +
+                          "should have 55 HP but has {} instead.").format(
+                              actual))
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -1,15 +1,213 @@
 """
 A tree class.
 Helper class for Iterative Minimax
+
+The nodes of a tree of states are kept in a TreeStore, in parallel arrays
+indexed by node, with each node's game state packed by BattleQueue.pack().
+A TOS only holds its TreeStore and its index in it, and unpacks a new
+BattleQueue every time unpack_battle_q() is called. The paths from the end
+states of a tree to its root are made one at a time by iter_paths() instead
+of being kept.
+
+iter_children() and iter_levels() expand a tree lazily, one node at a time, so
+callers can look at each new node as it is made instead of waiting for a whole
+level of the tree to be built.
+
+A StateDAG keeps each distinct game state reachable from a root once, so
+states reached by different sequences of actions are only expanded and scored
+once.
+
+expand_tree() grows a whole tree one level at a time, like iter_levels(), but
+keeps the packed states of the level being expanded and of the next one in
+Frontiers instead of in the TreeStore. A level that grows past its memory
+limit is written to a temporary file and read back from it as it is
+expanded, so the tree only keeps the small arrays it is scored with. The
+game state of a node whose state is not kept is remade by replaying the
+actions that lead to it. IterativeMinimax grows its trees this way.
+
+iter_frontiers() walks the levels of a tree the same way without keeping the
+tree at all. a2_benchmark uses it to measure how many states a tree has and
+how wide it gets.
 """
-from typing import List, Union
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from array import array
+import struct
+import sys
+import tempfile
 
 from a2_battle_queue import BattleQueue
+from a2_transitions import apply_transition
+
+# How many bytes of packed states a Frontier keeps in memory before it spills
+# them to a temporary file.
+FRONTIER_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Each state a Frontier spills is written after its length.
+RECORD_LENGTH = struct.Struct('<I')
+
+
+class TreeStore:
+    """
+    The nodes of a tree of states, kept in parallel arrays indexed by node.
+    The root is node 0, and the children of each node are stored one after
+    the other.
+
+    template - The BattleQueue the tree was grown from. Game states are
+               unpacked with copies of its characters.
+    names - The names of the two characters playing.
+    parents - The index of each node's parent, or -1 for the root.
+    actions - The action taken in each node's parent to reach it, as a byte.
+    states - Each node's game state, packed by BattleQueue.pack(), or None if
+             it is not kept and is remade when it is needed.
+    scores - Each node's list of scores, or None if it is still empty.
+    casters - Which of names is the name of each node's caster.
+    action_counts - How many actions each node's caster can perform.
+    over - Whether the game is over in each node.
+    first_children - The index of each node's first child, or -1.
+    child_counts - How many children each node has.
+    """
+    template: 'BattleQueue'
+    names: List[str]
+    parents: array
+    actions: bytearray
+    states: List[Union[bytes, None]]
+    scores: List[Union[list, None]]
+    casters: bytearray
+    action_counts: bytearray
+    over: bytearray
+    first_children: array
+    child_counts: bytearray
+
+    def __init__(self, battle_q: 'BattleQueue') -> None:
+        """
+        Initialize this TreeStore with battle_q as the game state of its root.
+
+        >>> from a2_characters import Rogue, Mage
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> bq1 = BattleQueue()
+        >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+        >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+        >>> r1.enemy = m1
+        >>> m1.enemy = r1
+        >>> bq1.add(m1)
+        >>> bq1.add(r1)
+        >>> store = TreeStore(bq1)
+        >>> len(store)
+        1
+        >>> store.queue(0)
+        m (Mage): 100/100 -> r (Rogue): 100/100
+        """
+        self.template = battle_q
+        caster = battle_q.peek()
+        self.names = [caster.get_name(), caster.enemy.get_name()]
+        self.parents = array('i')
+        self.actions = bytearray()
+        self.states = []
+        self.scores = []
+        self.casters = bytearray()
+        self.action_counts = bytearray()
+        self.over = bytearray()
+        self.first_children = array('i')
+        self.child_counts = bytearray()
+        self.add(battle_q, -1, None, [])
+
+    def __len__(self) -> int:
+        """
+        Return the number of nodes in this TreeStore.
+        """
+        return len(self.states)
+
+    def add(self, battle_q: 'BattleQueue', parent: int,
+            action: Union[str, None], score: list,
+            keep_state: bool = True) -> int:
+        """
+        Add a node with the game state in battle_q, reached by performing
+        action in the node parent, and return its index. Its packed game
+        state is only kept if keep_state is True.
+        """
+        caster = battle_q.peek()
+        self.parents.append(parent)
+        self.actions.append(ord(action) if action else 0)
+        self.states.append(battle_q.pack() if keep_state else None)
+        self.scores.append(score or None)
+        self.casters.append(0 if caster.get_name() == self.names[0] else 1)
+        self.action_counts.append(len(caster.get_available_actions()))
+        self.over.append(battle_q.is_over())
+        self.first_children.append(-1)
+        self.child_counts.append(0)
+        return len(self.states) - 1
+
+    def queue(self, index: int) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the game state of the node index. If its
+        state is not kept, it is remade by performing the actions that lead
+        to it from the closest node above it whose state is kept.
+        """
+        actions = []
+        while self.states[index] is None:
+            actions.append(chr(self.actions[index]))
+            index = self.parents[index]
+        battle_q = self.template.unpack(self.states[index])
+        for action in reversed(actions):
+            battle_q = _next_state(battle_q, action)
+        return battle_q
+
+    def caster_name(self, index: int) -> str:
+        """
+        Return the name of the caster of the node index.
+        """
+        return self.names[self.casters[index]]
+
+    def get_score(self, index: int) -> list:
+        """
+        Return the list of scores of the node index. The same list is
+        returned every time, so changes to it are kept.
+        """
+        if self.scores[index] is None:
+            self.scores[index] = []
+        return self.scores[index]
+
+    def iter_paths(self) -> Iterator[List[int]]:
+        """
+        Yield the path from each end state below the root to the root, as the
+        indices of the nodes along it, in the order the end states were
+        added. Each path is made when it is asked for.
+
+        >>> from a2_characters import Rogue, Mage
+        >>> from a2_playstyle import ManualPlaystyle
+        >>> bq1 = BattleQueue()
+        >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+        >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+        >>> r1.enemy = m1
+        >>> m1.enemy = r1
+        >>> bq1.add(m1)
+        >>> bq1.add(r1)
+        >>> r1.set_hp(40)
+        >>> r1.set_sp(6)
+        >>> m1.set_hp(14)
+        >>> m1.set_sp(35)
+        >>> t = TOS(bq1)
+        >>> for level in iter_levels(t):
+        ...     pass
+        >>> list(t.store.iter_paths())
+        [[6, 3, 1, 0], [7, 4, 2, 0], [8, 5, 3, 1, 0]]
+        """
+        parents = self.parents
+        for index in range(1, len(self.states)):
+            if self.over[index]:
+                path = [index]
+                while parents[path[-1]] >= 0:
+                    path.append(parents[path[-1]])
+                yield path
+
 
 class TOS:
     """
     A tree that indicates all possible states after one root state.
+    Each TOS is one node of the tree, kept in a TreeStore.
 
+    store - The TreeStore this node is kept in.
+    index - This node's index in store.
     battle_q - Current game state, represented by a BattleQueue.
     caster - Current player.
     children - A TOS node's children.
@@ -20,20 +218,15 @@ class TOS:
     last_round_taken_action - Represent the action taken in last round.
     score - A list of score for the state.
     """
-    battle_q: 'BattleQueue'
-    caster: 'Character'
-    children: List['TOS'] = None
-    possible_paths: list
-    snppc: dict
-    last_round: Union['TOS', None]
-    last_round_caster: Union[str, None]
-    last_round_taken_action: Union[str, None]
-    score: list
+    __slots__ = ('store', 'index')
+    store: TreeStore
+    index: int
 
-    def __init__(self, battle_q: 'BattleQueue', 
-                 children: List['TOS'] = None) -> None:
+    def __init__(self, battle_q: 'BattleQueue' = None,
+                 store: TreeStore = None, index: int = 0) -> None:
         """
-        Initialization of TOS.
+        Initialization of TOS. If battle_q is given, this is the root of a
+        new tree grown from it. Otherwise it is the node index of store.
         >>> from a2_battle_queue import BattleQueue
         >>> from a2_characters import Rogue, Mage
         >>> from a2_playstyle import ManualPlaystyle
@@ -49,29 +242,156 @@ class TOS:
         >>> m1.set_hp(14)
         >>> m1.set_sp(35)
         >>> t = TOS(bq1)
-        >>> t.possible_paths
-        []
         >>> t.score
         []
+        >>> type(t.unpack_caster()) == Mage
+        True
         >>> type(t.caster) == Mage
         True
         >>> t.children == []
         True
+        >>> t.possible_paths
+        []
         """
-        self.battle_q = battle_q
-        self.caster = battle_q.peek()
-        self.children = children[:] if children is not None else []
-        self.possible_paths = []
-        self.snppc = {}
-        self.last_round = None
-        self.last_round_caster = None
-        self.last_round_taken_action = None
-        self.score = []
+        self.store = TreeStore(battle_q) if store is None else store
+        self.index = index
 
+    def unpack_battle_q(self) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in this node's game state, unpacked every
+        time this is called.
+        """
+        return self.store.queue(self.index)
 
-def get_children_and_update(battle_q: Union['Battlequeue', TOS]) -> TOS:
+    def unpack_caster(self) -> 'Character':
+        """
+        Return the caster of this node, in a new BattleQueue unpacked every
+        time this is called.
+        """
+        return self.unpack_battle_q().peek()
+
+    @property
+    def battle_q(self) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in this node's game state, as
+        unpack_battle_q() does. Changing it does not change this node.
+        """
+        return self.unpack_battle_q()
+
+    @property
+    def caster(self) -> 'Character':
+        """
+        Return the caster of this node, as unpack_caster() does.
+        """
+        return self.unpack_caster()
+
+    @property
+    def children(self) -> List['TOS']:
+        """
+        Return this node's children.
+        """
+        first = self.store.first_children[self.index]
+        return [TOS(store=self.store, index=child) for child in
+                range(first, first + self.store.child_counts[self.index])]
+
+    @children.setter
+    def children(self, children: List['TOS']) -> None:
+        """
+        Set this node's children to children, which must be the nodes its
+        actions lead to, in order, as get_children() returns them, raising
+        ValueError if they are not. The children of a node are the states
+        its actions lead to, so they cannot be changed.
+        """
+        if [(child.store, child.index) for child in children] != \
+                [(child.store, child.index) for child in self.children]:
+            raise ValueError("the children of a TOS cannot be changed")
+
+    @property
+    def possible_paths(self) -> List[list]:
+        """
+        Return, if this node is the root, the path from each end state below
+        it to it, in the order of TreeStore.iter_paths(), or [] otherwise.
+        Each node of a path is [caster, last_round_caster,
+        last_round_taken_action, score] of that node, made every time this
+        is called.
+        """
+        if self.store.parents[self.index] >= 0:
+            return []
+        return [[[node.unpack_caster(), node.last_round_caster,
+                  node.last_round_taken_action, node.score]
+                 for node in (TOS(store=self.store, index=index)
+                              for index in path)]
+                for path in self.store.iter_paths()]
+
+    @property
+    def snppc(self) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        Return, if this node is the root, where each node below it whose
+        caster has two actions is in possible_paths, as (path, position)
+        pairs, by the node's index in store, or {} otherwise.
+        """
+        if self.store.parents[self.index] >= 0:
+            return {}
+        positions = {}
+        for number, path in enumerate(self.store.iter_paths()):
+            for position, index in enumerate(path[1:-1], 1):
+                if self.store.action_counts[index] == 2:
+                    positions.setdefault(index, []).append(
+                        (number, position))
+        return positions
+
+    @property
+    def last_round(self) -> Union['TOS', None]:
+        """
+        Return this node's parent, or None if this node is the root.
+        """
+        parent = self.store.parents[self.index]
+        return None if parent < 0 else TOS(store=self.store, index=parent)
+
+    @property
+    def last_round_caster(self) -> Union[str, None]:
+        """
+        Return the name of the caster of this node's parent, or None if this
+        node is the root.
+        """
+        parent = self.store.parents[self.index]
+        return None if parent < 0 else self.store.caster_name(parent)
+
+    @property
+    def last_round_taken_action(self) -> Union[str, None]:
+        """
+        Return the action taken in this node's parent to reach this node, or
+        None if this node is the root.
+        """
+        action = self.store.actions[self.index]
+        return chr(action) if action else None
+
+    @property
+    def score(self) -> list:
+        """
+        Return this node's list of scores.
+        """
+        return self.store.get_score(self.index)
+
+    @score.setter
+    def score(self, score: list) -> None:
+        """
+        Set this node's list of scores to score.
+        """
+        self.store.scores[self.index] = score
+
+    def is_over(self) -> bool:
+        """
+        Return whether the game is over in this node.
+        """
+        return bool(self.store.over[self.index])
+
+
+def get_children_and_update(battle_q: Union['Battlequeue', TOS],
+                            stats: 'SearchStats' = None) -> TOS:
     """
     Create a tree for any given state.
+    If stats is given, the expansion is recorded in it.
     >>> from a2_battle_queue import BattleQueue
     >>> from a2_characters import Rogue, Mage
     >>> from a2_playstyle import ManualPlaystyle
@@ -90,43 +410,164 @@ def get_children_and_update(battle_q: Union['Battlequeue', TOS]) -> TOS:
     >>> len(get_children_and_update(t).children) == 2
     True
     """
-    t = TOS(battle_q) if type(battle_q) is BattleQueue else battle_q
-    if not t.battle_q.is_over():
-        root_caster_name = t.caster.get_name()
-        for action in t.caster.get_available_actions():
-            bq_copy = t.battle_q.copy()
-            if action == 'A':
-                bq_copy.peek().attack()
-            if action == 'S':
-                bq_copy.peek().special_attack()
-            if not bq_copy.is_over() and \
-                bq_copy.peek().get_available_actions() and \
-               bq_copy.peek().enemy.get_available_actions():
-                bq_copy.remove()
-            c = TOS(bq_copy)
-            c.last_round = t
-            c.last_round_caster = root_caster_name
-            c.last_round_taken_action = action
-            if c.battle_q.get_winner() and c.battle_q.get_winner() == c.caster:
-                c.score = [c.battle_q.get_winner().get_hp()]
-                t.children.append(c)
-            elif c.battle_q.is_over() and not c.battle_q.get_winner():
-                c.score = [0]
-                t.children.append(c)
-            elif c.battle_q.get_winner() and c.battle_q.get_winner() != \
-                    c.caster:
-                c.score = [-c.battle_q.get_winner().get_hp()]
-                t.children.append(c)
-            elif not c.battle_q.is_over():
-                c.score = []
-                t.children.append(c)
+    t = TOS(battle_q) if isinstance(battle_q, BattleQueue) else battle_q
+    store = t.store
+    if not store.over[t.index] and store.first_children[t.index] < 0:
+        if stats is not None:
+            stats.nodes += 1
+        store.first_children[t.index] = len(store)
+        for action, bq_copy in _next_states(store.queue(t.index), stats):
+            store.add(bq_copy, t.index, action, _end_score(bq_copy))
+            store.child_counts[t.index] += 1
     return t
 
 
-def get_children(lot: Union[List[TOS], TOS]) -> List[TOS]:
+def _next_states(battle_queue: 'BattleQueue', stats: 'SearchStats' = None
+                 ) -> Iterator[Tuple[str, 'BattleQueue']]:
+    """
+    Yield every action the next player in battle_queue can perform, along
+    with a new BattleQueue in the game state that action leads to.
+    If stats is given, the copies made are recorded in it.
+    """
+    for action in battle_queue.peek().get_available_actions():
+        yield action, _next_state(battle_queue, action, stats)
+
+
+def _next_state(battle_queue: 'BattleQueue', action: str,
+                stats: 'SearchStats' = None) -> 'BattleQueue':
+    """
+    Return a new BattleQueue in the game state the next player in
+    battle_queue performing action leads to.
+    If stats is given, the copy made is recorded in it.
+    """
+    bq_copy = battle_queue.copy()
+    if stats is not None:
+        stats.copies += 1
+    apply_transition(bq_copy, action)
+    if not bq_copy.is_over() and \
+        bq_copy.peek().get_available_actions() and \
+       bq_copy.peek().enemy.get_available_actions():
+        bq_copy.remove()
+    bq_copy.normalize()
+    return bq_copy
+
+
+def _end_score(battle_q: 'BattleQueue') -> list:
+    """
+    Return [score] if the game in battle_q is over, where score is the score
+    of the next player in battle_q, or [] if it is not over.
+    """
+    caster = battle_q.peek()
+    if battle_q.get_winner() and battle_q.get_winner() == caster:
+        return [battle_q.get_winner().get_hp()]
+    elif battle_q.is_over() and not battle_q.get_winner():
+        return [0]
+    elif battle_q.get_winner() and battle_q.get_winner() != caster:
+        return [-battle_q.get_winner().get_hp()]
+    return []
+
+
+def iter_children(lot: Union[Iterable[TOS], TOS, 'BattleQueue'],
+                  stats: 'SearchStats' = None) -> Iterator[TOS]:
+    """
+    Yield the children of the given state(s), expanding each state only when
+    the children before it have been yielded.
+    If stats is given, the expansion is recorded in it.
+    >>> from a2_battle_queue import BattleQueue
+    >>> from a2_characters import Rogue, Mage
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq1 = BattleQueue()
+    >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+    >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+    >>> r1.enemy = m1
+    >>> m1.enemy = r1
+    >>> bq1.add(m1)
+    >>> bq1.add(r1)
+    >>> r1.set_hp(40)
+    >>> r1.set_sp(6)
+    >>> m1.set_hp(14)
+    >>> m1.set_sp(35)
+    >>> t = TOS(bq1)
+    >>> children = iter_children([t])
+    >>> t.children
+    []
+    >>> next(children).last_round_taken_action
+    'A'
+    >>> len(t.children)
+    2
+    """
+    if isinstance(lot, (TOS, BattleQueue)):
+        lot = [lot]
+    for t in lot:
+        yield from get_children_and_update(t, stats).children
+
+
+def iter_levels(t: TOS, stats: 'SearchStats' = None
+                ) -> Iterator[Iterator[TOS]]:
+    """
+    Yield, for every level of the tree below t, an iterator over the nodes
+    of that level. Each level is expanded lazily as its iterator is used, and
+    whatever is left of it is expanded before the next level is yielded.
+    The last level yielded is the empty one below the deepest nodes.
+    If stats is given, the expansion is recorded in it.
+    >>> from a2_battle_queue import BattleQueue
+    >>> from a2_characters import Rogue, Mage
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq1 = BattleQueue()
+    >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+    >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+    >>> r1.enemy = m1
+    >>> m1.enemy = r1
+    >>> bq1.add(m1)
+    >>> bq1.add(r1)
+    >>> r1.set_hp(40)
+    >>> r1.set_sp(6)
+    >>> m1.set_hp(14)
+    >>> m1.set_sp(35)
+    >>> t = TOS(bq1)
+    >>> [sum(1 for _ in level) for level in iter_levels(t)]
+    [2, 2, 3, 1, 0]
+    """
+    store = t.store
+    runs = [(t.index, t.index + 1)]
+    while runs:
+        yield iter_children((TOS(store=store, index=index)
+                             for start, stop in runs
+                             for index in range(start, stop)), stats)
+        next_runs = []
+        for start, stop in runs:
+            for index in range(start, stop):
+                get_children_and_update(TOS(store=store, index=index), stats)
+                _add_run(next_runs, store.first_children[index],
+                         store.child_counts[index])
+        runs = next_runs
+
+
+def _add_run(runs: List[Tuple[int, int]], first: int, count: int) -> None:
+    """
+    Add the count node indices starting at first to runs, a list of
+    (start, stop) ranges, merging them into the last range if they follow it.
+
+    >>> runs = [(1, 3)]
+    >>> _add_run(runs, 3, 2)
+    >>> _add_run(runs, 7, 1)
+    >>> runs
+    [(1, 5), (7, 8)]
+    """
+    if count == 0:
+        return
+    if runs and runs[-1][1] == first:
+        runs[-1] = (runs[-1][0], first + count)
+    else:
+        runs.append((first, first + count))
+
+
+def get_children(lot: Union[List[TOS], TOS],
+                 stats: 'SearchStats' = None) -> List[TOS]:
     """
     Return a list of children based on given state(s).
     Mutate given state's(s)' children before returning.
+    If stats is given, the expansion is recorded in it.
     >>> from a2_battle_queue import BattleQueue
     >>> from a2_characters import Rogue, Mage
     >>> from a2_playstyle import ManualPlaystyle
@@ -145,18 +586,394 @@ def get_children(lot: Union[List[TOS], TOS]) -> List[TOS]:
     >>> len(get_children(t)) == 2
     True
     """
-    list_of_children = []
-    if type(lot) == list:
-        for t in lot:
-            t.children = get_children_and_update(t).children if not \
-                t.battle_q.is_over() else []
-            for child_child in t.children:
-                list_of_children.append(child_child)
-    else:
-        t = get_children_and_update(lot.battle_q)
-        for child_child in t.children:
-            list_of_children.append(child_child)
-    return list_of_children
+    return list(iter_children(lot, stats))
+
+class StateDAG:
+    """
+    All the game states reachable from one root state, with each distinct
+    game state kept once. A state reached by different sequences of actions
+    is a single node whose children are shared by all of its parents, so
+    each distinct state is expanded and scored once. The root is node 0.
+
+    Every skill costs SP, so no game state can be reached from itself and
+    the nodes always form a directed acyclic graph.
+
+    template - The BattleQueue the DAG was grown from. Game states are
+               unpacked with copies of its characters.
+    names - The names of the two characters playing.
+    states - Each node's game state, packed by BattleQueue.pack().
+    casters - Which of names is the name of each node's caster.
+    edges - Each node's (action, child) pairs, in the order the actions are
+            available.
+    scores - The highest score each node's caster can guarantee.
+    tree_size - The number of nodes a tree of states from the same root has.
+    """
+    template: 'BattleQueue'
+    names: List[str]
+    states: List[bytes]
+    casters: bytearray
+    edges: List[List[Tuple[str, int]]]
+    scores: List[int]
+    tree_size: int
+
+    def __init__(self, battle_q: 'BattleQueue',
+                 stats: 'SearchStats' = None) -> None:
+        """
+        Initialize this StateDAG with every state reachable from battle_q,
+        and score them. If stats is given, the search is recorded in it, with
+        a state that was already in the DAG counted as a cache hit.
+
+        >>> from a2_characters import Rogue, Mage
+        >>> from a2_playstyle import ManualPlaystyle, get_state_score
+        >>> bq1 = BattleQueue()
+        >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+        >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+        >>> r1.enemy = m1
+        >>> m1.enemy = r1
+        >>> bq1.add(m1)
+        >>> bq1.add(r1)
+        >>> r1.set_hp(40)
+        >>> r1.set_sp(6)
+        >>> m1.set_hp(14)
+        >>> m1.set_sp(35)
+        >>> dag = StateDAG(bq1)
+        >>> dag.scores[0] == get_state_score(bq1)
+        True
+        >>> len(dag), dag.tree_size
+        (9, 9)
+        """
+        self.template = battle_q
+        caster = battle_q.peek()
+        self.names = [caster.get_name(), caster.enemy.get_name()]
+        self.states = []
+        self.casters = bytearray()
+        self.edges = []
+        end_scores = []
+        depths = []
+        index = {}
+
+        def add(bq: 'BattleQueue', key: bytes, depth: int) -> int:
+            """
+            Add a node with the game state in bq, packed as key, that is
+            depth moves away from the root, and return its index.
+            """
+            index[key] = len(self.states)
+            self.states.append(key)
+            name = bq.peek().get_name()
+            self.casters.append(0 if name == self.names[0] else 1)
+            self.edges.append([])
+            end_scores.append(_end_score(bq))
+            depths.append(depth)
+            return index[key]
+
+        add(battle_q, battle_q.pack(), 0)
+        node = 0
+        while node < len(self.states):
+            if stats is not None:
+                stats.max_depth = max(stats.max_depth, depths[node])
+            if not end_scores[node]:
+                if stats is not None:
+                    stats.nodes += 1
+                for action, bq in _next_states(self.queue(node), stats):
+                    key = bq.pack()
+                    if key in index:
+                        if stats is not None:
+                            stats.cache_hits += 1
+                        child = index[key]
+                    else:
+                        if stats is not None:
+                            stats.cache_misses += 1
+                        child = add(bq, key, depths[node] + 1)
+                    self.edges[node].append((action, child))
+            node += 1
+        self._score(end_scores)
+
+    def _score(self, end_scores: List[list]) -> None:
+        """
+        Set the score and count the tree size of every node, children first,
+        where end_scores is each node's score if its game is over and []
+        otherwise. A node whose game is not over but has no children scores
+        0.
+        """
+        self.scores = [0] * len(self.states)
+        sizes = [1] * len(self.states)
+        done = bytearray(len(self.states))
+        stack = [0]
+        while stack:
+            node = stack[-1]
+            if done[node]:
+                stack.pop()
+                continue
+            waiting = [child for _, child in self.edges[node]
+                       if not done[child]]
+            if waiting:
+                stack.extend(waiting)
+                continue
+            stack.pop()
+            done[node] = 1
+            if end_scores[node]:
+                self.scores[node] = end_scores[node][0]
+            elif self.edges[node]:
+                self.scores[node] = max(self._score_for(node, child)
+                                        for _, child in self.edges[node])
+            sizes[node] += sum(sizes[child] for _, child in self.edges[node])
+        self.tree_size = sizes[0]
+
+    def _score_for(self, node: int, child: int) -> int:
+        """
+        Return the score of child, a child of node, for the caster of node.
+        """
+        if self.casters[node] == self.casters[child]:
+            return self.scores[child]
+        return -self.scores[child]
+
+    def __len__(self) -> int:
+        """
+        Return the number of distinct game states in this StateDAG.
+        """
+        return len(self.states)
+
+    def queue(self, index: int) -> 'BattleQueue':
+        """
+        Return a new BattleQueue in the game state of the node index.
+        """
+        return self.template.unpack(self.states[index])
+
+    def compression_ratio(self) -> float:
+        """
+        Return how many times more nodes a tree of states from the same root
+        has than this StateDAG.
+        """
+        return self.tree_size / len(self.states)
+
+    def best_action(self) -> str:
+        """
+        Return the first action available at the root that leads to its
+        best score, or 'X' if no action is available.
+        """
+        for action, child in self.edges[0]:
+            if self._score_for(0, child) == self.scores[0]:
+                return action
+        return 'X'
+
+
+class Frontier:
+    """
+    One level of a tree of states, as game states packed by
+    BattleQueue.pack(). States are kept in memory until they take up more
+    than memory_limit bytes, after which they are all kept in a temporary
+    file instead. Either way they are iterated over in the order they were
+    added.
+
+    memory_limit - How many bytes of states to keep in memory.
+    spilled - Whether the states have been moved to a temporary file.
+
+    >>> frontier = Frontier(memory_limit=100)
+    >>> frontier.add(b'ab')
+    >>> frontier.spilled
+    False
+    >>> frontier.add(bytes(200))
+    >>> frontier.spilled
+    True
+    >>> [len(state) for state in frontier]
+    [2, 200]
+    >>> len(frontier)
+    2
+    >>> frontier.close()
+    """
+    memory_limit: int
+    spilled: bool
+
+    def __init__(self, memory_limit: int = FRONTIER_MEMORY_LIMIT) -> None:
+        """
+        Initialize this Frontier with no states.
+        """
+        self.memory_limit = memory_limit
+        self.spilled = False
+        self._states = []
+        self._size = 0
+        self._length = 0
+        self._file = None
+
+    def add(self, state: bytes) -> None:
+        """
+        Add state to the end of this Frontier.
+        """
+        self._length += 1
+        if self.spilled:
+            self._write(state)
+            return
+        self._states.append(state)
+        self._size += sys.getsizeof(state) + 8
+        if self._size > self.memory_limit:
+            self._file = tempfile.TemporaryFile()
+            for spilled_state in self._states:
+                self._write(spilled_state)
+            self._states = []
+            self.spilled = True
+
+    def _write(self, state: bytes) -> None:
+        """
+        Write state to the end of this Frontier's temporary file.
+        """
+        self._file.write(RECORD_LENGTH.pack(len(state)))
+        self._file.write(state)
+
+    def __len__(self) -> int:
+        """
+        Return the number of states in this Frontier.
+        """
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Return an iterator over the states in this Frontier. States must not
+        be added while it is used.
+        """
+        if not self.spilled:
+            return iter(self._states)
+        return self._read()
+
+    def _read(self) -> Iterator[bytes]:
+        """
+        Yield the states in this Frontier's temporary file, from the start.
+        """
+        self._file.flush()
+        self._file.seek(0)
+        for _ in range(self._length):
+            length, = RECORD_LENGTH.unpack(
+                self._file.read(RECORD_LENGTH.size))
+            yield self._file.read(length)
+        self._file.seek(0, 2)
+
+    def close(self) -> None:
+        """
+        Forget every state in this Frontier and delete its temporary file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._states = []
+        self._size = 0
+        self._length = 0
+        self.spilled = False
+
+
+def expand_tree(t: TOS, stats: 'SearchStats' = None,
+                memory_limit: int = FRONTIER_MEMORY_LIMIT) -> None:
+    """
+    Grow the whole tree of states below t, one level at a time, making the
+    same tree as iter_levels(t). The packed states of the nodes made are
+    not kept in t.store: each level's are kept in a Frontier, with memory
+    limit memory_limit, while the level is expanded. Nodes t.store already
+    has keep their states.
+    If stats is given, the expansion is recorded in it, along with the depth
+    of the deepest level.
+
+    >>> from a2_characters import Rogue, Mage
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq1 = BattleQueue()
+    >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+    >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+    >>> r1.enemy = m1
+    >>> m1.enemy = r1
+    >>> bq1.add(m1)
+    >>> bq1.add(r1)
+    >>> r1.set_hp(40)
+    >>> r1.set_sp(6)
+    >>> m1.set_hp(14)
+    >>> m1.set_sp(35)
+    >>> t = TOS(bq1)
+    >>> expand_tree(t, memory_limit=0)
+    >>> len(t.store), t.store.states[8], t.store.queue(8)
+    (9, None, m (Mage): 0/25)
+    """
+    store = t.store
+    frontier = Frontier(memory_limit)
+    frontier.add(store.states[t.index] or store.queue(t.index).pack())
+    runs = [(t.index, t.index + 1)]
+    depth = 0
+    while runs:
+        if stats is not None:
+            stats.max_depth = max(stats.max_depth, depth)
+        next_frontier = Frontier(memory_limit)
+        next_runs = []
+        states = iter(frontier)
+        for start, stop in runs:
+            for index in range(start, stop):
+                state = next(states)
+                if store.over[index]:
+                    continue
+                first = store.first_children[index]
+                if first >= 0:
+                    for child in range(first,
+                                       first + store.child_counts[index]):
+                        next_frontier.add(store.states[child] or
+                                          store.queue(child).pack())
+                else:
+                    if stats is not None:
+                        stats.nodes += 1
+                    store.first_children[index] = len(store)
+                    for action, bq_copy in _next_states(
+                            store.template.unpack(state), stats):
+                        store.add(bq_copy, index, action,
+                                  _end_score(bq_copy), False)
+                        store.child_counts[index] += 1
+                        next_frontier.add(bq_copy.pack())
+                _add_run(next_runs, store.first_children[index],
+                         store.child_counts[index])
+        frontier.close()
+        frontier = next_frontier
+        runs = next_runs
+        depth += 1
+    frontier.close()
+
+
+def iter_frontiers(battle_q: 'BattleQueue', stats: 'SearchStats' = None,
+                   memory_limit: int = FRONTIER_MEMORY_LIMIT
+                   ) -> Iterator[Frontier]:
+    """
+    Yield a Frontier for every level of the tree of states grown from
+    battle_q, starting with the root, until a level has no states. Each
+    Frontier is closed once the next one has been made, and is only read
+    while the next one is made. Unpack its states with battle_q.unpack().
+    If stats is given, the expansion is recorded in it.
+
+    >>> from a2_characters import Rogue, Mage
+    >>> from a2_playstyle import ManualPlaystyle
+    >>> bq1 = BattleQueue()
+    >>> r1 = Rogue("r", bq1, ManualPlaystyle(bq1))
+    >>> m1 = Mage("m", bq1, ManualPlaystyle(bq1))
+    >>> r1.enemy = m1
+    >>> m1.enemy = r1
+    >>> bq1.add(m1)
+    >>> bq1.add(r1)
+    >>> r1.set_hp(40)
+    >>> r1.set_sp(6)
+    >>> m1.set_hp(14)
+    >>> m1.set_sp(35)
+    >>> [len(level) for level in iter_frontiers(bq1, memory_limit=0)]
+    [1, 2, 2, 3, 1]
+    """
+    frontier = Frontier(memory_limit)
+    frontier.add(battle_q.pack())
+    depth = 0
+    while len(frontier):
+        if stats is not None:
+            stats.max_depth = max(stats.max_depth, depth)
+        yield frontier
+        next_frontier = Frontier(memory_limit)
+        for state in frontier:
+            bq = battle_q.unpack(state)
+            if bq.is_over():
+                continue
+            if stats is not None:
+                stats.nodes += 1
+            for _, bq_copy in _next_states(bq, stats):
+                next_frontier.add(bq_copy.pack())
+        frontier.close()
+        frontier = next_frontier
+        depth += 1
 
 
 if __name__ == '__main__':
@@ -0,0 +1,190 @@
+"""
+Unittests for the tree of states used by A2's IterativeMinimax.
+
+These tests check that expanding a tree lazily with iter_levels() makes the
+same tree, level by level, as expanding it with get_children(), and that a
+StateDAG scores the same tree with each distinct state kept once, and that
+iter_frontiers() and expand_tree() walk the same levels whether or not they
+spill them to disk, and that a TOS still answers for its old attributes.
+"""
+import unittest
+
+from a2_game import CHARACTER_CLASSES
+from a2_battle_queue import BattleQueue
+from a2_playstyle import SearchStats
+from a2_tree_of_states import TOS, StateDAG, expand_tree, get_children, \
+    iter_frontiers, iter_levels
+from a2_test_support import make_queue, pairings
+
+
+def describe(level):
+    """
+    Return the game state and the action that led to it of every node in
+    level.
+    """
+    return [(repr(t.unpack_battle_q()), t.last_round_taken_action) for t in level]
+
+
+def tree_score(t):
+    """
+    Return the highest score the caster of t can guarantee, by searching the
+    whole tree of states below t.
+    """
+    if t.is_over():
+        return t.score[0]
+    scores = [tree_score(child) if
+              t.store.caster_name(child.index) ==
+              t.store.caster_name(t.index) else -tree_score(child)
+              for child in get_children(t)]
+    return max(scores) if scores else 0
+
+
+class TreeOfStatesUnitTests(unittest.TestCase):
+    def test_levels_match_get_children(self):
+        """
+        Test to make sure iter_levels yields the same nodes, in the same
+        order, as calling get_children on one level after another.
+        """
+        for queue_class, p1_class, p2_class in pairings():
+            stats = (30, 20, 30, 20)
+            expected = []
+            level = get_children(TOS(make_queue(
+                queue_class, p1_class, p2_class, stats)))
+            while level:
+                expected.append(describe(level))
+                level = get_children(level)
+            actual = [describe(level) for level in iter_levels(TOS(
+                make_queue(queue_class, p1_class, p2_class, stats)))]
+            self.assertEqual(expected + [[]], actual,
+                             ("iter_levels should yield the levels:" +
+                              "\n{}\nbut yielded:\n{}\ninstead."
+                              ).format(expected, actual))
+
+    def test_levels_are_lazy(self):
+        """
+        Test to make sure a level is only expanded as far as it has been
+        used.
+        """
+        t = TOS(make_queue(BattleQueue, CHARACTER_CLASSES['m'],
+                           CHARACTER_CLASSES['r'], (40, 36, 14, 35)))
+        levels = iter_levels(t)
+        next(next(levels))
+        first, second = t.children
+        self.assertEqual(len(t.store), 3,
+                         ("Only the root should have been expanded, but " +
+                          "the tree has {} nodes.").format(len(t.store)))
+        self.assertEqual((first.children, second.children), ([], []),
+                         "The first level should not have been expanded.")
+
+    def test_dag_matches_tree(self):
+        """
+        Test to make sure a StateDAG gives the root the same score as
+        searching its whole tree of states, and knows how big that tree is.
+        """
+        for queue_class, p1_class, p2_class in pairings():
+            stats = (30, 20, 30, 20)
+            t = TOS(make_queue(queue_class, p1_class, p2_class, stats))
+            expected = (tree_score(t), len(t.store))
+            dag = StateDAG(make_queue(queue_class, p1_class, p2_class, stats))
+            actual = (dag.scores[0], dag.tree_size)
+            self.assertEqual(expected, actual,
+                             ("A StateDAG should have the score and " +
+                              "tree size {} but has {} instead."
+                              ).format(expected, actual))
+            self.assertTrue(len(dag) <= dag.tree_size,
+                            "A StateDAG should not have more nodes " +
+                            "than its tree.")
+
+    def test_frontiers_match_levels(self):
+        """
+        Test to make sure iter_frontiers yields the states of every level of
+        the tree, in order, both in memory and spilled to disk.
+        """
+        for queue_class, p1_class, p2_class in pairings():
+            stats = (30, 20, 30, 20)
+            t = TOS(make_queue(queue_class, p1_class, p2_class, stats))
+            expected = [[t.store.states[0]]] + \
+                [[t.store.states[node.index] for node in level]
+                 for level in iter_levels(t)][:-1]
+            for memory_limit in [0, 10 ** 6]:
+                actual = [list(frontier) for frontier in
+                          iter_frontiers(make_queue(
+                              queue_class, p1_class, p2_class, stats),
+                              memory_limit=memory_limit)]
+                self.assertEqual(expected, actual,
+                                 ("iter_frontiers with a memory " +
+                                  "limit of {} yielded the wrong " +
+                                  "states.").format(memory_limit))
+
+    def test_expand_tree_matches_levels(self):
+        """
+        Test to make sure expand_tree makes the same tree, with the same
+        game states, as iter_levels, both in memory and spilled to disk, and
+        records the same expansion.
+        """
+        fields = ['parents', 'actions', 'scores', 'casters', 'action_counts',
+                  'over', 'first_children', 'child_counts']
+        for queue_class, p1_class, p2_class in pairings():
+            stats = (30, 20, 30, 20)
+            t = TOS(make_queue(queue_class, p1_class, p2_class, stats))
+            expected_stats = SearchStats()
+            for level in iter_levels(t, expected_stats):
+                pass
+            for memory_limit in [0, 10 ** 6]:
+                grown = TOS(make_queue(queue_class, p1_class, p2_class,
+                                       stats))
+                actual_stats = SearchStats()
+                expand_tree(grown, actual_stats, memory_limit)
+                for field in fields:
+                    self.assertEqual(getattr(t.store, field),
+                                     getattr(grown.store, field),
+                                     ("expand_tree with a memory limit " +
+                                      "of {} made the wrong {}.").format(
+                                          memory_limit, field))
+                self.assertEqual(t.store.states,
+                                 [grown.store.queue(index).pack()
+                                  for index in range(len(grown.store))],
+                                 "expand_tree made the wrong states.")
+                self.assertEqual((expected_stats.nodes,
+                                  expected_stats.copies),
+                                 (actual_stats.nodes, actual_stats.copies),
+                                 "expand_tree recorded the wrong expansion.")
+
+
+    def test_old_attributes(self):
+        """
+        Test to make sure battle_q, caster, children, possible_paths and
+        snppc of a TOS are read from its TreeStore.
+        """
+        for queue_class, p1_class, p2_class in pairings()[:8]:
+            bq = make_queue(queue_class, p1_class, p2_class, (8, 6, 8, 6))
+            t = TOS(bq)
+            expand_tree(t)
+            self.assertEqual(repr(bq), repr(t.battle_q),
+                             "battle_q should be the root's game state.")
+            self.assertEqual(bq.peek().get_name(), t.caster.get_name(),
+                             "caster should be the root's caster.")
+            t.children = t.children
+            with self.assertRaises(ValueError):
+                t.children = []
+            paths = list(t.store.iter_paths())
+            self.assertEqual(len(paths), len(t.possible_paths),
+                             "There should be a path to each end state.")
+            for path, possible_path in zip(paths, t.possible_paths):
+                self.assertEqual([t.store.caster_name(index) for index in path],
+                                 [node[0].get_name()
+                                  for node in possible_path],
+                                 "A path should go through its casters.")
+            for index, positions in t.snppc.items():
+                self.assertEqual(2, t.store.action_counts[index],
+                                 "snppc should only count split nodes.")
+                for number, position in positions:
+                    self.assertEqual(index, paths[number][position],
+                                     "snppc should find each split node.")
+            self.assertEqual(([], {}), (t.children[0].possible_paths,
+                                        t.children[0].snppc),
+                             "Only the root should have paths.")
+
+
+if __name__ == "__main__":
+    unittest.main(exit = False)
@@ -6,13 +6,21 @@ way, nor do you need to submit it.
 
 This file simply calls on pygame and the code from a2_game.py, which contains
 all of your client code.
+
+Pass --ponder to let computer playstyles search ahead while you decide.
+
+Pass --replay PATH to record the match to a replay log with a2_replay.
+
+pygame is only imported and initialized by start_game(), so this file can be
+imported without a display, or without pygame installed.
 """
 import a2_game
-import pygame
 import sys
 
 GAME_SPEED = 100
-pygame.init()
+
+# The pygame module, once init_pygame() has imported it.
+pygame = None
 
 PYGAME_SCREEN = None
 CHARACTER_SIZE = 120
@@ -23,11 +31,21 @@ P2_POSITION = CHARACTER_SIZE - (CHARACTER_SIZE // 4)
 RANDOM_TIMER = 10
 FONT_SIZE = 18
 
+def init_pygame():
+    """
+    Import and initialize pygame, if that has not been done yet.
+    """
+    global pygame
+    if pygame is None:
+        import pygame
+        pygame.init()
+
 def start_game():
     """
     Start and initialize the game
     """
     global PYGAME_SCREEN, CHARACTER_SIZE, NUMBER_OF_CHARACTERS, FONT_SIZE
+    init_pygame()
     a2_game.set_up_game()
     
     # Set up the width and height of the screen (proportional to the character
@@ -130,7 +148,15 @@ def update_game():
     pygame.display.flip()
 
 if __name__ == '__main__':
+    from a2_ui_nonpygame import option_path
+    replay_path = option_path('--replay')
+    if '--ponder' in sys.argv:
+        a2_game.PONDER = True
+
     start_game()
+    if replay_path is not None:
+        from a2_replay import ReplayWriter
+        a2_game.REPLAY = ReplayWriter(replay_path, a2_game.BATTLE_QUEUE)
     update_game()
     
     while True:
@@ -138,6 +164,8 @@ if __name__ == '__main__':
     
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if a2_game.REPLAY is not None:
+                    a2_game.REPLAY.close()
                 pygame.quit()
                 sys.exit(0)
             if event.type == pygame.KEYDOWN and not a2_game.GAME_IS_OVER:
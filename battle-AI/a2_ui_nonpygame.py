@@ -8,11 +8,40 @@ A non-UI (text-based) way of playing A1.
 Run this file to play the game. You don't need to modify this file in any
 way, nor do you need to submit it.
 
+Pass --profile PATH to profile every move of the match with
+a2_profile.MatchProfiler and write its collapsed stacks to PATH on quitting.
+
+Pass --ponder to let computer playstyles search ahead while you decide.
+
+Pass --replay PATH to record the match to a replay log with a2_replay.
+
 This file simply calls on pygame and the code from a2_game.py, which contains
 all of your client code.
 """
+import os
+import sys
 import a2_game
 
+# Where to write the profile of the match, if it is being profiled.
+PROFILE_PATH = None
+
+def option_path(flag):
+    """
+    Return the path given after flag on the command line, or None if flag
+    was not given. Exit with a message if the path is missing or its
+    directory does not exist, so that nothing is lost at the end of a match.
+    """
+    if flag not in sys.argv:
+        return None
+    index = sys.argv.index(flag) + 1
+    if index == len(sys.argv) or sys.argv[index].startswith('--'):
+        sys.exit("{} needs a PATH".format(flag))
+    path = sys.argv[index]
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        sys.exit("{} {}: no such directory {}".format(flag, path, directory))
+    return path
+
 def start_game():
     """
     Start and initialize the game
@@ -71,8 +100,32 @@ def update_game():
     print("-" * 20)
         
 
+def finish_profile():
+    """
+    Write the profile of the match, if it is being profiled, and close its
+    replay log, if it is being recorded.
+    """
+    if a2_game.PROFILER is not None:
+        a2_game.PROFILER.write_collapsed(PROFILE_PATH)
+        print("\n".join(a2_game.PROFILER.summary()))
+        print("Collapsed stacks written to " + PROFILE_PATH)
+    if a2_game.REPLAY is not None:
+        a2_game.REPLAY.close()
+        print("Replay written to " + a2_game.REPLAY.path)
+
 if __name__ == '__main__':
+    PROFILE_PATH = option_path('--profile')
+    replay_path = option_path('--replay')
+    if PROFILE_PATH is not None:
+        from a2_profile import MatchProfiler
+        a2_game.PROFILER = MatchProfiler()
+    if '--ponder' in sys.argv:
+        a2_game.PONDER = True
+
     start_game()
+    if replay_path is not None:
+        from a2_replay import ReplayWriter
+        a2_game.REPLAY = ReplayWriter(replay_path, a2_game.BATTLE_QUEUE)
     update_game()
     
     while True:
@@ -95,6 +148,7 @@ if __name__ == '__main__':
                     update_game()
                 
                 if k == 'Q':
+                    finish_profile()
                     break
         else:
             prompt = ("Select an action (U: Update Display, Q: Quit Game): ")
@@ -103,4 +157,5 @@ if __name__ == '__main__':
             if k == 'U':
                 update_game()
             if k == 'Q':
+                finish_profile()
                 break